@@ -25,6 +25,27 @@ class Settings(BaseSettings):
 
     photo_root: Path
     db_path: Path = Path("data/phototank.sqlite")
+    # SQLite storage profile: safe|balanced|throughput (see core/db.py
+    # STORAGE_PROFILES). The individual overrides win over the profile.
+    sqlite_profile: str = "balanced"
+    sqlite_synchronous: Optional[str] = None
+    sqlite_cache_size_mb: Optional[int] = None
+    sqlite_mmap_size_mb: Optional[int] = None
+    sqlite_temp_store: Optional[str] = None
+    sqlite_journal_size_limit_mb: int = 64
+    # Web handlers read through a separate mode=ro engine whose pool matches the
+    # request threadpool; waiting for a connection shows up in /metrics.
+    web_threadpool_size: int = 40
+    db_read_pool_timeout_s: float = 10.0
+    db_read_statement_cache: int = 256
+    # Idle maintenance (WAL checkpoint, PRAGMA optimize, incremental vacuum).
+    # Runs at most every N minutes once no job has been active for idle_s; 0 disables.
+    db_maintenance_interval_min: int = 360
+    db_maintenance_idle_s: float = 300.0
+    # Online snapshots next to db_path, every N hours (0 = manual only), keeping
+    # the newest `keep`. Defaults until a schedule is saved on the dashboard.
+    db_backup_interval_hours: int = 0
+    db_backup_keep: int = 7
 
     import_root: Path = Path("import")
     failed_root: Path = Path("failed")
@@ -34,6 +55,28 @@ class Settings(BaseSettings):
     mid_max: int = 2048
     thumb_quality: int = 75
     mid_quality: int = 85
+    # Optional responsive ladder, e.g. "128,512,1024" (see deriv_sizes_list()).
+    deriv_sizes: Optional[str] = None
+    deriv_size_quality: int = 80
+    # Global memory budget for concurrent image decodes (MB), and the size (in
+    # megapixels) above which JPEGs are decoded at reduced resolution.
+    decode_memory_budget_mb: int = 1024
+    decode_reduce_over_mp: int = 50
+
+    # Byte budget for mids in MB. 0 keeps every mid forever; >0 turns mids into an
+    # LRU cache that validate doesn't fill and /mid regenerates on demand.
+    mid_cache_budget_mb: int = 0
+    # Number of leading gallery tiles loaded from one sprite atlas (0 disables).
+    gallery_sprite_count: int = 0
+
+    # Hand file bodies to a fronting web server: "nginx" answers /original,
+    # /download/original, /thumb, /mid, /img and /sprite with X-Accel-Redirect,
+    # "sendfile" with X-Sendfile (Apache mod_xsendfile, lighttpd); "off" serves
+    # them from Python. The prefixes replace PHOTO_ROOT and DERIV_ROOT in the
+    # header: nginx internal locations, or the roots as the web server sees them.
+    file_offload: str = "off"
+    file_offload_originals: str = "/_phototank/originals"
+    file_offload_derivatives: str = "/_phototank/derivatives"
 
     photo_exts: Optional[str] = None
     datetime_fallback: Optional[str] = None
@@ -48,14 +91,37 @@ class Settings(BaseSettings):
     log_syslog_path: Optional[Path] = None
 
     geocode_enabled: bool = True
+    # geonames (web service) | offline (local GeoNames dump in geocode_offline_dir)
     geocode_provider: str = "geonames"
     geocode_geonames_username: Optional[str] = None
+    geocode_geonames_url: str = "https://api.geonames.org"
+    geocode_offline_dir: Path = Path("data/geonames")
+    geocode_offline_radius_km: float = 20.0
     geocode_cache_cell_m: int = 100
     geocode_radius_km_primary: float = 0.2
     geocode_radius_km_fallback: float = 1.0
     geocode_timeout_s: float = 6.0
+    # GeoNames requests: token bucket refilling one token per min_interval_s, with
+    # bursts (and keep-alive connections, and geocode job lookups in flight) up to
+    # geocode_concurrency, and at most geocode_hourly_quota requests per rolling
+    # hour (free accounts get 1000 credits/hour; 0 = no local cap).
     geocode_min_interval_s: float = 0.25
+    geocode_concurrency: int = 4
+    geocode_hourly_quota: int = 1000
     geocode_hourly_limit_cooldown_s: float = 3600.0
+    # Per-cell negative caching: a miss is remembered for N days; failed lookups
+    # back off exponentially from geocode_error_backoff_s up to the max.
+    geocode_miss_ttl_days: float = 30.0
+    geocode_error_backoff_s: float = 600.0
+    geocode_error_backoff_max_s: float = 7 * 86400.0
+    # Cache cells each job keeps in memory (prewarmed with the most recently used).
+    geocode_lru_entries: int = 20000
+    # Coarse parent cells (0 = off). A fine-cell miss is answered from its parent
+    # once geocode_parent_promote_after fine cells in it resolved to the same
+    # place, and only if that place is within geocode_parent_radius_km.
+    geocode_parent_cell_m: int = 1000
+    geocode_parent_promote_after: int = 2
+    geocode_parent_radius_km: float = 1.0
 
     phone_sync_ssh_user: str | None = None
     phone_sync_ip: str | None = None
@@ -73,6 +139,7 @@ class Settings(BaseSettings):
         self.deriv_root = resolve_under(repo_root, self.deriv_root)
         self.import_root = resolve_under(repo_root, self.import_root)
         self.failed_root = resolve_under(repo_root, self.failed_root)
+        self.geocode_offline_dir = resolve_under(repo_root, self.geocode_offline_dir)
 
         if self.log_file is not None:
             self.log_file = resolve_under(repo_root, self.log_file)
@@ -95,6 +162,59 @@ class Settings(BaseSettings):
             exts.add(part.lower())
         return exts
 
+    def deriv_sizes_list(self) -> list[int]:
+        """Return the extra responsive derivative sizes (max dimension, ascending).
+
+        Sizes equal to THUMB_MAX/MID_MAX are served by the existing thumb/mid
+        files, and sizes above MID_MAX are dropped. If unset, returns an empty
+        list (no ladder; templates emit plain thumb/mid URLs).
+        """
+        if not self.deriv_sizes:
+            return []
+        sizes: set[int] = set()
+        for part in self.deriv_sizes.replace("/", ",").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                n = int(part)
+            except ValueError:
+                continue
+            if 16 <= n < int(self.mid_max) and n != int(self.thumb_max):
+                sizes.add(n)
+        return sorted(sizes)
+
+    def sqlite_pragmas(self) -> dict[str, str]:
+        """Connection pragmas for the configured storage profile plus overrides."""
+        from .db import STORAGE_PROFILES
+
+        profile = (self.sqlite_profile or "balanced").strip().lower()
+        pragmas = dict(STORAGE_PROFILES.get(profile, STORAGE_PROFILES["balanced"]))
+        if self.sqlite_synchronous:
+            pragmas["synchronous"] = self.sqlite_synchronous.strip().upper()
+        if self.sqlite_cache_size_mb is not None:
+            # Negative cache_size is in KiB.
+            pragmas["cache_size"] = str(-max(1, int(self.sqlite_cache_size_mb)) * 1024)
+        if self.sqlite_mmap_size_mb is not None:
+            pragmas["mmap_size"] = str(max(0, int(self.sqlite_mmap_size_mb)) * 1024 * 1024)
+        if self.sqlite_temp_store:
+            pragmas["temp_store"] = self.sqlite_temp_store.strip().upper()
+        pragmas["journal_size_limit"] = str(max(0, int(self.sqlite_journal_size_limit_mb)) * 1024 * 1024)
+        return pragmas
+
+    def decode_budget_bytes(self) -> int:
+        return max(0, int(self.decode_memory_budget_mb)) * 1024 * 1024
+
+    def decode_reduce_over_pixels(self) -> int:
+        return max(0, int(self.decode_reduce_over_mp)) * 1_000_000
+
+    def mid_cache_budget_bytes(self) -> int:
+        return max(0, int(self.mid_cache_budget_mb)) * 1024 * 1024
+
+    def srcset_sizes(self) -> list[int]:
+        """All derivative sizes that can be served by /img/{size}/{guid}."""
+        return sorted({int(self.thumb_max), int(self.mid_max), *self.deriv_sizes_list()})
+
     def datetime_fallback_order(self) -> list[str]:
         """Return fallback order for datetime_original when EXIF is missing.
 
@@ -110,7 +230,8 @@ class Settings(BaseSettings):
         return order
 
 
-def get_settings() -> Settings:
+def load_settings() -> Settings:
+    """Build Settings from the environment and env files (uncached; see get_settings)."""
     # Allow overriding env file so users can maintain multiple configs
     # without editing phototank/.env (e.g. PHOTOTANK_ENV_FILE=phototank/.env.extracted).
     env_file = os.environ.get("PHOTOTANK_ENV_FILE")
@@ -121,3 +242,41 @@ def get_settings() -> Settings:
             p = (repo_root / p).resolve()
         return Settings(_env_file=str(p))
     return Settings()
+
+
+# Loaded once per process: a load re-reads and re-parses the env files, which
+# cost more than a whole /thumb request. Plain assignment swaps it atomically,
+# so readers need no lock (and the SIGHUP handler can't deadlock on one).
+_SETTINGS: Settings | None = None
+
+
+def get_settings() -> Settings:
+    """Process-wide settings, loaded on first use. Raises ValidationError if the config is invalid."""
+    global _SETTINGS
+    settings = _SETTINGS
+    if settings is None:
+        settings = _SETTINGS = load_settings()
+    return settings
+
+
+def reload_settings() -> tuple[Settings, list[str]]:
+    """Re-read the environment and env files; returns the new settings and the changed keys.
+
+    On error (ValidationError) the current settings stay in place.
+    """
+    global _SETTINGS
+    old = _SETTINGS
+    settings = _SETTINGS = load_settings()
+    if old is None:
+        return settings, []
+    before, after = old.model_dump(), settings.model_dump()
+    return settings, sorted(k for k in after if before.get(k) != after[k])
+
+
+# Applied once at startup (engines, read pool, logging, schedulers): changing
+# these still takes a restart.
+_RESTART_ONLY = ("db_path", "sqlite_", "web_threadpool_size", "db_read_", "db_maintenance_", "db_backup_", "log_")
+
+
+def restart_required(changed: list[str]) -> list[str]:
+    return [k for k in changed if k.startswith(_RESTART_ONLY)]
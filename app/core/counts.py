@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .models import PhotoCount
+
+
+# Dimensions kept in photo_counts: (dim, key expression, row condition), with
+# {r} standing for the photos row (new/old in triggers, photos in rebuild).
+# "year" follows the library layout (rel_path YYYY/...) like the dashboard
+# always has; "month" is the capture month from taken_at.
+_PHOTO_DIMS = (
+    ("total", "''", "1"),
+    ("year", "substr({r}.rel_path, 1, 4)", "{r}.rel_path GLOB '[0-9][0-9][0-9][0-9]/*'"),
+    ("month", "strftime('%Y-%m', {r}.taken_at, 'unixepoch')", "{r}.taken_at IS NOT NULL"),
+    ("rating", "CAST({r}.rating AS TEXT)", "1"),
+    ("country", "{r}.geo_country", "{r}.geo_country IS NOT NULL AND {r}.geo_country != ''"),
+    # Keyed "country|city" so the gallery can list a country's cities without a scan.
+    ("city", "coalesce({r}.geo_country, '') || '|' || {r}.geo_city", "{r}.geo_city IS NOT NULL AND {r}.geo_city != ''"),
+)
+
+DIMS = tuple(dim for dim, _, _ in _PHOTO_DIMS) + ("tag",)
+
+
+def _incr(dim: str, key: str, cond: str) -> str:
+    return (
+        f"INSERT INTO photo_counts (dim, key, n) SELECT '{dim}', {key}, 1 WHERE {cond} "
+        "ON CONFLICT (dim, key) DO UPDATE SET n = n + 1;"
+    )
+
+
+def _decr(dim: str, key: str, cond: str) -> str:
+    return f"UPDATE photo_counts SET n = n - 1 WHERE dim = '{dim}' AND key = {key} AND {cond};"
+
+
+def _photo_steps(step, r: str, *, skip_total: bool = False) -> str:
+    return "\n".join(
+        step(dim, key.format(r=r), cond.format(r=r))
+        for dim, key, cond in _PHOTO_DIMS
+        if not (skip_total and dim == "total")
+    )
+
+
+_TRACKED = ("rel_path", "taken_at", "rating", "geo_country", "geo_city")
+
+_COUNT_TRIGGERS = (
+    f"""
+    CREATE TRIGGER photos_counts_ai AFTER INSERT ON photos BEGIN
+        {_photo_steps(_incr, "new")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER photos_counts_ad AFTER DELETE ON photos BEGIN
+        {_photo_steps(_decr, "old")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER photos_counts_au AFTER UPDATE OF {", ".join(_TRACKED)} ON photos
+    WHEN {" OR ".join(f"old.{c} IS NOT new.{c}" for c in _TRACKED)}
+    BEGIN
+        {_photo_steps(_decr, "old", skip_total=True)}
+        {_photo_steps(_incr, "new", skip_total=True)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER photo_tags_counts_ai AFTER INSERT ON photo_tags BEGIN
+        {_incr("tag", "CAST(new.tag_id AS TEXT)", "1")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER photo_tags_counts_ad AFTER DELETE ON photo_tags BEGIN
+        {_decr("tag", "CAST(old.tag_id AS TEXT)", "1")}
+    END
+    """,
+)
+
+
+_TRIGGER_NAMES = ("photos_counts_ai", "photos_counts_ad", "photos_counts_au", "photo_tags_counts_ai", "photo_tags_counts_ad")
+
+
+def ensure_photo_counts(conn: Connection) -> None:
+    """Install the photo_counts triggers and fill the table, unless already installed."""
+    installed = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'photos_counts_ai'"
+    ).first()
+    if not installed:
+        install_photo_counts(conn)
+
+
+def install_photo_counts(conn: Connection) -> None:
+    """(Re)create the photo_counts triggers from _PHOTO_DIMS and refill the table.
+
+    Runs in the caller's transaction, so no write can slip between the fresh
+    counts and the triggers taking over. Needed whenever the dimensions change.
+    """
+    for name in _TRIGGER_NAMES:
+        conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS "{name}"')
+    for ddl in _COUNT_TRIGGERS:
+        conn.exec_driver_sql(ddl)
+    rebuild_photo_counts(conn)
+
+
+def rebuild_photo_counts(conn: Connection | Session) -> int:
+    """Recompute photo_counts with full scans (repair after drift or manual edits). Returns rows written."""
+    conn.execute(text("DELETE FROM photo_counts"))
+    written = 0
+    for dim, key, cond in _PHOTO_DIMS:
+        res = conn.execute(
+            text(
+                f"INSERT INTO photo_counts (dim, key, n) "
+                f"SELECT '{dim}', {key.format(r='photos')}, count(*) FROM photos "
+                f"WHERE {cond.format(r='photos')} GROUP BY 2"
+            )
+        )
+        written += int(res.rowcount or 0)
+    res = conn.execute(
+        text(
+            "INSERT INTO photo_counts (dim, key, n) "
+            "SELECT 'tag', CAST(tag_id AS TEXT), count(*) FROM photo_tags GROUP BY tag_id"
+        )
+    )
+    return written + int(res.rowcount or 0)
+
+
+def photo_counts(session: Session, dim: str) -> list[tuple[str, int]]:
+    """Non-zero counts for one dimension, by key ascending."""
+    rows = session.execute(
+        select(PhotoCount.key, PhotoCount.n)
+        .where(PhotoCount.dim == dim)
+        .where(PhotoCount.n > 0)
+        .order_by(PhotoCount.key.asc())
+    ).all()
+    return [(str(k), int(n)) for k, n in rows]
+
+
+def total_photo_count(session: Session) -> int:
+    n = session.execute(
+        select(PhotoCount.n).where(PhotoCount.dim == "total").where(PhotoCount.key == "")
+    ).scalar_one_or_none()
+    return int(n or 0)
@@ -1,26 +1,44 @@
 from __future__ import annotations
 
 from dataclasses import asdict
+from functools import lru_cache
+from datetime import datetime, timezone
+import logging
 from pathlib import Path
 import threading
+import time
 from typing import Any, Optional
 
-from sqlalchemy import Engine, event, func, select, text
+from sqlalchemy import Engine, bindparam, event, func, select, text
 from sqlalchemy import delete
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
 
-from .models import Base, Photo, PhotoTag, ScanJob, Tag
+from .models import Base, Photo, PhotoTag, PinnedMid, ScanJob, Tag
+from .migrations import apply_migrations, sync_model_schema
 from ..services.scanner import PhotoRecord
+from .util import taken_at_from_iso
 
 
+logger = logging.getLogger(__name__)
+
 _ENGINES: dict[str, Engine] = {}
 _SESSIONMAKERS: dict[str, sessionmaker] = {}
+_READ_ENGINES: dict[str, Engine] = {}
+_READ_SESSIONMAKERS: dict[str, sessionmaker] = {}
+_READ_LOCK = threading.Lock()
 _INIT_LOCK = threading.Lock()
 _INIT_DONE: set[str] = set()
 
 
+def is_sqlite_lock_error(exc: Exception) -> bool:
+    msg = str(getattr(exc, "orig", exc)).lower()
+    return "database is locked" in msg or "database table is locked" in msg
+
+
 def _db_key_for_engine(engine: Engine) -> str:
     # Use a stable key for the database backing this Engine.
     # For SQLite file URLs this will include the full path.
@@ -30,14 +48,64 @@ def _db_key_for_engine(engine: Engine) -> str:
         return f"engine:{id(engine)}"
 
 
+@lru_cache(maxsize=32)
+def _path_key(db_path: Path) -> str:
+    # The engine/sessionmaker registry key. Cached: handlers look it up on every
+    # request and resolve() costs a few syscalls.
+    return str(db_path.expanduser().resolve())
+
+
 def _sqlite_url(db_path: Path) -> str:
     # sqlite:////absolute/path on POSIX; sqlite:///relative/path also works.
     p = db_path.expanduser().resolve()
     return f"sqlite:///{p.as_posix()}"
 
 
+# Connection pragmas per storage profile. WAL is always on; these trade
+# durability of the last commits (synchronous) against write throughput.
+STORAGE_PROFILES: dict[str, dict[str, str]] = {
+    "safe": {
+        "synchronous": "FULL",
+        "cache_size": str(-16 * 1024),
+        "mmap_size": "0",
+        "temp_store": "DEFAULT",
+    },
+    "balanced": {
+        "synchronous": "NORMAL",
+        "cache_size": str(-64 * 1024),
+        "mmap_size": str(256 * 1024 * 1024),
+        "temp_store": "MEMORY",
+    },
+    "throughput": {
+        "synchronous": "OFF",
+        "cache_size": str(-256 * 1024),
+        "mmap_size": str(1024 * 1024 * 1024),
+        "temp_store": "MEMORY",
+    },
+}
+
+_PRAGMA_NAMES = {"synchronous", "cache_size", "mmap_size", "temp_store", "journal_size_limit", "wal_autocheckpoint"}
+_STORAGE_PRAGMAS: dict[str, str] = dict(STORAGE_PROFILES["balanced"])
+
+
+def configure_storage(pragmas: dict[str, str]) -> None:
+    """Set the pragmas applied to new connections (call before the first engine_for)."""
+    clean: dict[str, str] = {}
+    for name, value in pragmas.items():
+        v = str(value).strip()
+        if name not in _PRAGMA_NAMES or not v or not v.lstrip("-").replace("_", "").isalnum():
+            raise ValueError(f"invalid sqlite pragma {name}={value!r}")
+        clean[name] = v
+    _STORAGE_PRAGMAS.clear()
+    _STORAGE_PRAGMAS.update(clean)
+
+
+def storage_pragmas() -> dict[str, str]:
+    return dict(_STORAGE_PRAGMAS)
+
+
 def engine_for(db_path: Path) -> Engine:
-    key = str(db_path.expanduser().resolve())
+    key = _path_key(db_path)
     engine = _ENGINES.get(key)
     if engine is not None:
         return engine
@@ -48,28 +116,169 @@ def engine_for(db_path: Path) -> Engine:
         _sqlite_url(db_path),
         future=True,
     )
+    pragmas = storage_pragmas()
 
     @event.listens_for(engine, "connect")
     def _set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:  # type: ignore[no-redef]
+        # pysqlite's own transaction handling never emits BEGIN before a
+        # SAVEPOINT, so the first savepoint would open (and its RELEASE commit)
+        # the transaction. Turn it off and emit BEGIN ourselves in _begin.
+        dbapi_connection.isolation_level = None
         cur = dbapi_connection.cursor()
         try:
             cur.execute("PRAGMA busy_timeout=5000;")
+            # Only takes effect on a fresh database (before the first table exists);
+            # lets the maintenance job hand free pages back with incremental_vacuum.
+            cur.execute("PRAGMA auto_vacuum=INCREMENTAL;")
             cur.execute("PRAGMA journal_mode=WAL;")
             cur.execute("PRAGMA foreign_keys=ON;")
+            for name, value in pragmas.items():
+                cur.execute(f"PRAGMA {name}={value};")
         finally:
             cur.close()
 
+    @event.listens_for(engine, "begin")
+    def _begin(conn) -> None:  # type: ignore[no-redef]
+        # IMMEDIATE takes the write lock up front, so a transaction never fails
+        # to upgrade half way through. Read-only sessions pass sqlite_begin=None
+        # and run each statement in autocommit, seeing the writer's commits.
+        mode = conn.get_execution_options().get("sqlite_begin", "IMMEDIATE")
+        if mode:
+            conn.exec_driver_sql(f"BEGIN {mode}")
+
     _ENGINES[key] = engine
     return engine
 
 
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait and how often they time out."""
+
+    # Checkouts slower than this count as "waited" (an idle connection was not available).
+    WAIT_THRESHOLD_S = 0.005
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self._checkouts = 0
+        self._waited = 0
+        self._wait_total_s = 0.0
+        self._wait_max_s = 0.0
+        self._timeouts = 0
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            rec = super()._do_get()
+        except PoolTimeoutError:
+            with self._metrics_lock:
+                self._timeouts += 1
+            raise
+        waited = time.perf_counter() - t0
+        with self._metrics_lock:
+            self._checkouts += 1
+            if waited >= self.WAIT_THRESHOLD_S:
+                self._waited += 1
+                self._wait_total_s += waited
+                self._wait_max_s = max(self._wait_max_s, waited)
+        return rec
+
+    def metrics(self) -> dict[str, float | int]:
+        with self._metrics_lock:
+            return {
+                "size": self.size(),
+                "checked_out": self.checkedout(),
+                "overflow": max(0, self.overflow()),
+                "checkouts": self._checkouts,
+                "waited": self._waited,
+                "wait_ms_total": round(self._wait_total_s * 1000, 1),
+                "wait_ms_max": round(self._wait_max_s * 1000, 1),
+                "timeouts": self._timeouts,
+            }
+
+
+_READ_POOL = {"size": 40, "timeout_s": 10.0, "statement_cache": 256}
+
+
+def configure_read_pool(*, size: int, timeout_s: float, statement_cache: int) -> None:
+    """Set read pool sizing (call before the first read_engine_for)."""
+    _READ_POOL.update(
+        size=max(1, int(size)),
+        timeout_s=max(0.1, float(timeout_s)),
+        statement_cache=max(0, int(statement_cache)),
+    )
+
+
+def read_engine_for(db_path: Path) -> Engine:
+    """Read-only engine for web handlers (mode=ro + query_only).
+
+    Opened read-only at the SQLite level, so a handler can never take the write
+    lock; in WAL mode readers also never wait for the writer. The database must
+    already exist (init_db at startup).
+    """
+    key = _path_key(db_path)
+    with _READ_LOCK:
+        engine = _READ_ENGINES.get(key)
+        if engine is not None:
+            return engine
+
+        p = db_path.expanduser().resolve()
+        engine = create_engine(
+            f"sqlite:///file:{p.as_posix()}?mode=ro&uri=true",
+            future=True,
+            poolclass=MeteredQueuePool,
+            pool_size=int(_READ_POOL["size"]),
+            max_overflow=0,
+            pool_timeout=float(_READ_POOL["timeout_s"]),
+            connect_args={
+                "check_same_thread": False,
+                "cached_statements": int(_READ_POOL["statement_cache"]),
+            },
+        )
+        pragmas = {k: v for k, v in storage_pragmas().items() if k in {"cache_size", "mmap_size", "temp_store"}}
+
+        @event.listens_for(engine, "connect")
+        def _set_read_pragmas(dbapi_connection, _connection_record) -> None:  # type: ignore[no-redef]
+            cur = dbapi_connection.cursor()
+            try:
+                cur.execute("PRAGMA busy_timeout=5000;")
+                cur.execute("PRAGMA query_only=ON;")
+                for name, value in pragmas.items():
+                    cur.execute(f"PRAGMA {name}={value};")
+            finally:
+                cur.close()
+
+        _READ_ENGINES[key] = engine
+        return engine
+
+
+def read_sessionmaker_for(db_path: Path) -> sessionmaker:
+    key = _path_key(db_path)
+    sm = _READ_SESSIONMAKERS.get(key)
+    if sm is not None:
+        return sm
+
+    engine = read_engine_for(db_path)
+    sm = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    _READ_SESSIONMAKERS[key] = sm
+    return sm
+
+
+def read_pool_metrics(db_path: Path) -> dict[str, float | int] | None:
+    engine = _READ_ENGINES.get(_path_key(db_path))
+    if engine is None or not isinstance(engine.pool, MeteredQueuePool):
+        return None
+    return engine.pool.metrics()
+
+
 def sessionmaker_for(db_path: Path) -> sessionmaker:
-    key = str(db_path.expanduser().resolve())
+    key = _path_key(db_path)
     sm = _SESSIONMAKERS.get(key)
     if sm is not None:
         return sm
 
-    engine = engine_for(db_path)
+    # Job sessions only read (writes go through the db writer); without a BEGIN
+    # they never hold the write lock and each query sees the latest commit.
+    engine = engine_for(db_path).execution_options(sqlite_begin=None)
     sm = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
     _SESSIONMAKERS[key] = sm
     return sm
@@ -82,6 +291,11 @@ def init_db(engine: Engine) -> None:
             return
 
         Base.metadata.create_all(engine)
+        applied = apply_migrations(engine, applied_at=datetime.now(timezone.utc).replace(microsecond=0).isoformat())
+        if applied:
+            logger.info("schema migrations applied: %s", ", ".join(applied))
+        with engine.begin() as conn:
+            sync_model_schema(conn)
 
         _INIT_DONE.add(key)
 
@@ -91,12 +305,14 @@ def upsert_photo(session: Session, rec: PhotoRecord) -> str:
     values = asdict(rec)
     # New rows should default to rating=0 (and existing rows should retain their rating).
     values.setdefault("rating", 0)
+    values["taken_at"] = taken_at_from_iso(rec.datetime_original)
 
     stmt = insert(Photo).values(**values)
     stmt = stmt.on_conflict_do_update(
         index_elements=[Photo.rel_path],
         set_={
             "datetime_original": stmt.excluded.datetime_original,
+            "taken_at": stmt.excluded.taken_at,
             "gps_altitude": stmt.excluded.gps_altitude,
             "gps_latitude": stmt.excluded.gps_latitude,
             "gps_longitude": stmt.excluded.gps_longitude,
@@ -146,30 +362,40 @@ def get_job(session: Session, job_id: str) -> ScanJob | None:
     return session.get(ScanJob, job_id)
 
 
-def fetch_photo(session: Session, guid: str) -> Optional[dict[str, Any]]:
-    row = session.execute(select(Photo).where(Photo.guid == guid)).scalar_one_or_none()
-    if row is None:
-        return None
+# Fields of a photo shown on its detail page and used to serve its files. Built
+# once on the table's columns: a plain Core select skips both ORM row loading
+# and per-call statement construction, which cost several times the query itself.
+_photos = Photo.__table__
+_FETCH_PHOTO = select(
+    *(
+        _photos.c[name]
+        for name in (
+            "guid",
+            "rel_path",
+            "datetime_original",
+            "taken_at",
+            "gps_altitude",
+            "gps_latitude",
+            "gps_longitude",
+            "camera_make",
+            "file_size",
+            "width",
+            "height",
+            "user_comment",
+            "rating",
+            "indexed_at",
+            "exif_error",
+            "geo_display_name",
+            "geo_lookup_status",
+            "geo_lookup_error",
+        )
+    )
+).where(_photos.c.guid == bindparam("guid"))
 
-    return {
-        "guid": row.guid,
-        "rel_path": row.rel_path,
-        "datetime_original": row.datetime_original,
-        "gps_altitude": row.gps_altitude,
-        "gps_latitude": row.gps_latitude,
-        "gps_longitude": row.gps_longitude,
-        "camera_make": row.camera_make,
-        "file_size": row.file_size,
-        "width": row.width,
-        "height": row.height,
-        "user_comment": row.user_comment,
-        "rating": row.rating,
-        "indexed_at": row.indexed_at,
-        "exif_error": row.exif_error,
-        "geo_display_name": row.geo_display_name,
-        "geo_lookup_status": row.geo_lookup_status,
-        "geo_lookup_error": row.geo_lookup_error,
-    }
+
+def fetch_photo(session: Session, guid: str) -> Optional[dict[str, Any]]:
+    row = session.execute(_FETCH_PHOTO, {"guid": guid}).mappings().first()
+    return dict(row) if row is not None else None
 
 
 def count_by_prefix(session: Session, prefix: str) -> int:
@@ -197,6 +423,10 @@ def list_tags(session: Session) -> list[Tag]:
     return list(session.execute(select(Tag).order_by(Tag.name_norm.asc())).scalars().all())
 
 
+# The write helpers below don't commit: they run as DbWriter ops (core/writer.py)
+# or inside a caller-managed transaction.
+
+
 def create_or_get_tag(
     session: Session,
     *,
@@ -221,8 +451,7 @@ def create_or_get_tag(
         color=color,
     )
     session.add(tag)
-    session.commit()
-    session.refresh(tag)
+    session.flush()
     return tag
 
 
@@ -243,7 +472,6 @@ def apply_tag_to_photos(session: Session, *, tag_id: int, guids: list[str]) -> i
     values = [{"photo_guid": g, "tag_id": int(tag_id)} for g in guids]
     stmt = insert(PhotoTag).values(values).on_conflict_do_nothing(index_elements=[PhotoTag.photo_guid, PhotoTag.tag_id])
     res = session.execute(stmt)
-    session.commit()
     try:
         return int(res.rowcount or 0)
     except Exception:
@@ -253,12 +481,90 @@ def apply_tag_to_photos(session: Session, *, tag_id: int, guids: list[str]) -> i
 def remove_tag_from_photos(session: Session, *, tag_id: int, guids: list[str]) -> int:
     if not guids:
         return 0
-    try:
-        stmt = delete(PhotoTag).where(PhotoTag.tag_id == int(tag_id)).where(PhotoTag.photo_guid.in_(guids))
+    stmt = delete(PhotoTag).where(PhotoTag.tag_id == int(tag_id)).where(PhotoTag.photo_guid.in_(guids))
+    res = session.execute(stmt)
+    return int(res.rowcount or 0)
+
+
+def pin_mids(session: Session, guids: list[str], *, reason: str) -> int:
+    """Protect mids from mid-cache eviction. Existing pins are kept as-is."""
+    if not guids:
+        return 0
+    now = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    n = 0
+    for i in range(0, len(guids), 500):
+        chunk = guids[i : i + 500]
+        values = [{"guid": g, "reason": reason, "pinned_at": now} for g in chunk]
+        stmt = insert(PinnedMid).values(values).on_conflict_do_nothing(index_elements=[PinnedMid.guid])
         res = session.execute(stmt)
-        n = int(res.rowcount or 0)
-    except Exception:
-        session.rollback()
-        raise
-    session.commit()
+        n += int(res.rowcount or 0)
     return n
+
+
+def unpin_mids(session: Session, guids: list[str]) -> int:
+    n = 0
+    for i in range(0, len(guids), 500):
+        res = session.execute(delete(PinnedMid).where(PinnedMid.guid.in_(guids[i : i + 500])))
+        n += int(res.rowcount or 0)
+    return n
+
+
+def prune_pinned_mids(session: Session, *, reason: str) -> list[str]:
+    """Drop pins of deleted photos and pins not made for `reason`; return the guids still pinned."""
+    rows = session.execute(
+        select(PinnedMid.guid, PinnedMid.reason, Photo.guid).outerjoin(Photo, Photo.guid == PinnedMid.guid)
+    ).all()
+    stale = [str(g) for g, r, photo_guid in rows if photo_guid is None or r != reason]
+    unpin_mids(session, stale)
+    return [str(g) for g, r, photo_guid in rows if photo_guid is not None and r == reason]
+
+
+def pinned_mid_guids(session: Session) -> set[str]:
+    return {str(g) for g in session.execute(select(PinnedMid.guid)).scalars().all()}
+
+
+def maintain_database(engine: Engine, *, db_path: Path, vacuum_pages: int = 0) -> dict[str, int | float]:
+    """Checkpoint and truncate the WAL, refresh planner stats and hand free pages back.
+
+    vacuum_pages=0 releases the whole freelist (only if the file uses
+    auto_vacuum=INCREMENTAL, i.e. it was created by this version).
+    """
+    wal_path = db_path.with_name(db_path.name + "-wal")
+
+    def _wal_mb() -> float:
+        try:
+            return round(wal_path.stat().st_size / 1e6, 1)
+        except FileNotFoundError:
+            return 0.0
+
+    wal_before = _wal_mb()
+    # Autocommit: a checkpoint can't run inside a transaction, and ANALYZE /
+    # incremental_vacuum each commit on their own instead of holding the lock.
+    with engine.connect().execution_options(sqlite_begin=None) as conn:
+        busy, _log_frames, _ckpt_frames = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE);").one()
+
+        has_stats = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'"
+        ).first()
+        if has_stats is None:
+            # PRAGMA optimize only re-analyzes tables it thinks changed; seed the stats once.
+            conn.exec_driver_sql("ANALYZE;")
+        conn.exec_driver_sql("PRAGMA analysis_limit=1000;")
+        conn.exec_driver_sql("PRAGMA optimize;")
+
+        freelist_before = int(conn.exec_driver_sql("PRAGMA freelist_count;").scalar_one())
+        auto_vacuum = int(conn.exec_driver_sql("PRAGMA auto_vacuum;").scalar_one())
+        if auto_vacuum == 2 and freelist_before > 0:
+            n = max(0, int(vacuum_pages))
+            conn.exec_driver_sql(f"PRAGMA incremental_vacuum({n});" if n else "PRAGMA incremental_vacuum;").fetchall()
+        freelist_after = int(conn.exec_driver_sql("PRAGMA freelist_count;").scalar_one())
+        conn.commit()
+
+    return {
+        "wal_mb_before": wal_before,
+        "wal_mb_after": _wal_mb(),
+        "checkpoint_busy": int(busy),
+        "freed_pages": max(0, freelist_before - freelist_after),
+        "free_pages": freelist_after,
+        "auto_vacuum": auto_vacuum,
+    }
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+
+from sqlalchemy import Float, and_, bindparam, case, false, literal_column, or_, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from .models import Photo
+
+
+# R*Tree over photo coordinates for the gallery's area filters. Rows are keyed
+# by photos.rowid and kept in sync by triggers, like photos_fts (and checked
+# the same way for renumbered rowids, see photo_geo_index_stale). The R*Tree
+# stores 32-bit floats rounded outward, so it yields a superset and the exact
+# test runs on photos.
+_RTREE_DDL = "CREATE VIRTUAL TABLE IF NOT EXISTS photos_geo USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+
+_VALID = (
+    "{r}.gps_latitude IS NOT NULL AND {r}.gps_longitude IS NOT NULL "
+    "AND {r}.gps_latitude BETWEEN -90 AND 90 AND {r}.gps_longitude BETWEEN -180 AND 180"
+)
+
+_RTREE_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS photos_geo_ai AFTER INSERT ON photos WHEN {_VALID.format(r="new")} BEGIN
+        INSERT OR REPLACE INTO photos_geo VALUES
+            (new.rowid, new.gps_latitude, new.gps_latitude, new.gps_longitude, new.gps_longitude);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS photos_geo_au AFTER UPDATE OF gps_latitude, gps_longitude ON photos
+    WHEN old.gps_latitude IS NOT new.gps_latitude OR old.gps_longitude IS NOT new.gps_longitude
+    BEGIN
+        DELETE FROM photos_geo WHERE id = old.rowid;
+        INSERT INTO photos_geo SELECT new.rowid, new.gps_latitude, new.gps_latitude, new.gps_longitude, new.gps_longitude
+        WHERE {_VALID.format(r="new")};
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS photos_geo_ad AFTER DELETE ON photos BEGIN
+        DELETE FROM photos_geo WHERE id = old.rowid;
+    END
+    """,
+)
+
+# Candidate count from which an area filter walks the timeline instead of
+# sorting its hits (see search.photo_search_clause).
+_DENSE_HITS = 5000
+# Timeline rows read from each end when looking for a dense area's first and
+# last photo, before falling back to the R*Tree candidates.
+_END_WALK = 2000
+_KM_PER_DEG = 111.32
+_NEAR_DEFAULT_KM = 1.0
+_NEAR_MAX_KM = 500.0
+
+
+def ensure_photo_geo_index(conn: Connection) -> None:
+    """Create the photos_geo R*Tree and its sync triggers if missing (rows are filled by the backfill)."""
+    conn.exec_driver_sql(_RTREE_DDL)
+    for ddl in _RTREE_TRIGGERS:
+        conn.exec_driver_sql(ddl)
+
+
+def backfill_photo_geo_index(session: Session, *, after_rowid: int, limit: int) -> tuple[int, int | None]:
+    """Index one batch of photos (rowid order, after `after_rowid`) that photos_geo is missing.
+
+    Returns (rows_indexed, last_rowid_seen); last_rowid_seen is None when done.
+    """
+    rowids = session.execute(
+        text("SELECT rowid FROM photos WHERE rowid > :after ORDER BY rowid LIMIT :limit"),
+        {"after": int(after_rowid), "limit": int(limit)},
+    ).scalars().all()
+    if not rowids:
+        return 0, None
+    last = int(rowids[-1])
+    result = session.execute(
+        text(
+            "INSERT OR IGNORE INTO photos_geo "
+            "SELECT p.rowid, p.gps_latitude, p.gps_latitude, p.gps_longitude, p.gps_longitude "
+            f"FROM photos p WHERE p.rowid > :after AND p.rowid <= :last AND {_VALID.format(r='p')}"
+        ),
+        {"after": int(after_rowid), "last": last},
+    )
+    return int(result.rowcount or 0), last
+
+
+def photo_geo_index_stale(session: Session) -> bool:
+    """True if photos_geo no longer lines up with photos by rowid.
+
+    Every box must hold its photo's coordinates, and there must be one box per
+    photo with valid coordinates. A box landing on another photo at the same
+    spot goes unnoticed, but it also selects the same photos.
+    """
+    mismatched = session.execute(
+        text(
+            "SELECT 1 FROM photos_geo g LEFT JOIN photos p ON p.rowid = g.id "
+            "WHERE p.gps_latitude IS NULL OR p.gps_longitude IS NULL "
+            "OR p.gps_latitude NOT BETWEEN g.min_lat AND g.max_lat "
+            "OR p.gps_longitude NOT BETWEEN g.min_lon AND g.max_lon LIMIT 1"
+        )
+    ).first()
+    if mismatched is not None:
+        return True
+    indexed, located = session.execute(
+        text(f"SELECT (SELECT count(*) FROM photos_geo), (SELECT count(*) FROM photos p WHERE {_VALID.format(r='p')})")
+    ).one()
+    return int(indexed) != int(located)
+
+
+def clear_photo_geo_index(session: Session) -> None:
+    conn = session.connection()
+    conn.exec_driver_sql("DROP TABLE IF EXISTS photos_geo")
+    ensure_photo_geo_index(conn)
+
+
+@dataclass(frozen=True)
+class GeoArea:
+    """A gallery area filter: a bounding box, optionally narrowed to a radius around a point.
+
+    west > east means the box crosses the antimeridian.
+    """
+
+    west: float
+    south: float
+    east: float
+    north: float
+    center: tuple[float, float] | None = None
+    radius_km: float | None = None
+
+    @classmethod
+    def near(cls, lat: float, lon: float, radius_km: float) -> GeoArea:
+        dlat = radius_km / _KM_PER_DEG
+        cos_lat = math.cos(math.radians(lat))
+        dlon = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (_KM_PER_DEG * cos_lat))
+        south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+        if dlon >= 180.0 or south == -90.0 or north == 90.0:
+            west, east = -180.0, 180.0
+        else:
+            west, east = lon - dlon, lon + dlon
+            if west < -180.0:
+                west += 360.0
+            if east > 180.0:
+                east -= 360.0
+        return cls(west, south, east, north, center=(lat, lon), radius_km=radius_km)
+
+    def _lon_ranges(self) -> list[tuple[float, float]]:
+        if self.west <= self.east:
+            return [(self.west, self.east)]
+        return [(self.west, 180.0), (-180.0, self.east)]
+
+    def exact_clause(self) -> ColumnElement[bool]:
+        """The area test on photos' own columns.
+
+        The unary + keeps SQLite from driving the query through idx_photos_gps
+        and sorting; the R*Tree candidates (or the timeline walk) drive it.
+        """
+        lat = literal_column("+photos.gps_latitude", Float)
+        lon = literal_column("+photos.gps_longitude", Float)
+        lon_ok = or_(*[lon.between(w, e) for w, e in self._lon_ranges()])
+        clause = and_(lat.between(self.south, self.north), lon_ok)
+        if self.center is not None and self.radius_km is not None:
+            # Equirectangular distance: plain arithmetic (SQLite may lack math
+            # functions) and close to great-circle at gallery-filter radii.
+            lat0, lon0 = self.center
+            kx = _KM_PER_DEG * math.cos(math.radians(lat0))
+            dx = _wrap(lon - lon0) * kx
+            dy = (lat - lat0) * _KM_PER_DEG
+            clause = and_(clause, dx * dx + dy * dy <= self.radius_km * self.radius_km)
+        return clause
+
+
+def _wrap(dlon: ColumnElement[float]) -> ColumnElement[float]:
+    # Shortest way round for a difference of longitudes in [-360, 360].
+    return case((dlon > 180.0, dlon - 360.0), (dlon < -180.0, dlon + 360.0), else_=dlon)
+
+
+def parse_bbox(raw: str | None) -> GeoArea | None:
+    """Parse a bbox filter, "west,south,east,north" in degrees (the map endpoint's order).
+
+    Returns None if empty; raises ValueError if malformed.
+    """
+    if raw is None or not raw.strip():
+        return None
+    parts = [float(p) for p in raw.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be west,south,east,north")
+    west, south, east, north = parts
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("bbox out of range")
+    return GeoArea(west, south, east, north)
+
+
+def parse_near(raw: str | None) -> GeoArea | None:
+    """Parse a near filter, "lat,lon" or "lat,lon,km" (radius defaults to 1 km).
+
+    Returns None if empty; raises ValueError if malformed.
+    """
+    if raw is None or not raw.strip():
+        return None
+    parts = [float(p) for p in raw.split(",")]
+    if len(parts) not in (2, 3):
+        raise ValueError("near must be lat,lon or lat,lon,km")
+    lat, lon = parts[0], parts[1]
+    radius_km = parts[2] if len(parts) == 3 else _NEAR_DEFAULT_KM
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 0 < radius_km <= _NEAR_MAX_KM):
+        raise ValueError("near out of range")
+    return GeoArea.near(lat, lon, radius_km)
+
+
+def _timeline_end(session: Session, area: GeoArea, *, newest: bool) -> int | None:
+    """taken_at of the area's newest (oldest) photo if it is among the _END_WALK newest (oldest) photos."""
+    ts = Photo.taken_at
+    order = ts.desc() if newest else ts.asc()
+    # Index-only: where a walk of _END_WALK rows from that end of the timeline stops.
+    edge = session.execute(select(ts).where(ts.is_not(None)).order_by(order).offset(_END_WALK).limit(1)).scalar()
+    q = select(ts).where(ts.is_not(None), area.exact_clause()).order_by(order).limit(1)
+    if edge is not None:
+        q = q.where(ts >= edge if newest else ts <= edge)
+    return session.execute(q).scalar()
+
+
+def photo_area_clause(session: Session, area: GeoArea) -> tuple[ColumnElement[bool], tuple[int, int] | None]:
+    """WHERE clause restricting a query on photos to those inside `area`, and the
+    area's taken_at span for TimelineFilter.within() (None if not needed).
+
+    Planned like photo_search_clause. A small area (fewer than _DENSE_HITS
+    photos in the R*Tree) drives the query from its R*Tree hits, kept in a
+    subquery, and its rows are fetched and sorted. A large one walks the
+    timeline index and tests each row's own coordinates; so many rows qualify
+    that a page fills after a short walk, which beats materializing the R*Tree
+    result on every page. The span stops
+    that walk at the area's oldest and newest photo, so a probe past either end
+    doesn't read the rest of the library.
+    """
+    boxes = " UNION ALL ".join(
+        f"SELECT id FROM photos_geo WHERE max_lat >= :s AND min_lat <= :n AND max_lon >= :w{i} AND min_lon <= :e{i}"
+        for i in range(len(area._lon_ranges()))
+    )
+    params: dict[str, float] = {"s": area.south, "n": area.north}
+    for i, (w, e) in enumerate(area._lon_ranges()):
+        params[f"w{i}"] = w
+        params[f"e{i}"] = e
+
+    hits = session.execute(
+        text(f"SELECT count(*) FROM ({boxes} LIMIT :cap)"), {**params, "cap": _DENSE_HITS}
+    ).scalar_one()
+    if int(hits) < _DENSE_HITS:
+        # Unique names: a page can carry two areas (bbox and near).
+        candidates = text(f"photos.rowid IN ({boxes})").bindparams(
+            *(bindparam(name, value, unique=True) for name, value in params.items())
+        )
+        return and_(candidates, area.exact_clause()), None
+
+    # Spread over time (the usual case for a big area), both ends turn up within
+    # a few rows. Photos bunched in one period (a trip, a home town since some
+    # year) miss an end; then aggregate the candidates, a pass over the R*Tree
+    # hits paid only by an area that is not spread out.
+    lo = _timeline_end(session, area, newest=False)
+    hi = _timeline_end(session, area, newest=True)
+    if lo is None or hi is None:
+        lo, hi = session.execute(
+            text(f"SELECT min(taken_at), max(taken_at) FROM photos WHERE rowid IN ({boxes})"), params
+        ).one()
+    if lo is None or hi is None:
+        return false(), None
+    return area.exact_clause(), (int(lo), int(hi))
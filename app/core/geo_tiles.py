@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+
+# Map clusters come from geo_tiles: per-tile photo counts at a few zoom levels,
+# kept current by triggers on photos like photo_counts. Tiles are a lat/lon
+# quadtree: at level z the world is cut into cells 360/2^z degrees wide and
+# high (the width of a slippy-map tile at zoom z), so x/y need only arithmetic
+# on the coordinates and work without SQLite's math functions. Each tile keeps
+# coordinate sums for a centroid marker and a representative photo (the first
+# one in; replaced from photos when that one leaves the tile).
+LEVELS = (2, 4, 6, 8, 10, 12, 14, 16, 18)
+
+# Clusters for map zoom Z come from level Z + 2: about 64 px per tile on a
+# 256 px tile map.
+_CLUSTER_LEVEL_OFFSET = 2
+
+_VALID = (
+    "{r}.gps_latitude IS NOT NULL AND {r}.gps_longitude IS NOT NULL "
+    "AND {r}.gps_latitude BETWEEN -90 AND 90 AND {r}.gps_longitude BETWEEN -180 AND 180"
+)
+
+
+def _scale(z: int) -> float:
+    return (1 << z) / 360.0
+
+
+def _tile_x(z: int, lon: str) -> str:
+    # min() keeps lon = 180 in the last column.
+    return f"min(CAST(({lon} + 180.0) * {_scale(z)!r} AS INTEGER), {(1 << z) - 1})"
+
+
+def _tile_y(z: int, lat: str) -> str:
+    return f"min(CAST(({lat} + 90.0) * {_scale(z)!r} AS INTEGER), {(1 << (z - 1)) - 1})"
+
+
+def _incr(z: int, r: str) -> str:
+    lat, lon = f"{r}.gps_latitude", f"{r}.gps_longitude"
+    return (
+        "INSERT INTO geo_tiles (z, x, y, n, lat_sum, lon_sum, rep_guid) "
+        f"SELECT {z}, {_tile_x(z, lon)}, {_tile_y(z, lat)}, 1, {lat}, {lon}, {r}.guid WHERE {_VALID.format(r=r)} "
+        "ON CONFLICT (z, x, y) DO UPDATE SET n = n + 1, lat_sum = lat_sum + excluded.lat_sum, "
+        "lon_sum = lon_sum + excluded.lon_sum, rep_guid = coalesce(rep_guid, excluded.rep_guid);"
+    )
+
+
+def _decr(z: int, r: str) -> str:
+    lat, lon = f"{r}.gps_latitude", f"{r}.gps_longitude"
+    x, y = _tile_x(z, lon), _tile_y(z, lat)
+    # Another photo in the same tile, found through idx_photos_gps (the band of
+    # latitudes the tile covers, widened a little against rounding). No other
+    # bound on p.gps_latitude here: in a trigger the planner can't tell which
+    # range is narrower and may pick a constant one, scanning the whole index.
+    step = 1.0 / _scale(z)
+    replacement = (
+        f"(SELECT p.guid FROM photos p WHERE p.guid IS NOT {r}.guid "
+        f"AND p.gps_latitude BETWEEN ({y}) * {step!r} - 90.0 - 1e-9 AND ({y} + 1) * {step!r} - 90.0 + 1e-9 "
+        "AND p.gps_longitude BETWEEN -180 AND 180 "
+        f"AND {_tile_x(z, 'p.gps_longitude')} = {x} AND {_tile_y(z, 'p.gps_latitude')} = {y} LIMIT 1)"
+    )
+    return (
+        f"UPDATE geo_tiles SET n = n - 1, lat_sum = lat_sum - {lat}, lon_sum = lon_sum - {lon}, "
+        f"rep_guid = CASE WHEN rep_guid = {r}.guid THEN {replacement} ELSE rep_guid END "
+        f"WHERE z = {z} AND x = {x} AND y = {y} AND {_VALID.format(r=r)};"
+    )
+
+
+def _steps(step, r: str) -> str:
+    return "\n".join(step(z, r) for z in LEVELS)
+
+
+_TILE_TRIGGERS = (
+    f"""
+    CREATE TRIGGER photos_geo_tiles_ai AFTER INSERT ON photos BEGIN
+        {_steps(_incr, "new")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER photos_geo_tiles_ad AFTER DELETE ON photos BEGIN
+        {_steps(_decr, "old")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER photos_geo_tiles_au AFTER UPDATE OF gps_latitude, gps_longitude ON photos
+    WHEN old.gps_latitude IS NOT new.gps_latitude OR old.gps_longitude IS NOT new.gps_longitude
+    BEGIN
+        {_steps(_decr, "old")}
+        {_steps(_incr, "new")}
+    END
+    """,
+)
+
+_TRIGGER_NAMES = ("photos_geo_tiles_ai", "photos_geo_tiles_ad", "photos_geo_tiles_au")
+
+
+def install_geo_tiles(conn: Connection) -> None:
+    """(Re)create the geo_tiles triggers and refill the table in the caller's transaction."""
+    for name in _TRIGGER_NAMES:
+        conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS "{name}"')
+    for ddl in _TILE_TRIGGERS:
+        conn.exec_driver_sql(ddl)
+    rebuild_geo_tiles(conn)
+
+
+def rebuild_geo_tiles(conn: Connection | Session) -> int:
+    """Recompute geo_tiles with one scan of photos per level. Returns rows written."""
+    conn.execute(text("DELETE FROM geo_tiles"))
+    written = 0
+    for z in LEVELS:
+        res = conn.execute(
+            text(
+                "INSERT INTO geo_tiles (z, x, y, n, lat_sum, lon_sum, rep_guid) "
+                f"SELECT {z}, {_tile_x(z, 'gps_longitude')}, {_tile_y(z, 'gps_latitude')}, "
+                "count(*), sum(gps_latitude), sum(gps_longitude), min(guid) "
+                f"FROM photos WHERE {_VALID.format(r='photos')} GROUP BY 2, 3"
+            )
+        )
+        written += int(res.rowcount or 0)
+    return written
+
+
+def cluster_level(zoom: int) -> int | None:
+    """Tile level that clusters map zoom `zoom`, or None past the finest level (show photos)."""
+    want = int(zoom) + _CLUSTER_LEVEL_OFFSET
+    if want > LEVELS[-1]:
+        return None
+    return max([z for z in LEVELS if z <= want], default=LEVELS[0])
+
+
+def _x_ranges(z: int, west: float, east: float) -> list[tuple[int, int]]:
+    last = (1 << z) - 1
+    scale = _scale(z)
+
+    def col(lon: float) -> int:
+        return min(last, max(0, int((lon + 180.0) * scale)))
+
+    if west <= east:
+        return [(col(west), col(east))]
+    # Viewport across the antimeridian.
+    return [(col(west), last), (0, col(east))]
+
+
+def geo_clusters(
+    session: Session,
+    *,
+    west: float,
+    south: float,
+    east: float,
+    north: float,
+    level: int,
+) -> list[dict[str, object]]:
+    """Non-empty tiles of `level` inside the viewport: centroid, count, representative guid, bounds."""
+    scale = _scale(level)
+    rows_max = (1 << (level - 1)) - 1
+    y0 = min(rows_max, max(0, int((south + 90.0) * scale)))
+    y1 = min(rows_max, max(0, int((north + 90.0) * scale)))
+    step = 1.0 / scale
+
+    clusters: list[dict[str, object]] = []
+    for x0, x1 in _x_ranges(level, west, east):
+        rows = session.execute(
+            text(
+                "SELECT x, y, n, lat_sum, lon_sum, rep_guid FROM geo_tiles "
+                "WHERE z = :z AND x BETWEEN :x0 AND :x1 AND y BETWEEN :y0 AND :y1 AND n > 0"
+            ),
+            {"z": level, "x0": x0, "x1": x1, "y0": y0, "y1": y1},
+        ).all()
+        for x, y, n, lat_sum, lon_sum, rep_guid in rows:
+            clusters.append(
+                {
+                    "lat": round(float(lat_sum) / n, 6),
+                    "lon": round(float(lon_sum) / n, 6),
+                    "count": int(n),
+                    "guid": rep_guid,
+                    "bounds": [
+                        round(y * step - 90.0, 6),
+                        round(x * step - 180.0, 6),
+                        round((y + 1) * step - 90.0, 6),
+                        round((x + 1) * step - 180.0, 6),
+                    ],
+                }
+            )
+    return clusters
+
+
+def geo_points(
+    session: Session,
+    *,
+    west: float,
+    south: float,
+    east: float,
+    north: float,
+    limit: int,
+) -> list[dict[str, object]]:
+    """Single photos inside the viewport (for zooms past the finest tile level), at most `limit`."""
+    lon_cond = "gps_longitude BETWEEN :west AND :east" if west <= east else "(gps_longitude >= :west OR gps_longitude <= :east)"
+    rows = session.execute(
+        text(
+            "SELECT guid, gps_latitude, gps_longitude FROM photos "
+            f"WHERE gps_latitude BETWEEN :south AND :north AND {lon_cond} LIMIT :limit"
+        ),
+        {"west": west, "south": south, "east": east, "north": north, "limit": int(limit)},
+    ).all()
+    return [{"lat": float(lat), "lon": float(lon), "count": 1, "guid": guid} for guid, lat, lon in rows]
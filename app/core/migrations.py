@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import Engine, bindparam, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .counts import ensure_photo_counts, install_photo_counts
+from .geo_index import (
+    backfill_photo_geo_index,
+    clear_photo_geo_index,
+    ensure_photo_geo_index,
+    photo_geo_index_stale,
+)
+from .geo_tiles import install_geo_tiles
+from .models import Base, Photo, PhotoTag, SchemaMigration
+from .search import backfill_photo_search, clear_photo_search, ensure_photo_search, photo_search_stale
+from .util import taken_at_from_iso
+
+
+# A backfill step handles one batch after `cursor` ("" on the first call) and
+# returns (rows_changed, next_cursor); next_cursor None means done.
+BackfillStep = Callable[[Session, str, int], tuple[int, str | None]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    """One schema step. `apply` runs in the startup transaction and must be
+    idempotent and cheap (DDL, or one set-based UPDATE that pages need before
+    they can show anything); row-by-row data work goes in `backfill`, which
+    runs afterwards in batches as a background job.
+
+    A backfill that builds an index keyed by photos.rowid also gives `stale`
+    (the index no longer matches photos, e.g. rowids were renumbered) and
+    `clear` (empty it), so requeue_backfills can rebuild it."""
+
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+    backfill: BackfillStep | None = None
+    stale: Callable[[Session], bool] | None = None
+    clear: Callable[[Session], None] | None = None
+
+
+def _columns(conn: Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")')}
+
+
+def _create_model_indexes(conn: Connection, names: tuple[str, ...]) -> None:
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            if idx.name in names:
+                idx.create(conn, checkfirst=True)
+
+
+# The forms the scanner stores ('YYYY-MM-DDTHH:MM:SS', optional fraction/offset)
+# and EXIF-style 'YYYY:MM:DD HH:MM:SS'. Anything else is left to backfill_taken_at.
+_TAKEN_AT_GLOB = "[0-9][0-9][0-9][0-9][-:][0-9][0-9][-:][0-9][0-9][T ][0-9][0-9]:[0-9][0-9]:[0-9][0-9]*"
+_TAKEN_AT_WALL = (
+    "substr(datetime_original, 1, 4) || '-' || substr(datetime_original, 6, 2) || '-'"
+    " || substr(datetime_original, 9, 2) || ' ' || substr(datetime_original, 12, 8)"
+)
+
+
+def _photos_taken_at(conn: Connection) -> None:
+    if "taken_at" not in _columns(conn, "photos"):
+        conn.exec_driver_sql('ALTER TABLE "photos" ADD COLUMN "taken_at" INTEGER')
+    # Fill the common forms here, before the indexes exist, so an upgraded
+    # library's gallery isn't empty while the backfill runs. Same result as
+    # taken_at_from_iso: wall clock read as UTC, offset and fraction dropped;
+    # the round trip through date() skips impossible dates SQLite would roll over.
+    conn.exec_driver_sql(
+        f"""
+        UPDATE "photos" SET "taken_at" = CAST(strftime('%s', {_TAKEN_AT_WALL}) AS INTEGER)
+        WHERE "taken_at" IS NULL
+          AND datetime_original GLOB '{_TAKEN_AT_GLOB}'
+          AND date(strftime('%s', {_TAKEN_AT_WALL}), 'unixepoch') = substr({_TAKEN_AT_WALL}, 1, 10)
+        """
+    )
+    _create_model_indexes(conn, ("idx_photos_taken_guid", "idx_photos_rating_taken_guid"))
+    # Replaced by the taken_at indexes above.
+    conn.exec_driver_sql('DROP INDEX IF EXISTS "idx_photos_dt_guid"')
+    conn.exec_driver_sql('DROP INDEX IF EXISTS "idx_photos_rating_dt_guid"')
+
+
+def backfill_taken_at(session: Session, cursor: str, limit: int) -> tuple[int, str | None]:
+    """Fill photos.taken_at for one batch of rows (guid order, after `cursor`)."""
+    rows = session.execute(
+        select(Photo.guid, Photo.datetime_original)
+        .where(Photo.guid > cursor)
+        .where(Photo.taken_at.is_(None))
+        .where(Photo.datetime_original.is_not(None))
+        .order_by(Photo.guid.asc())
+        .limit(int(limit))
+    ).all()
+    if not rows:
+        return 0, None
+    params = []
+    for guid, dt in rows:
+        ts = taken_at_from_iso(dt)
+        if ts is not None:
+            params.append({"b_guid": guid, "b_taken_at": ts})
+    if params:
+        session.execute(
+            update(Photo.__table__)
+            .where(Photo.__table__.c.guid == bindparam("b_guid"))
+            .values(taken_at=bindparam("b_taken_at")),
+            params,
+        )
+    return len(params), str(rows[-1][0])
+
+
+def _backfill_photos_fts(session: Session, cursor: str, limit: int) -> tuple[int, str | None]:
+    indexed, last = backfill_photo_search(session, after_rowid=int(cursor or 0), limit=limit)
+    return indexed, (str(last) if last is not None else None)
+
+
+def _gallery_filter_indexes(conn: Connection) -> None:
+    if "taken_at" not in _columns(conn, "photo_tags"):
+        conn.exec_driver_sql('ALTER TABLE "photo_tags" ADD COLUMN "taken_at" INTEGER')
+    # Copy what migration 1 already filled, so tag pages aren't empty during the backfill.
+    conn.exec_driver_sql(
+        """
+        UPDATE "photo_tags" SET "taken_at" = (SELECT taken_at FROM photos WHERE guid = photo_tags.photo_guid)
+        WHERE "taken_at" IS NULL
+        """
+    )
+    _create_model_indexes(
+        conn,
+        (
+            "idx_photos_country_taken_guid",
+            "idx_photos_city_taken_guid",
+            "idx_photos_country_city_taken_guid",
+            "idx_photo_tags_tag_taken_guid",
+            "idx_scan_jobs_started_job",
+        ),
+    )
+    # Prefixes of the composite geo indexes above.
+    for name in ("idx_photos_geo_country", "idx_photos_geo_city_norm", "idx_photos_geo_country_city_norm"):
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+    conn.exec_driver_sql(
+        """
+        CREATE TRIGGER IF NOT EXISTS photo_tags_taken_ai AFTER INSERT ON photo_tags BEGIN
+            UPDATE photo_tags SET taken_at = (SELECT taken_at FROM photos WHERE guid = new.photo_guid)
+            WHERE photo_guid = new.photo_guid AND tag_id = new.tag_id;
+        END
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        CREATE TRIGGER IF NOT EXISTS photos_tags_taken_au AFTER UPDATE OF taken_at ON photos
+        WHEN old.taken_at IS NOT new.taken_at
+        BEGIN
+            UPDATE photo_tags SET taken_at = new.taken_at WHERE photo_guid = new.guid;
+        END
+        """
+    )
+    # Adds the "city" dimension.
+    install_photo_counts(conn)
+
+
+def _backfill_photo_tags_taken_at(session: Session, cursor: str, limit: int) -> tuple[int, str | None]:
+    guids = session.execute(
+        select(PhotoTag.photo_guid)
+        .where(PhotoTag.photo_guid > cursor)
+        .where(PhotoTag.taken_at.is_(None))
+        .group_by(PhotoTag.photo_guid)
+        .order_by(PhotoTag.photo_guid.asc())
+        .limit(int(limit))
+    ).scalars().all()
+    if not guids:
+        return 0, None
+    res = session.execute(
+        update(PhotoTag)
+        .where(PhotoTag.photo_guid.in_(guids))
+        .values(taken_at=select(Photo.taken_at).where(Photo.guid == PhotoTag.photo_guid).scalar_subquery())
+    )
+    return int(res.rowcount or 0), str(guids[-1])
+
+
+def _geocode_negative_cache(conn: Connection) -> None:
+    existing = _columns(conn, "reverse_geocode_cache")
+    for name, col_type in (("status", "TEXT"), ("retry_after", "TEXT"), ("error_count", "INTEGER"), ("last_error", "TEXT")):
+        if name not in existing:
+            conn.exec_driver_sql(f'ALTER TABLE "reverse_geocode_cache" ADD COLUMN "{name}" {col_type}')
+
+
+def _geocode_parent_cells(conn: Connection) -> None:
+    existing = _columns(conn, "reverse_geocode_cache")
+    for name, col_type in (("place_lat", "REAL"), ("place_lon", "REAL"), ("place_votes", "INTEGER")):
+        if name not in existing:
+            conn.exec_driver_sql(f'ALTER TABLE "reverse_geocode_cache" ADD COLUMN "{name}" {col_type}')
+
+
+def _geo_tiles(conn: Connection) -> None:
+    _create_model_indexes(conn, ("idx_photos_gps",))
+    install_geo_tiles(conn)
+
+
+def _backfill_photos_geo(session: Session, cursor: str, limit: int) -> tuple[int, str | None]:
+    indexed, last = backfill_photo_geo_index(session, after_rowid=int(cursor or 0), limit=limit)
+    return indexed, (str(last) if last is not None else None)
+
+
+# Append only; never renumber or edit a released step.
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(1, "photos_taken_at", _photos_taken_at, backfill_taken_at),
+    Migration(
+        2, "photos_fts", ensure_photo_search, _backfill_photos_fts, stale=photo_search_stale, clear=clear_photo_search
+    ),
+    Migration(3, "photo_counts", ensure_photo_counts),
+    Migration(4, "gallery_filter_indexes", _gallery_filter_indexes, _backfill_photo_tags_taken_at),
+    Migration(5, "geocode_negative_cache", _geocode_negative_cache),
+    Migration(6, "geocode_parent_cells", _geocode_parent_cells),
+    Migration(7, "geo_tiles", _geo_tiles),
+    Migration(
+        8,
+        "photos_geo_rtree",
+        ensure_photo_geo_index,
+        _backfill_photos_geo,
+        stale=photo_geo_index_stale,
+        clear=clear_photo_geo_index,
+    ),
+)
+
+_BY_VERSION = {m.version: m for m in MIGRATIONS}
+
+
+def apply_migrations(engine: Engine, *, applied_at: str) -> list[str]:
+    """Apply pending migrations, each in its own transaction. Returns the names applied.
+
+    Backfills of migrations applied to an empty library are recorded as done
+    right away; otherwise they are left pending for the background runner.
+    """
+    applied: list[str] = []
+    for m in MIGRATIONS:
+        with engine.begin() as conn:
+            done = conn.execute(
+                select(SchemaMigration.version).where(SchemaMigration.version == m.version)
+            ).first()
+            if done:
+                continue
+            m.apply(conn)
+            state = None
+            if m.backfill is not None:
+                has_photos = conn.exec_driver_sql("SELECT 1 FROM photos LIMIT 1").first()
+                state = "pending" if has_photos else "done"
+            conn.execute(
+                SchemaMigration.__table__.insert().values(
+                    version=m.version,
+                    name=m.name,
+                    applied_at=applied_at,
+                    backfill_state=state,
+                    backfill_cursor="",
+                    backfill_rows=0,
+                )
+            )
+        applied.append(m.name)
+    return applied
+
+
+def sync_model_schema(conn: Connection) -> None:
+    """Safety net after the migrations: add model columns (nullable only) and indexes
+    that no migration created, so they never silently miss an existing database."""
+    for table in Base.metadata.sorted_tables:
+        existing = _columns(conn, table.name)
+        if not existing:
+            continue
+        for col in table.columns:
+            if col.name in existing:
+                continue
+            if not col.nullable:
+                raise RuntimeError(f"cannot add NOT NULL column {table.name}.{col.name} without a migration")
+            col_type = col.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {col_type}')
+        for idx in table.indexes:
+            idx.create(conn, checkfirst=True)
+
+
+def pending_backfills(session: Session) -> list[SchemaMigration]:
+    return list(
+        session.execute(
+            select(SchemaMigration)
+            .where(SchemaMigration.backfill_state == "pending")
+            .order_by(SchemaMigration.version.asc())
+        ).scalars().all()
+    )
+
+
+def stale_backfills(session: Session) -> list[int]:
+    """Versions whose finished backfill built an index that no longer matches photos (read-only)."""
+    stale: list[int] = []
+    for m in MIGRATIONS:
+        if m.stale is None:
+            continue
+        row = session.get(SchemaMigration, m.version)
+        if row is not None and row.backfill_state == "done" and m.stale(session):
+            stale.append(m.version)
+    return stale
+
+
+def requeue_backfills(session: Session, versions: list[int]) -> list[str]:
+    """Empty those migrations' indexes and mark their backfills pending again. Returns their names."""
+    names: list[str] = []
+    for version in versions:
+        m = _BY_VERSION[version]
+        row = session.get(SchemaMigration, version)
+        if row is None or m.clear is None:
+            continue
+        m.clear(session)
+        row.backfill_state = "pending"
+        row.backfill_cursor = ""
+        row.backfill_rows = 0
+        names.append(m.name)
+    return names
+
+
+def run_backfill_batch(session: Session, *, version: int, limit: int) -> tuple[int, int, bool]:
+    """Run one batch of a migration's backfill and record its cursor in the same transaction.
+
+    Returns (rows_this_batch, rows_total, done). Safe to resume after a restart.
+    """
+    m = _BY_VERSION[version]
+    row = session.get(SchemaMigration, version)
+    if row is None or m.backfill is None or row.backfill_state != "pending":
+        return 0, int(row.backfill_rows or 0) if row else 0, True
+    changed, next_cursor = m.backfill(session, row.backfill_cursor or "", int(limit))
+    row.backfill_rows = int(row.backfill_rows or 0) + int(changed)
+    if next_cursor is None:
+        row.backfill_state = "done"
+    else:
+        row.backfill_cursor = next_cursor
+    return int(changed), int(row.backfill_rows), next_cursor is None
@@ -15,6 +15,8 @@ class Photo(Base):
     rel_path: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
 
     datetime_original: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # datetime_original as epoch seconds, wall clock read as UTC (see util.taken_at_from_iso).
+    taken_at: Mapped[int | None] = mapped_column(Integer, nullable=True)
     gps_altitude: Mapped[float | None] = mapped_column(Float, nullable=True)
     gps_latitude: Mapped[float | None] = mapped_column(Float, nullable=True)
     gps_longitude: Mapped[float | None] = mapped_column(Float, nullable=True)
@@ -70,6 +72,45 @@ class PhotoTag(Base):
         ForeignKey("tags.id", ondelete="CASCADE"),
         primary_key=True,
     )
+    # Copy of photos.taken_at, kept in sync by triggers (core/migrations.py), so a
+    # tag-filtered timeline can walk idx_photo_tags_tag_taken_guid in order.
+    taken_at: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+
+class PinnedMid(Base):
+    """Mids that must survive mid-cache eviction (e.g. already pushed to a phone)."""
+
+    __tablename__ = "pinned_mids"
+
+    guid: Mapped[str] = mapped_column(Text, primary_key=True)
+    reason: Mapped[str | None] = mapped_column(Text, nullable=True)
+    pinned_at: Mapped[str] = mapped_column(Text, nullable=False)
+
+
+class GeoTile(Base):
+    """Photos per map tile at each level in core/geo_tiles.LEVELS, kept current by triggers."""
+
+    __tablename__ = "geo_tiles"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    z: Mapped[int] = mapped_column(Integer, primary_key=True)
+    x: Mapped[int] = mapped_column(Integer, primary_key=True)
+    y: Mapped[int] = mapped_column(Integer, primary_key=True)
+    n: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    lat_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    lon_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    rep_guid: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+
+class PhotoCount(Base):
+    """Photo counts per dimension (total|year|month|rating|tag|country), kept current by triggers."""
+
+    __tablename__ = "photo_counts"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    dim: Mapped[str] = mapped_column(Text, primary_key=True)
+    key: Mapped[str] = mapped_column(Text, primary_key=True)
+    n: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
 
 class ReverseGeocodeCache(Base):
@@ -94,30 +135,60 @@ class ReverseGeocodeCache(Base):
     last_used_at: Mapped[str] = mapped_column(Text, nullable=False)
     hit_count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
 
+    # Negative entries: "miss" (provider found nothing) or "error" (lookup failed)
+    # are served until retry_after, then looked up again. NULL status = ok (rows
+    # from before negative caching).
+    status: Mapped[str | None] = mapped_column(Text, nullable=True)  # ok|miss|error
+    retry_after: Mapped[str | None] = mapped_column(Text, nullable=True)
+    error_count: Mapped[int | None] = mapped_column(Integer, nullable=True)  # consecutive errors
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    # Where the resolved place is. Coarse parent cells (cell_m =
+    # GEOCODE_PARENT_CELL_M) count how many fine cells resolved to this place in
+    # place_votes; one that saw two different places gets status "mixed".
+    place_lat: Mapped[float | None] = mapped_column(Float, nullable=True)
+    place_lon: Mapped[float | None] = mapped_column(Float, nullable=True)
+    place_votes: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
 
 # Indexes for fast timeline pagination and prev/next within filters.
 Index(
-    "idx_photos_dt_guid",
-    Photo.datetime_original,
+    "idx_photos_taken_guid",
+    Photo.taken_at,
     Photo.guid,
-    sqlite_where=Photo.datetime_original.is_not(None),
+    sqlite_where=Photo.taken_at.is_not(None),
 )
 Index(
-    "idx_photos_rating_dt_guid",
+    "idx_photos_rating_taken_guid",
     Photo.rating,
-    Photo.datetime_original,
+    Photo.taken_at,
     Photo.guid,
-    sqlite_where=Photo.datetime_original.is_not(None),
+    sqlite_where=Photo.taken_at.is_not(None),
 )
-Index("idx_photos_geo_country", Photo.geo_country)
-Index("idx_photos_geo_city_norm", Photo.geo_city_norm)
-Index("idx_photos_geo_country_city_norm", Photo.geo_country, Photo.geo_city_norm)
+# One per gallery geo filter shape, ending in the timeline keys so pages never sort.
+Index("idx_photos_country_taken_guid", Photo.geo_country, Photo.taken_at, Photo.guid)
+Index("idx_photos_city_taken_guid", Photo.geo_city_norm, Photo.taken_at, Photo.guid)
+Index("idx_photos_country_city_taken_guid", Photo.geo_country, Photo.geo_city_norm, Photo.taken_at, Photo.guid)
 Index("idx_photos_geo_cache_key", Photo.geo_cache_key)
+# Map: photos in a viewport, and the next representative when a tile's leaves.
+Index(
+    "idx_photos_gps",
+    Photo.gps_latitude,
+    Photo.gps_longitude,
+    sqlite_where=Photo.gps_latitude.is_not(None),
+)
 
 # Tag lookups.
 Index("idx_tags_name_norm", Tag.name_norm, unique=True)
 Index("idx_photo_tags_tag_photo", PhotoTag.tag_id, PhotoTag.photo_guid)
 Index("idx_photo_tags_photo_tag", PhotoTag.photo_guid, PhotoTag.tag_id)
+Index(
+    "idx_photo_tags_tag_taken_guid",
+    PhotoTag.tag_id,
+    PhotoTag.taken_at,
+    PhotoTag.photo_guid,
+    sqlite_where=PhotoTag.taken_at.is_not(None),
+)
 Index("idx_rgc_country_city_norm", ReverseGeocodeCache.country, ReverseGeocodeCache.city_norm)
 
 
@@ -138,3 +209,33 @@ class ScanJob(Base):
     started_at: Mapped[str | None] = mapped_column(Text, nullable=True)
     finished_at: Mapped[str | None] = mapped_column(Text, nullable=True)
     message: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+
+# Dashboard job list (newest first).
+Index("idx_scan_jobs_started_job", ScanJob.started_at, ScanJob.job_id)
+
+
+class SchemaMigration(Base):
+    """Applied schema migrations (see core/migrations.py) and the progress of their backfills."""
+
+    __tablename__ = "schema_migrations"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(Text, nullable=False)
+    applied_at: Mapped[str] = mapped_column(Text, nullable=False)
+
+    backfill_state: Mapped[str | None] = mapped_column(Text, nullable=True)  # pending|done; NULL = none
+    backfill_cursor: Mapped[str | None] = mapped_column(Text, nullable=True)
+    backfill_rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class BackupSchedule(Base):
+    """Backup schedule saved from the dashboard (single row, id=1); until then the
+    DB_BACKUP_* settings apply."""
+
+    __tablename__ = "db_backup_schedule"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    interval_hours: Mapped[int] = mapped_column(Integer, nullable=False)  # 0 = manual only
+    keep: Mapped[int] = mapped_column(Integer, nullable=False)
+    updated_at: Mapped[str | None] = mapped_column(Text, nullable=True)
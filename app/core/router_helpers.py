@@ -1,25 +1,49 @@
 from __future__ import annotations
 
+import mimetypes
+import os
 from pathlib import Path
+from secrets import token_hex
+from typing import Annotated
+from urllib.parse import quote
 
-from fastapi import HTTPException
+import anyio
+
+from fastapi import Depends, HTTPException
 from pydantic import ValidationError
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.types import Send
+
+from .config import Settings, get_settings, reload_settings
+from .db import read_sessionmaker_for
+from ..services.derivatives import content_version, derivative_path, mid_path, thumb_path, versioned_url
 
-from .config import get_settings
 
+def _config_error(e: ValidationError) -> HTTPException:
+    return HTTPException(
+        status_code=500,
+        detail=(
+            "Invalid or missing configuration. Create phototank/.env (see app/.env.example) "
+            "and set PHOTO_ROOT. "
+            f"Details: {e.errors()}"
+        ),
+    )
 
-def settings_or_500():
+
+def settings_or_500() -> Settings:
     try:
         return get_settings()
     except ValidationError as e:
-        raise HTTPException(
-            status_code=500,
-            detail=(
-                "Invalid or missing configuration. Create phototank/.env (see app/.env.example) "
-                "and set PHOTO_ROOT. "
-                f"Details: {e.errors()}"
-            ),
-        )
+        raise _config_error(e)
+
+
+def reload_settings_or_500() -> tuple[Settings, list[str]]:
+    try:
+        return reload_settings()
+    except ValidationError as e:
+        raise _config_error(e)
 
 
 def ensure_dirs_and_db(photo_root: Path, db_path: Path) -> None:
@@ -39,3 +63,208 @@ def ensure_import_dirs(import_root: Path, failed_root: Path) -> None:
         raise HTTPException(status_code=400, detail=f"IMPORT_ROOT is not a directory: {import_root}")
     if not failed_root.is_dir():
         raise HTTPException(status_code=400, detail=f"FAILED_ROOT is not a directory: {failed_root}")
+
+
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison: a W/ prefix doesn't matter.
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse with well-formed multi-range replies.
+
+    Starlette (0.52) puts the multipart type into Content-Range and leaves the
+    file's type in Content-Type, which clients can't parse; this sends
+    Content-Type: multipart/byteranges and CRLF-delimited parts per RFC 9110.
+    Single ranges, If-Range and 416s are Starlette's own.
+    """
+
+    async def _handle_multiple_ranges(
+        self,
+        send: Send,
+        ranges: list[tuple[int, int]],
+        file_size: int,
+        send_header_only: bool,
+    ) -> None:
+        boundary = token_hex(13)
+        part_type = self.headers["content-type"]
+
+        def part_head(start: int, end: int) -> bytes:
+            return (
+                f"--{boundary}\r\nContent-Type: {part_type}\r\n"
+                f"Content-Range: bytes {start}-{end - 1}/{file_size}\r\n\r\n"
+            ).encode("latin-1")
+
+        closing = f"--{boundary}--\r\n".encode("latin-1")
+        length = sum(len(part_head(start, end)) + (end - start) + 2 for start, end in ranges) + len(closing)
+        self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        self.headers["content-length"] = str(length)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        if send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            for start, end in ranges:
+                await send({"type": "http.response.body", "body": part_head(start, end), "more_body": True})
+                await file.seek(start)
+                while start < end:
+                    chunk = await file.read(min(self.chunk_size, end - start))
+                    if not chunk:
+                        break
+                    start += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+        await send({"type": "http.response.body", "body": closing, "more_body": False})
+
+
+def _offload_header(settings: Settings, path: Path, *, root: Path, prefix: str) -> tuple[str, str] | None:
+    mode = (settings.file_offload or "off").strip().lower()
+    if mode not in ("nginx", "sendfile"):
+        return None
+    try:
+        rel = path.relative_to(root)
+    except ValueError:
+        try:
+            rel = path.resolve().relative_to(root.resolve())
+        except ValueError:
+            return None
+    target = f"{prefix.rstrip('/')}/{rel.as_posix()}"
+    if mode == "nginx":
+        # nginx percent-decodes the redirect URI.
+        return "X-Accel-Redirect", quote(target)
+    try:
+        target.encode("latin-1")
+    except UnicodeEncodeError:
+        return None  # not expressible in a header; serve it ourselves
+    return "X-Sendfile", target
+
+
+def file_response(
+    settings: Settings,
+    path: Path,
+    *,
+    root: Path,
+    prefix: str,
+    media_type: str | None = None,
+    filename: str | None = None,
+    headers: dict[str, str] | None = None,
+    stat_result: os.stat_result | None = None,
+) -> Response:
+    """Send the file at `path` (under `root`), offloaded to the web server if FILE_OFFLOAD is on.
+
+    Offloaded responses carry only headers; the web server sends the body and
+    handles Range itself. Otherwise RangeFileResponse serves it, including
+    Range, If-Range and multi-range requests.
+    """
+    media_type = media_type or mimetypes.guess_type(filename or path.name)[0] or "application/octet-stream"
+    offload = _offload_header(settings, path, root=root, prefix=prefix)
+    if offload is None:
+        return RangeFileResponse(
+            path, media_type=media_type, filename=filename, headers=headers, stat_result=stat_result
+        )
+    out = dict(headers or {})
+    out[offload[0]] = offload[1]
+    if filename is not None:
+        quoted = quote(filename)
+        out["Content-Disposition"] = (
+            f'attachment; filename="{filename}"' if quoted == filename else f"attachment; filename*=utf-8''{quoted}"
+        )
+    return Response(media_type=media_type, headers=out)
+
+
+def original_response(settings: Settings, path: Path, *, filename: str | None = None) -> Response:
+    return file_response(
+        settings,
+        path,
+        root=settings.photo_root,
+        prefix=settings.file_offload_originals,
+        filename=filename,
+    )
+
+
+def derivative_response(
+    request: Request,
+    settings: Settings,
+    path: Path,
+    *,
+    media_type: str = "image/webp",
+    immutable: bool = False,
+) -> Response:
+    """Serve a derivative with a strong ETag from its content version.
+
+    A URL whose ?v= matches the file's current version (see versioned_url),
+    or a content-addressed one (`immutable`), is cached for a year and never
+    revalidated. Any other URL must revalidate: a matching If-None-Match gets
+    a bodyless 304.
+    """
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="derivative not found")
+    version = content_version(st)
+    headers = {
+        "ETag": f'"{version}"',
+        "Cache-Control": _IMMUTABLE if immutable or request.query_params.get("v") == version else "no-cache",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return file_response(
+        settings,
+        path,
+        root=settings.deriv_root,
+        prefix=settings.file_offload_derivatives,
+        media_type=media_type,
+        headers=headers,
+        stat_result=st,
+    )
+
+
+# Derivative URLs carry the file's content version, so the browser caches
+# them for good and a regenerated file gets a new URL.
+def thumb_url(deriv_root: Path, guid: str) -> str:
+    return versioned_url(f"/phototank/thumb/{guid}", thumb_path(deriv_root, guid))
+
+
+def mid_url(deriv_root: Path, guid: str) -> str:
+    return versioned_url(f"/phototank/mid/{guid}", mid_path(deriv_root, guid))
+
+
+def sized_url(settings: Settings, guid: str, size: int) -> str:
+    path = derivative_path(settings.deriv_root, guid, size, thumb_max=settings.thumb_max, mid_max=settings.mid_max)
+    return versioned_url(f"/phototank/img/{size}/{guid}", path)
+
+
+# Request dependencies. They are async so FastAPI runs them on the event loop:
+# a sync dependency costs a threadpool round trip per request on top of the
+# handler's own. All of them are cheap lookups of per-process state.
+_LIBRARY_CHECKED: Settings | None = None
+
+
+async def app_settings() -> Settings:
+    return settings_or_500()
+
+
+async def library_settings() -> Settings:
+    """Settings, with PHOTO_ROOT and the database directory checked once per settings load."""
+    global _LIBRARY_CHECKED
+    settings = settings_or_500()
+    if settings is not _LIBRARY_CHECKED:
+        ensure_dirs_and_db(settings.photo_root, settings.db_path)
+        _LIBRARY_CHECKED = settings
+    return settings
+
+
+async def read_sessions(settings: Annotated[Settings, Depends(app_settings)]) -> sessionmaker:
+    return read_sessionmaker_for(settings.db_path)
+
+
+AppSettings = Annotated[Settings, Depends(app_settings)]
+LibrarySettings = Annotated[Settings, Depends(library_settings)]
+ReadSessions = Annotated[sessionmaker, Depends(read_sessions)]
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import re
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+
+# Full-text index over photo metadata. Rows are keyed by photos.rowid and kept
+# in sync by triggers, so every writer (ingest, geocode, tagging, deletes) is
+# covered without touching the write paths. photos has a TEXT primary key, so
+# SQLite doesn't promise its rowids survive a VACUUM (or a dump and reload);
+# photo_search_stale notices and the backfill runner rebuilds the index.
+_FTS_COLUMNS = ("user_comment", "geo_display_name", "geo_city", "camera_make", "rel_path", "tags")
+
+_TAGS_FOR = (
+    "(SELECT group_concat(t.name, ' ') FROM photo_tags pt JOIN tags t ON t.id = pt.tag_id "
+    "WHERE pt.photo_guid = {guid})"
+)
+
+_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS photos_fts USING fts5("
+    + ", ".join(_FTS_COLUMNS)
+    + ", tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+_FTS_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS photos_fts_ai AFTER INSERT ON photos BEGIN
+        INSERT INTO photos_fts (rowid, {", ".join(_FTS_COLUMNS)})
+        VALUES (new.rowid, new.user_comment, new.geo_display_name, new.geo_city, new.camera_make,
+                new.rel_path, {_TAGS_FOR.format(guid="new.guid")});
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS photos_fts_au
+    AFTER UPDATE OF user_comment, geo_display_name, geo_city, camera_make, rel_path ON photos
+    WHEN old.user_comment IS NOT new.user_comment
+      OR old.geo_display_name IS NOT new.geo_display_name
+      OR old.geo_city IS NOT new.geo_city
+      OR old.camera_make IS NOT new.camera_make
+      OR old.rel_path IS NOT new.rel_path
+    BEGIN
+        UPDATE photos_fts SET
+            user_comment = new.user_comment,
+            geo_display_name = new.geo_display_name,
+            geo_city = new.geo_city,
+            camera_make = new.camera_make,
+            rel_path = new.rel_path
+        WHERE rowid = new.rowid;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS photos_fts_ad AFTER DELETE ON photos BEGIN
+        DELETE FROM photos_fts WHERE rowid = old.rowid;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS photo_tags_fts_ai AFTER INSERT ON photo_tags BEGIN
+        UPDATE photos_fts SET tags = {_TAGS_FOR.format(guid="new.photo_guid")}
+        WHERE rowid = (SELECT rowid FROM photos WHERE guid = new.photo_guid);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS photo_tags_fts_ad AFTER DELETE ON photo_tags BEGIN
+        UPDATE photos_fts SET tags = {_TAGS_FOR.format(guid="old.photo_guid")}
+        WHERE rowid = (SELECT rowid FROM photos WHERE guid = old.photo_guid);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tags_fts_au AFTER UPDATE OF name ON tags BEGIN
+        UPDATE photos_fts SET tags = {_TAGS_FOR.format(guid="p.guid")}
+        FROM (SELECT photos.rowid AS rid, photos.guid FROM photo_tags
+              JOIN photos ON photos.guid = photo_tags.photo_guid
+              WHERE photo_tags.tag_id = new.id) AS p
+        WHERE photos_fts.rowid = p.rid;
+    END
+    """,
+)
+
+# Longest accepted query, in terms; keeps MATCH expressions cheap.
+_MAX_TERMS = 16
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+# Match count from which a search walks the timeline instead of sorting its hits.
+_DENSE_HITS = 5000
+
+
+def ensure_photo_search(conn: Connection) -> None:
+    """Create the photos_fts table and its sync triggers if missing (rows are filled by the backfill)."""
+    conn.exec_driver_sql(_FTS_DDL)
+    for ddl in _FTS_TRIGGERS:
+        conn.exec_driver_sql(ddl)
+
+
+def backfill_photo_search(session: Session, *, after_rowid: int, limit: int) -> tuple[int, int | None]:
+    """Index one batch of photos (rowid order, after `after_rowid`) that photos_fts is missing.
+
+    Returns (rows_indexed, last_rowid_seen); last_rowid_seen is None when done.
+    """
+    rowids = session.execute(
+        text("SELECT rowid FROM photos WHERE rowid > :after ORDER BY rowid LIMIT :limit"),
+        {"after": int(after_rowid), "limit": int(limit)},
+    ).scalars().all()
+    if not rowids:
+        return 0, None
+    last = int(rowids[-1])
+    result = session.execute(
+        text(
+            f"INSERT INTO photos_fts (rowid, {', '.join(_FTS_COLUMNS)}) "
+            "SELECT p.rowid, p.user_comment, p.geo_display_name, p.geo_city, p.camera_make, p.rel_path, "
+            f"{_TAGS_FOR.format(guid='p.guid')} "
+            "FROM photos p WHERE p.rowid > :after AND p.rowid <= :last "
+            "AND NOT EXISTS (SELECT 1 FROM photos_fts f WHERE f.rowid = p.rowid)"
+        ),
+        {"after": int(after_rowid), "last": last},
+    )
+    return int(result.rowcount or 0), last
+
+
+def photo_search_stale(session: Session) -> bool:
+    """True if photos_fts no longer lines up with photos by rowid.
+
+    rel_path is unique, so matching paths plus equal row counts means every
+    photo has exactly its own index row.
+    """
+    mismatched = session.execute(
+        text(
+            "SELECT 1 FROM photos_fts f LEFT JOIN photos p ON p.rowid = f.rowid "
+            "WHERE p.rel_path IS NOT f.rel_path LIMIT 1"
+        )
+    ).first()
+    if mismatched is not None:
+        return True
+    indexed, photos = session.execute(
+        text("SELECT (SELECT count(*) FROM photos_fts), (SELECT count(*) FROM photos)")
+    ).one()
+    return int(indexed) != int(photos)
+
+
+def clear_photo_search(session: Session) -> None:
+    # Dropping is far cheaper than deleting every row from the FTS index.
+    conn = session.connection()
+    conn.exec_driver_sql("DROP TABLE IF EXISTS photos_fts")
+    ensure_photo_search(conn)
+
+
+def fts_match_query(raw: str | None) -> str | None:
+    """Turn free text into a safe FTS5 MATCH expression.
+
+    Every word must match (as a prefix, so "lisb" finds "Lisbon"); FTS syntax in
+    the input is not interpreted. Returns None if there is nothing to search for.
+    """
+    if not raw:
+        return None
+    terms = _TERM_RE.findall(raw)[:_MAX_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def photo_search_clause(session: Session, match: str) -> TextClause:
+    """WHERE clause restricting a query on photos to rows matching `match` (see fts_match_query).
+
+    The plan depends on how many photos match. A selective term (fewer than
+    _DENSE_HITS) drives the query from its FTS hits, so it just fetches and
+    sorts those rows. A broad term ("canon", the home town) instead walks the
+    timeline index and checks each row against the match set; the unary +
+    stops SQLite from driving the query through tens of thousands of rowid
+    lookups and a sort, and the walk stops as soon as the page is full. Either
+    way the hits stay in a subquery rather than thousands of bound parameters.
+    """
+    hits = session.execute(
+        text("SELECT count(*) FROM (SELECT 1 FROM photos_fts WHERE photos_fts MATCH :fts_match LIMIT :cap)"),
+        {"fts_match": match, "cap": _DENSE_HITS},
+    ).scalar_one()
+    rowid = "photos.rowid" if int(hits) < _DENSE_HITS else "+photos.rowid"
+    return text(f"{rowid} IN (SELECT rowid FROM photos_fts WHERE photos_fts MATCH :fts_match)").bindparams(
+        fts_match=match
+    )
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.orm import InstrumentedAttribute
+
+from .models import Photo, PhotoTag
+
+
+# What a gallery tile shows. Pages select these columns rather than Photo, so
+# rows come back as plain tuples without building ORM objects or reading the
+# wide EXIF/geo text columns.
+TILE_COLUMNS = (Photo.guid, Photo.taken_at, Photo.datetime_original, Photo.rating)
+
+
+@dataclass(frozen=True)
+class TimelineFilter:
+    """Gallery/detail filter context, turned into keyset queries on (taken_at, guid).
+
+    Every filter shape has an index that yields rows already in timeline order
+    (see models.py), so pages never sort. With a tag filter the keys come from
+    photo_tags' denormalized copy of taken_at, so SQLite can walk
+    (tag_id, taken_at, photo_guid) and only look up the photos it returns;
+    a city is narrower than any tag, so tag + city walks the city index instead
+    and checks the tag per photo.
+
+    min_ts/max_ts bound the walk when another filter knows its rows' taken_at
+    range (see within()); they are folded into the keyset range itself, since
+    SQLite uses only one bound per side of an index range.
+    """
+
+    rating: int | None = None
+    tag_id: int | None = None
+    country: str | None = None
+    city_norm: str | None = None
+    min_ts: int | None = None
+    max_ts: int | None = None
+
+    def within(self, span: tuple[int, int] | None) -> TimelineFilter:
+        """Narrow to rows with taken_at in `span` (inclusive); None leaves the filter as is."""
+        if span is None:
+            return self
+        lo, hi = span
+        if self.min_ts is not None:
+            lo = max(lo, self.min_ts)
+        if self.max_ts is not None:
+            hi = min(hi, self.max_ts)
+        return replace(self, min_ts=lo, max_ts=hi)
+
+    def keys(self) -> tuple[InstrumentedAttribute, InstrumentedAttribute]:
+        if self.tag_id is not None and self.city_norm is None:
+            return PhotoTag.taken_at, PhotoTag.photo_guid
+        return Photo.taken_at, Photo.guid
+
+    def apply(self, stmt: Select) -> Select:
+        ts_col, _ = self.keys()
+        stmt = stmt.where(ts_col.is_not(None))
+        if self.tag_id is not None:
+            stmt = stmt.join(PhotoTag, PhotoTag.photo_guid == Photo.guid).where(PhotoTag.tag_id == self.tag_id)
+        if self.rating is not None:
+            stmt = stmt.where(Photo.rating == self.rating)
+        if self.country is not None:
+            stmt = stmt.where(Photo.geo_country == self.country)
+        if self.city_norm is not None:
+            stmt = stmt.where(Photo.geo_city_norm == self.city_norm)
+        return stmt
+
+    def _span(self, stmt: Select, lo: int | None = None, hi: int | None = None) -> Select:
+        ts_col, _ = self.keys()
+        if self.min_ts is not None:
+            lo = self.min_ts if lo is None else max(lo, self.min_ts)
+        if self.max_ts is not None:
+            hi = self.max_ts if hi is None else min(hi, self.max_ts)
+        if lo is not None:
+            stmt = stmt.where(ts_col >= lo)
+        if hi is not None:
+            stmt = stmt.where(ts_col <= hi)
+        return stmt
+
+    def at_or_before(self, stmt: Select, ts: int) -> Select:
+        return self.newest_first(self._span(stmt, hi=ts))
+
+    def older_than(self, stmt: Select, ts: int, guid: str) -> Select:
+        ts_col, guid_col = self.keys()
+        if self.min_ts is not None or self.max_ts is not None:
+            stmt = self._span(stmt, hi=ts)
+        return stmt.where(or_(ts_col < ts, and_(ts_col == ts, guid_col < guid)))
+
+    def newer_than(self, stmt: Select, ts: int, guid: str) -> Select:
+        ts_col, guid_col = self.keys()
+        if self.min_ts is not None or self.max_ts is not None:
+            stmt = self._span(stmt, lo=ts)
+        return stmt.where(or_(ts_col > ts, and_(ts_col == ts, guid_col > guid)))
+
+    def newest_first(self, stmt: Select) -> Select:
+        ts_col, guid_col = self.keys()
+        return stmt.order_by(ts_col.desc(), guid_col.desc())
+
+    def oldest_first(self, stmt: Select) -> Select:
+        ts_col, guid_col = self.keys()
+        return stmt.order_by(ts_col.asc(), guid_col.asc())
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+from datetime import datetime
 from pathlib import Path
 import base64
+import calendar
+import re
 
 from fastapi import HTTPException
 
@@ -31,6 +34,33 @@ def normalize_guid(raw: str) -> str:
     return s
 
 
+_LOOSE_DT_RE = re.compile(r"^(\d{4})\D(\d{1,2})\D(\d{1,2})(?:\D+(\d{1,2})\D(\d{1,2})(?:\D(\d{1,2}))?)?")
+
+
+def taken_at_from_iso(value: str | None) -> int | None:
+    """Convert a datetime_original string to epoch seconds for timeline ordering.
+
+    The wall-clock time is read as if it were UTC and any offset is ignored, so
+    the integer orders exactly like the local capture time shown in the UI.
+    Accepts ISO forms (with or without seconds/offset) and EXIF-style
+    'YYYY:MM:DD HH:MM:SS'. Returns None if unparseable.
+    """
+    if not value:
+        return None
+    s = str(value).strip()
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        m = _LOOSE_DT_RE.match(s)
+        if not m:
+            return None
+        try:
+            dt = datetime(*(int(g) if g else 0 for g in m.groups()))
+        except ValueError:
+            return None
+    return calendar.timegm(dt.replace(tzinfo=None).timetuple())
+
+
 def b64encode_cursor(dt: str, guid: str) -> str:
     raw = f"{dt}|{guid}".encode("utf-8")
     return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
@@ -50,3 +80,20 @@ def b64decode_cursor(cursor: str) -> tuple[str, str]:
         raise
     except Exception:
         raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def cursor_taken_at(cursor_dt: str) -> int:
+    """Timeline position of a decoded cursor.
+
+    Cursors carry taken_at; links minted before taken_at existed carry the ISO
+    datetime_original and are converted.
+    """
+    s = cursor_dt.strip()
+    if s.lstrip("-").isdigit():
+        ts = int(s) if len(s) <= 20 else None
+    else:
+        ts = taken_at_from_iso(s)
+    # Anything outside SQLite's INTEGER range would fail at bind time.
+    if ts is None or not -(2**63) <= ts < 2**63:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return ts
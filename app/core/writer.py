@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+from sqlalchemy import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from .db import engine_for, is_sqlite_lock_error
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Upper bound on operations folded into one transaction.
+_MAX_BATCH = 256
+# Attempts for a batch that hits a lock held by another process.
+_COMMIT_ATTEMPTS = 5
+
+
+@dataclass
+class _Op:
+    fn: Callable[[Session], Any]
+    future: Future
+
+
+class DbWriter:
+    """Single writer thread that owns the write connection for one database.
+
+    Callers submit `fn(session)` and get a Future. The writer drains everything
+    queued, runs each op in its own savepoint (a failing op only rolls back its
+    own changes and fails its own future) and commits the batch once. The batch
+    is one BEGIN IMMEDIATE transaction, so nothing is visible until that commit
+    and a batch that hits a lock is rolled back whole and retried.
+
+    Ops must not commit; return plain values, not ORM instances.
+    """
+
+    def __init__(self, engine: Engine, *, max_batch: int = _MAX_BATCH) -> None:
+        engine = engine.execution_options(sqlite_begin="IMMEDIATE")
+        self._SessionLocal = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, future=True)
+        self._max_batch = max(1, int(max_batch))
+        self._queue: queue.SimpleQueue[_Op] = queue.SimpleQueue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._ops = 0
+        self._largest_batch = 0
+        self._lock_retries = 0
+        self._thread = threading.Thread(target=self._loop, name=f"db-writer:{engine.url.database}", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable[[Session], T]) -> Future[T]:
+        fut: Future[T] = Future()
+        self._queue.put(_Op(fn=fn, future=fut))
+        return fut
+
+    def run(self, fn: Callable[[Session], T], *, timeout: float | None = None) -> T:
+        """Submit and wait for the result (re-raises the op's exception)."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("DbWriter.run called from inside a write op")
+        return self.submit(fn).result(timeout=timeout)
+
+    def stats(self) -> dict[str, int]:
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "ops": self._ops,
+                "largest_batch": self._largest_batch,
+                "lock_retries": self._lock_retries,
+                "queued": self._queue.qsize(),
+            }
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            batch = [op for op in batch if op.future.set_running_or_notify_cancel()]
+            if batch:
+                try:
+                    self._run_batch(batch)
+                except Exception as e:  # pragma: no cover - keep the writer alive
+                    logger.exception("db writer batch crashed")
+                    for op in batch:
+                        if not op.future.done():
+                            op.future.set_exception(e)
+
+    def _run_batch(self, batch: list[_Op]) -> None:
+        for attempt in range(1, _COMMIT_ATTEMPTS + 1):
+            outcomes: list[tuple[_Op, bool, Any]] = []
+            session = self._SessionLocal()
+            try:
+                for op in batch:
+                    try:
+                        with session.begin_nested():
+                            outcomes.append((op, True, op.fn(session)))
+                    except OperationalError as e:
+                        if is_sqlite_lock_error(e):
+                            raise  # not this op's fault: retry the whole batch
+                        outcomes.append((op, False, e))
+                    except Exception as e:
+                        outcomes.append((op, False, e))
+                session.commit()
+            except OperationalError as e:
+                # Nothing has committed yet (savepoints only release into the
+                # outer transaction), so re-running every op is safe.
+                session.rollback()
+                if is_sqlite_lock_error(e) and attempt < _COMMIT_ATTEMPTS:
+                    with self._stats_lock:
+                        self._lock_retries += 1
+                    time.sleep(0.05 * attempt)
+                    continue
+                logger.error("db writer commit failed ops=%d err=%s", len(batch), e)
+                for op in batch:
+                    op.future.set_exception(e)
+                return
+            except Exception as e:
+                session.rollback()
+                logger.exception("db writer commit failed ops=%d", len(batch))
+                for op in batch:
+                    op.future.set_exception(e)
+                return
+            finally:
+                session.close()
+
+            with self._stats_lock:
+                self._batches += 1
+                self._ops += len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
+            for op, ok, value in outcomes:
+                if ok:
+                    op.future.set_result(value)
+                else:
+                    op.future.set_exception(value)
+            return
+
+
+_WRITERS: dict[str, DbWriter] = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def writer_for_engine(engine: Engine) -> DbWriter:
+    key = str(engine.url)
+    with _WRITERS_LOCK:
+        w = _WRITERS.get(key)
+        if w is None:
+            w = _WRITERS[key] = DbWriter(engine)
+        return w
+
+
+def writer_for(db_path: Path) -> DbWriter:
+    return writer_for_engine(engine_for(db_path))
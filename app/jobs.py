@@ -86,3 +86,27 @@ def run_phone_reconcile_job(
         remote_dest_path=remote_dest_path,
         ssh_key_path=ssh_key_path,
     )
+
+
+def run_db_backup_job(job_id: str) -> None:
+    from .processing.jobs import run_db_backup_job as _run_db_backup_job
+
+    _run_db_backup_job(job_id)
+
+
+def run_db_maintenance_job(job_id: str) -> None:
+    from .processing.jobs import run_db_maintenance_job as _run_db_maintenance_job
+
+    _run_db_maintenance_job(job_id)
+
+
+def run_geocode_job(job_id: str) -> None:
+    from .processing.jobs import run_geocode_job as _run_geocode_job
+
+    _run_geocode_job(job_id)
+
+
+def run_rebuild_counts_job(job_id: str) -> None:
+    from .processing.jobs import run_rebuild_counts_job as _run_rebuild_counts_job
+
+    _run_rebuild_counts_job(job_id)
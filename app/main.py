@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from pathlib import Path
 
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
@@ -10,11 +11,48 @@ from starlette.requests import Request
 
 import json
 import logging
+import signal
+import threading
 
-from .core.config import get_settings
-from .core.db import engine_for, init_db
+from pydantic import ValidationError
+
+from .core.config import get_settings, reload_settings, restart_required
+from .core.db import configure_read_pool, configure_storage, engine_for, init_db
 from .core.logging_setup import setup_logging
 from .core.routes import router
+from .processing.backfill import start_pending_backfills
+from .processing.scheduler import start_backup_scheduler, start_maintenance_scheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+def _reload_settings_logged() -> None:
+    try:
+        _, changed = reload_settings()
+    except ValidationError as e:
+        logger.error("settings reload failed, keeping the current settings: %s", e.errors())
+        return
+    logger.info("settings reloaded; changed: %s", ", ".join(changed) or "nothing")
+    if restart_required(changed):
+        logger.warning("settings that need a restart changed: %s", ", ".join(restart_required(changed)))
+
+
+def _install_sighup_reload() -> None:
+    # The handler only starts a thread: it interrupts the main thread at an
+    # arbitrary point, where taking locks (logging's, pydantic's) could deadlock.
+    if not hasattr(signal, "SIGHUP"):
+        return
+    try:
+        signal.signal(
+            signal.SIGHUP,
+            lambda _signum, _frame: threading.Thread(
+                target=_reload_settings_logged, name="settings-reload", daemon=True
+            ).start(),
+        )
+    except ValueError:
+        # Not the main thread (e.g. a test client); POST /settings/reload still works.
+        pass
 
 
 def create_app() -> FastAPI:
@@ -31,8 +69,30 @@ def create_app() -> FastAPI:
     def _startup_init_db() -> None:
         # One-time init at process start; avoids doing DB setup per-request.
         settings = get_settings()
+        configure_storage(settings.sqlite_pragmas())
         engine = engine_for(settings.db_path)
         init_db(engine)
+        start_pending_backfills(settings.db_path)
+        _install_sighup_reload()
+        # Sync handlers run on anyio's thread limiter; give the read pool one
+        # connection per worker thread so a checkout never queues behind it.
+        threads = max(1, int(settings.web_threadpool_size))
+        anyio.to_thread.current_default_thread_limiter().total_tokens = threads
+        configure_read_pool(
+            size=threads,
+            timeout_s=float(settings.db_read_pool_timeout_s),
+            statement_cache=int(settings.db_read_statement_cache),
+        )
+        start_maintenance_scheduler(
+            settings.db_path,
+            interval_s=float(settings.db_maintenance_interval_min) * 60.0,
+            idle_s=float(settings.db_maintenance_idle_s),
+        )
+        start_backup_scheduler(
+            settings.db_path,
+            default_interval_hours=int(settings.db_backup_interval_hours),
+            default_keep=int(settings.db_backup_keep),
+        )
 
     validation_logger = logging.getLogger("phototank.validation")
 
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import logging
+import threading
+from pathlib import Path
+
+from sqlalchemy import update
+
+from ..core.db import create_job, sessionmaker_for
+from ..core.migrations import pending_backfills, requeue_backfills, stale_backfills
+from ..core.models import ScanJob
+from ..core.writer import writer_for
+from .progress import utc_now_iso
+
+
+logger = logging.getLogger(__name__)
+
+_RUNNING: set[str] = set()
+_RUNNING_LOCK = threading.Lock()
+
+
+def _fail_interrupted_backfills(session) -> int:
+    # A restart mid-backfill leaves its job row "running"; the work itself
+    # resumes from the saved cursor under a new job.
+    res = session.execute(
+        update(ScanJob)
+        .where(ScanJob.job_type == "backfill")
+        .where(ScanJob.state.in_(("queued", "running")))
+        .values(state="failed", message="interrupted by restart; resumed in a new job", finished_at=utc_now_iso())
+    )
+    return int(res.rowcount or 0)
+
+
+def requeue_stale_backfills(db_path: Path) -> list[str]:
+    """Rebuild rowid-keyed indexes that no longer match photos: empty them and mark
+    their backfills pending (start_pending_backfills then runs them). Returns their names."""
+    with sessionmaker_for(db_path)() as session:
+        stale = stale_backfills(session)
+    if not stale:
+        return []
+    names = writer_for(db_path).run(lambda session: requeue_backfills(session, stale))
+    logger.warning("indexes out of step with photos (rowids renumbered?); rebuilding: %s", ", ".join(names))
+    return names
+
+
+def start_pending_backfills(db_path: Path) -> None:
+    """Run pending migration backfills one after another as background jobs.
+
+    No-op while this process is already running them; the runner picks up
+    backfills queued while it works.
+    """
+    key = str(db_path.expanduser().resolve())
+    with _RUNNING_LOCK:
+        if key in _RUNNING:
+            return
+        _RUNNING.add(key)
+
+    from ..jobs import new_job_id
+    from .jobs.schema_backfill import run_schema_backfill_job
+
+    def _run() -> None:
+        try:
+            writer = writer_for(db_path)
+            writer.run(_fail_interrupted_backfills)
+            requeue_stale_backfills(db_path)
+            tried: set[int] = set()
+            while True:
+                with sessionmaker_for(db_path)() as session:
+                    pending = [(m.version, m.name) for m in pending_backfills(session) if m.version not in tried]
+                if not pending:
+                    break
+                for version, name in pending:
+                    tried.add(version)
+                    job_id = new_job_id()
+                    writer.run(lambda session, j=job_id: create_job(session, job_id=j, year=None, job_type="backfill"))
+                    logger.info("schema backfill started job_id=%s name=%s", job_id, name)
+                    run_schema_backfill_job(job_id, version=version, name=name)
+        except Exception:
+            logger.exception("schema backfills failed to start")
+        finally:
+            with _RUNNING_LOCK:
+                _RUNNING.discard(key)
+
+    threading.Thread(target=_run, name="schema-backfill", daemon=True).start()
@@ -2,56 +2,36 @@ from __future__ import annotations
 
 import logging
 import subprocess
-import time
+from concurrent.futures import Future
 
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
+from ..core.writer import DbWriter, writer_for_engine
 from ..core.models import ScanJob
 from .progress import utc_now_iso
 
 
-def is_sqlite_lock_error(exc: Exception) -> bool:
-    msg = str(getattr(exc, "orig", exc)).lower()
-    return "database is locked" in msg or "database table is locked" in msg
-
-
-def commit_with_retry(
-    session: Session,
-    *,
-    label: str,
-    logger: logging.Logger,
-    attempts: int = 6,
-    base_sleep_s: float = 0.2,
-) -> bool:
-    for attempt in range(1, attempts + 1):
-        try:
-            session.commit()
-            return True
-        except OperationalError as e:
-            if not is_sqlite_lock_error(e):
-                raise
-            try:
-                session.rollback()
-            except Exception:
-                pass
-            if attempt >= attempts:
-                logger.error("commit failed after retries label=%s err=%s", label, e)
-                return False
-            time.sleep(base_sleep_s * attempt)
+def _job_writer(SessionLocal) -> DbWriter:
+    return writer_for_engine(SessionLocal.kw["bind"])
 
 
 def mark_job_started(SessionLocal, *, job_id: str, message: str, logger: logging.Logger) -> bool:
-    with SessionLocal() as session:
+    def _op(session: Session) -> bool:
         job = session.get(ScanJob, job_id)
         if job is None:
             return False
         job.state = "running"
         job.started_at = utc_now_iso()
         job.message = message
-        commit_with_retry(session, label="set-job-started", logger=logger)
         return True
 
+    try:
+        return _job_writer(SessionLocal).run(_op)
+    except OperationalError as e:
+        logger.error("set job started failed job_id=%s err=%s", job_id, e)
+        return False
+
 
 def set_job_progress(
     SessionLocal,
@@ -66,8 +46,15 @@ def set_job_progress(
     mids_done: int | None = None,
     errors: int | None = None,
     finished: bool = False,
+    wait: bool = True,
 ) -> None:
-    with SessionLocal() as session:
+    """Update a job row through the db writer.
+
+    wait=False queues the update and returns immediately (progress ticks); final
+    state changes should wait so the row is settled when the job returns.
+    """
+
+    def _op(session: Session) -> None:
         job = session.get(ScanJob, job_id)
         if job is None:
             return
@@ -87,7 +74,27 @@ def set_job_progress(
             job.errors = errors
         if finished:
             job.finished_at = utc_now_iso()
-        commit_with_retry(session, label="set-job-progress", logger=logger)
+
+    fut = _job_writer(SessionLocal).submit(_op)
+    if not wait:
+        return
+    try:
+        fut.result()
+    except OperationalError as e:
+        logger.error("set job progress failed job_id=%s err=%s", job_id, e)
+
+
+def settle_writes(pending: list[Future], *, label: str, logger: logging.Logger) -> int:
+    """Wait for queued writer ops, clear the list and return how many failed."""
+    failed = 0
+    for fut in pending:
+        try:
+            fut.result()
+        except Exception as e:
+            failed += 1
+            logger.error("queued write failed label=%s err=%s", label, e)
+    pending.clear()
+    return failed
 
 
 def run_command(args: list[str], *, label: str, logger: logging.Logger) -> subprocess.CompletedProcess[str]:
@@ -1,13 +1,23 @@
 """Processing jobs package."""
 
+from .db_backup import run_db_backup_job
+from .db_maintenance import run_db_maintenance_job
+from .geocode import run_geocode_job
 from .ingest import run_ingest_job
 from .phone_reconcile import run_phone_reconcile_job
 from .phone_sync import run_phone_sync_job
+from .rebuild_counts import run_rebuild_counts_job
+from .schema_backfill import run_schema_backfill_job
 from .validate import run_validate_job
 
 __all__ = [
+	"run_db_backup_job",
+	"run_db_maintenance_job",
+	"run_geocode_job",
 	"run_ingest_job",
 	"run_phone_reconcile_job",
 	"run_phone_sync_job",
+	"run_rebuild_counts_job",
+	"run_schema_backfill_job",
 	"run_validate_job",
 ]
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import logging
+
+from ...core.backup import backup_database, backup_schedule
+from ...core.config import get_settings
+from ...core.db import sessionmaker_for
+from ..job_helpers import mark_job_started, set_job_progress
+
+
+logger = logging.getLogger(__name__)
+
+
+def run_db_backup_job(job_id: str) -> None:
+    settings = get_settings()
+    SessionLocal = sessionmaker_for(settings.db_path)
+
+    try:
+        started = mark_job_started(SessionLocal, job_id=job_id, message="phase=backup", logger=logger)
+        if not started:
+            return
+
+        with SessionLocal() as session:
+            _interval, keep = backup_schedule(
+                session,
+                default_interval_hours=settings.db_backup_interval_hours,
+                default_keep=settings.db_backup_keep,
+            )
+        res = backup_database(settings.db_path, keep=keep)
+        message = (
+            f"file={res['path'].name} size_mb={res['size_bytes'] / 1e6:.1f} "
+            f"duration_s={res['duration_s']} pages={res['pages']} rotated={len(res['removed'])}"
+        )
+        logger.info("db backup done job_id=%s %s", job_id, message)
+
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="done",
+            message=message,
+            processed=int(res["pages"]),
+            finished=True,
+        )
+    except Exception as e:
+        logger.exception("db backup job crashed job_id=%s", job_id)
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="failed",
+            message=f"{type(e).__name__}: {e}",
+            errors=1,
+            finished=True,
+        )
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import logging
+
+from ...core.config import get_settings
+from ...core.db import engine_for, maintain_database, sessionmaker_for
+from ..backfill import requeue_stale_backfills, start_pending_backfills
+from ..job_helpers import mark_job_started, set_job_progress
+
+
+logger = logging.getLogger(__name__)
+
+
+def run_db_maintenance_job(job_id: str) -> None:
+    settings = get_settings()
+    SessionLocal = sessionmaker_for(settings.db_path)
+
+    try:
+        started = mark_job_started(SessionLocal, job_id=job_id, message="phase=checkpoint", logger=logger)
+        if not started:
+            return
+
+        res = maintain_database(engine_for(settings.db_path), db_path=settings.db_path)
+        message = (
+            f"wal_mb={res['wal_mb_before']}->{res['wal_mb_after']} "
+            f"freed_pages={res['freed_pages']} free_pages={res['free_pages']}"
+        )
+        if res["checkpoint_busy"]:
+            message += " checkpoint=busy"
+        if res["auto_vacuum"] != 2:
+            message += " auto_vacuum=off"
+
+        set_job_progress(SessionLocal, job_id=job_id, logger=logger, message=f"phase=check-indexes {message}")
+        rebuilding = requeue_stale_backfills(settings.db_path)
+        if rebuilding:
+            message += f" rebuilding={','.join(rebuilding)}"
+            start_pending_backfills(settings.db_path)
+        logger.info("db maintenance done job_id=%s %s", job_id, message)
+
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="done",
+            message=message,
+            processed=1,
+            finished=True,
+        )
+    except Exception as e:
+        logger.exception("db maintenance job crashed job_id=%s", job_id)
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="failed",
+            message=f"{type(e).__name__}: {e}",
+            errors=1,
+            finished=True,
+        )
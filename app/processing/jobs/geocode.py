@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ...core.config import get_settings
+from ...core.db import sessionmaker_for
+from ...core.models import ScanJob
+from ...core.writer import writer_for
+from ...services.geocode import (
+    GeoCell,
+    GeoUpdate,
+    apply_cell_update,
+    geocode_halted,
+    job_geocode_cache,
+    pending_geocode_cells,
+    resolve_location,
+)
+from ..job_helpers import mark_job_started, set_job_progress, settle_writes
+
+
+logger = logging.getLogger(__name__)
+
+_PROGRESS_EVERY_CELLS = 50
+
+
+def run_geocode_job(job_id: str) -> None:
+    """Reverse-geocode every photo that needs it, one lookup per cache cell.
+
+    Photos are grouped by cache cell (provider, cell size, lat/lon bucket) and
+    cells are worked largest first, so most photos get a location early. Each
+    cell's result lands on all of its photos in one bulk UPDATE. GeoNames
+    lookups run GEOCODE_CONCURRENCY at a time under the client's rate limit.
+    """
+    settings = get_settings()
+    SessionLocal = sessionmaker_for(settings.db_path)
+
+    try:
+        if not mark_job_started(SessionLocal, job_id=job_id, message="phase=scan", logger=logger):
+            return
+
+        with SessionLocal() as session:
+            job = session.get(ScanJob, job_id)
+            year = job.year if job is not None else None
+            prefix = f"{year}/%" if year is not None else None
+            cells = pending_geocode_cells(session, settings=settings, rel_path_prefix=prefix)
+            geo_cache = job_geocode_cache(session, settings=settings)
+
+        total_cells = len(cells)
+        total_photos = sum(len(c.guids) for c in cells)
+        logger.info("geocode job job_id=%s cells=%s photos=%s", job_id, total_cells, total_photos)
+
+        # Lookups happen outside any write transaction; results are queued on the
+        # db writer and settled at progress ticks.
+        writer = writer_for(settings.db_path)
+        pending_writes: list[Future] = []
+
+        cells_done = 0
+        photos_done = 0
+        located = 0
+        lookups = 0
+        errors = 0
+        halted = False
+
+        def _message() -> str:
+            msg = f"cells={cells_done}/{total_cells} photos={photos_done}/{total_photos} lookups={lookups}"
+            if geo_cache is not None:
+                msg += " " + geo_cache.summary()
+            return msg + " halted=geonames_hourly_limit" if halted else msg
+
+        def _settle() -> int:
+            if geo_cache is not None:
+                fut = geo_cache.flush(writer)
+                if fut is not None:
+                    pending_writes.append(fut)
+            return settle_writes(pending_writes, label="geocode-cell", logger=logger)
+
+        def _resolve(cell: GeoCell) -> GeoUpdate | None:
+            # A short read per cell, so a slow provider never pins a WAL snapshot.
+            with SessionLocal() as session:
+                return resolve_location(
+                    session,
+                    settings=settings,
+                    guid=cell.guids[0],
+                    lat=cell.lat,
+                    lon=cell.lon,
+                    cache=geo_cache,
+                )
+
+        online = (settings.geocode_provider or "").strip().lower() == "geonames"
+        workers = max(1, int(settings.geocode_concurrency)) if online else 1
+        remaining = iter(cells)
+        in_flight: deque[tuple[GeoCell, Future]] = deque()
+        stop = False
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geocode") as pool:
+            while True:
+                # Keep a short queue ahead of the workers, in cell order.
+                while not stop and len(in_flight) < workers * 2:
+                    cell = next(remaining, None)
+                    if cell is None:
+                        break
+                    in_flight.append((cell, pool.submit(_resolve, cell)))
+                if not in_flight:
+                    break
+
+                cell, fut = in_flight.popleft()
+                update = fut.result()
+                if geocode_halted(settings):
+                    halted = stop = True
+                if update is None:
+                    # Geocoding was switched off mid-run.
+                    stop = True
+                    continue
+                if update.cache_key is None:
+                    # Refused without a lookup while halted; leave these photos for later.
+                    continue
+
+                if update.looked_up:
+                    lookups += 1
+                pending_writes.append(writer.submit(lambda ws, u=update, g=cell.guids: apply_cell_update(ws, u, g)))
+
+                cells_done += 1
+                photos_done += len(cell.guids)
+                if update.values.get("geo_lookup_status") == "ok":
+                    located += len(cell.guids)
+
+                if cells_done == 1 or cells_done % _PROGRESS_EVERY_CELLS == 0:
+                    errors += _settle()
+                    set_job_progress(
+                        SessionLocal,
+                        job_id=job_id,
+                        logger=logger,
+                        message=_message(),
+                        processed=photos_done,
+                        upserted=located,
+                        errors=errors,
+                        wait=False,
+                    )
+
+        errors += _settle()
+        message = _message()
+        logger.info("geocode job done job_id=%s %s located=%s", job_id, message, located)
+
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="done",
+            message=message,
+            processed=photos_done,
+            upserted=located,
+            errors=errors,
+            finished=True,
+        )
+    except Exception as e:
+        logger.exception("geocode job crashed job_id=%s", job_id)
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="failed",
+            message=f"{type(e).__name__}: {e}",
+            errors=1,
+            finished=True,
+        )
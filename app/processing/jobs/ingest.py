@@ -3,21 +3,26 @@ from __future__ import annotations
 import logging
 import os
 import shutil
+from concurrent.futures import Future
 from dataclasses import replace
 from datetime import datetime, timezone
 from pathlib import Path
 
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
 
 from ...core.config import get_settings
 from ...core.db import sessionmaker_for, upsert_photo
-from ...services.derivatives import ensure_derivatives, mid_path, thumb_path
-from ...services.geocode import enrich_photo_location
+from ...services.decode_budget import JobRss, decode_summary
+from ...services.derivatives import ensure_derivatives, remove_derivatives
+from ...services.geocode import apply_geo_update, job_geocode_cache, resolve_photo_location
+from ...services.geocode_cache import GeoCacheLRU
+from ...services.mid_cache import enforce_mid_budget_for
 from ...core.models import ScanJob
 from ...services.scanner import build_record, extract_exif_fields, iter_photo_files, try_datetime_from_filename
 from ...core.util import normalize_guid, resolve_relpath_under
-from ..job_helpers import commit_with_retry
+from ...core.writer import DbWriter, writer_for
+from ..job_helpers import set_job_progress, settle_writes
 
 
 logger = logging.getLogger(__name__)
@@ -126,37 +131,18 @@ def _quarantine_failed_copy(*, src_path: Path, failed_root: Path) -> Path:
     return _safe_copy(src_path, dst)
 
 
-def _cleanup_db_and_derivs(*, session: Session, guid: str, deriv_root: Path) -> None:
+def _cleanup_db_and_derivs(*, writer: DbWriter, guid: str, deriv_root: Path) -> None:
     try:
-        tpath = thumb_path(deriv_root, guid)
-        mpath = mid_path(deriv_root, guid)
-        try:
-            tpath.unlink()
-        except FileNotFoundError:
-            pass
-        except Exception:
-            pass
-        try:
-            mpath.unlink()
-        except FileNotFoundError:
-            pass
-        except Exception:
-            pass
+        remove_derivatives(deriv_root, guid)
     except Exception:
         pass
 
     try:
         from ...core.models import Photo
 
-        photo = session.get(Photo, guid)
-        if photo is not None:
-            session.delete(photo)
-            session.commit()
+        writer.run(lambda session: session.execute(delete(Photo).where(Photo.guid == guid)))
     except Exception:
-        try:
-            session.rollback()
-        except Exception:
-            pass
+        pass
 
 
 def run_ingest_job(
@@ -182,22 +168,28 @@ def run_ingest_job(
     )
 
     SessionLocal = sessionmaker_for(settings.db_path)
+    # All writes go through the db writer; the job's own session only reads, so
+    # derivative rendering and geocode lookups never hold a write transaction.
+    writer = writer_for(settings.db_path)
 
-    with SessionLocal() as session:
+    def _start(session: Session) -> bool:
         job = session.get(ScanJob, job_id)
         if job is None:
-            return {
-                "processed": 0,
-                "upserted": 0,
-                "thumbs_done": 0,
-                "mids_done": 0,
-                "errors": 0,
-                "inserted_guids": [],
-            }
+            return False
         if manage_job_state:
             job.state = "running"
             job.started_at = utc_now_iso()
-        commit_with_retry(session, label="ingest-start", logger=logger)
+        return True
+
+    if not writer.run(_start):
+        return {
+            "processed": 0,
+            "upserted": 0,
+            "thumbs_done": 0,
+            "mids_done": 0,
+            "errors": 0,
+            "inserted_guids": [],
+        }
 
     exts = settings.extensions_set()
     import_root = (import_root_override or settings.import_root).resolve()
@@ -211,23 +203,33 @@ def run_ingest_job(
     thumbs_done = 0
     mids_done = 0
     errors = 0
+    peak_decode_bytes = 0
+    reduced_decodes = 0
     inserted_guids: set[str] = set()
+    pending_writes: list[Future] = []
+    # Holds new cache rows as soon as they resolve, so the next photo in the same
+    # cell hits them without waiting for the write to land.
+    geo_cache: GeoCacheLRU | None = None
+
+    def _queue_geocode(photo) -> None:
+        update = resolve_photo_location(session, settings=settings, photo=photo, cache=geo_cache)
+        if update is not None:
+            pending_writes.append(writer.submit(lambda ws, u=update: apply_geo_update(ws, u)))
+
+    def _settle_geocode() -> int:
+        if geo_cache is not None:
+            fut = geo_cache.flush(writer)
+            if fut is not None:
+                pending_writes.append(fut)
+        return settle_writes(pending_writes, label="ingest-photo-geocode", logger=logger)
 
     failed_root_resolved = failed_root.resolve()
 
     try:
         session = SessionLocal()
+        job_rss = JobRss().start()
         try:
-            job = session.get(ScanJob, job_id)
-            if job is None:
-                return {
-                    "processed": 0,
-                    "upserted": 0,
-                    "thumbs_done": 0,
-                    "mids_done": 0,
-                    "errors": 0,
-                    "inserted_guids": [],
-                }
+            geo_cache = job_geocode_cache(session, settings=settings)
 
             for src_path in iter_photo_files(import_root, exts):
                 try:
@@ -250,7 +252,7 @@ def run_ingest_job(
                     if guid_in_name:
                         from ...core.models import Photo
 
-                        existing = session.get(Photo, guid_in_name)
+                        existing = session.get(Photo, guid_in_name, populate_existing=True)
                         if existing is not None and getattr(existing, "rel_path", None):
                             dest_path = resolve_relpath_under(settings.photo_root, existing.rel_path)
                             placed_path = _replace_into_library(
@@ -260,15 +262,7 @@ def run_ingest_job(
                             )
 
                             try:
-                                thumb_path(settings.deriv_root, guid_in_name).unlink()
-                            except FileNotFoundError:
-                                pass
-                            except Exception:
-                                pass
-                            try:
-                                mid_path(settings.deriv_root, guid_in_name).unlink()
-                            except FileNotFoundError:
-                                pass
+                                remove_derivatives(settings.deriv_root, guid_in_name)
                             except Exception:
                                 pass
 
@@ -288,12 +282,12 @@ def run_ingest_job(
                                 user_comment=rec.user_comment or existing.user_comment,
                             )
 
-                            guid = upsert_photo(session, rec)
+                            guid = writer.run(lambda ws, r=rec: upsert_photo(ws, r))
                             upserted += 1
 
-                            existing = session.get(Photo, guid)
+                            existing = session.get(Photo, guid, populate_existing=True)
                             if existing is not None:
-                                enrich_photo_location(session, settings=settings, photo=existing)
+                                _queue_geocode(existing)
 
                             deriv = ensure_derivatives(
                                 source_path=placed_path,
@@ -304,13 +298,19 @@ def run_ingest_job(
                                 mid_max=settings.mid_max,
                                 thumb_quality=settings.thumb_quality,
                                 mid_quality=settings.mid_quality,
+                                sizes=settings.deriv_sizes_list(),
+                                size_quality=settings.deriv_size_quality,
+                                decode_budget_bytes=settings.decode_budget_bytes(),
+                                reduce_over_pixels=settings.decode_reduce_over_pixels(),
                             )
                             if deriv.thumb_created:
                                 thumbs_done += 1
                             if deriv.mid_created:
                                 mids_done += 1
+                            peak_decode_bytes = max(peak_decode_bytes, deriv.decode_bytes)
+                            if deriv.reduced_decode:
+                                reduced_decodes += 1
 
-                            session.commit()
                             continue
 
                     dt_iso = _infer_datetime_for_import(src_path, settings.datetime_fallback_order())
@@ -342,14 +342,14 @@ def run_ingest_job(
                             select(Photo.guid).where(Photo.rel_path == rec.rel_path)
                         ).scalar_one_or_none()
 
-                        guid = upsert_photo(session, rec)
+                        guid = writer.run(lambda ws, r=rec: upsert_photo(ws, r))
                         if existing_guid is None:
                             inserted_guids.add(guid)
                         upserted += 1
 
-                        photo = session.get(Photo, guid)
+                        photo = session.get(Photo, guid, populate_existing=True)
                         if photo is not None:
-                            enrich_photo_location(session, settings=settings, photo=photo)
+                            _queue_geocode(photo)
 
                         deriv = ensure_derivatives(
                             source_path=placed_path,
@@ -360,21 +360,23 @@ def run_ingest_job(
                             mid_max=settings.mid_max,
                             thumb_quality=settings.thumb_quality,
                             mid_quality=settings.mid_quality,
+                            sizes=settings.deriv_sizes_list(),
+                            size_quality=settings.deriv_size_quality,
+                            decode_budget_bytes=settings.decode_budget_bytes(),
+                            reduce_over_pixels=settings.decode_reduce_over_pixels(),
                         )
                         if deriv.thumb_created:
                             thumbs_done += 1
                         if deriv.mid_created:
                             mids_done += 1
-
-                        session.commit()
+                        peak_decode_bytes = max(peak_decode_bytes, deriv.decode_bytes)
+                        if deriv.reduced_decode:
+                            reduced_decodes += 1
 
                     except Exception:
-                        try:
-                            session.rollback()
-                        except Exception:
-                            pass
                         if guid is not None:
-                            _cleanup_db_and_derivs(session=session, guid=guid, deriv_root=settings.deriv_root)
+                            errors += _settle_geocode()
+                            _cleanup_db_and_derivs(writer=writer, guid=guid, deriv_root=settings.deriv_root)
                         if ingest_mode == "move":
                             try:
                                 _safe_move(placed_path, failed_root / placed_path.name)
@@ -393,10 +395,6 @@ def run_ingest_job(
                         logger.exception("ingest error job_id=%s src=%s placed=%s", job_id, src_path, placed_path)
 
                 except Exception:
-                    try:
-                        session.rollback()
-                    except Exception:
-                        pass
                     try:
                         if ingest_mode == "move":
                             _quarantine_failed(src_path=src_path, failed_root=failed_root)
@@ -408,22 +406,51 @@ def run_ingest_job(
                     logger.exception("ingest error job_id=%s path=%s", job_id, src_path)
 
                 if processed == 1 or processed % 50 == 0:
-                    job.processed = processed
-                    job.upserted = upserted
-                    job.thumbs_done = thumbs_done
-                    job.mids_done = mids_done
-                    job.errors = errors
-                    commit_with_retry(session, label="ingest-progress", logger=logger)
-
-            job.processed = processed
-            job.upserted = upserted
-            job.thumbs_done = thumbs_done
-            job.mids_done = mids_done
-            job.errors = errors
-            if manage_job_state:
-                job.state = "done"
-                job.finished_at = utc_now_iso()
-            commit_with_retry(session, label="ingest-finish", logger=logger)
+                    errors += _settle_geocode()
+                    set_job_progress(
+                        SessionLocal,
+                        job_id=job_id,
+                        logger=logger,
+                        processed=processed,
+                        upserted=upserted,
+                        thumbs_done=thumbs_done,
+                        mids_done=mids_done,
+                        errors=errors,
+                        wait=False,
+                    )
+
+            # Phone sync (manage_job_state=False) pins its mids before evicting.
+            if manage_job_state and mids_done and settings.mid_cache_budget_bytes() > 0:
+                try:
+                    enforce_mid_budget_for(settings)
+                except Exception:
+                    logger.exception("mid cache eviction failed job_id=%s", job_id)
+
+            errors += _settle_geocode()
+            set_job_progress(
+                SessionLocal,
+                job_id=job_id,
+                logger=logger,
+                state="done" if manage_job_state else None,
+                message=(
+                    " ".join(
+                        [
+                            decode_summary(
+                                peak_decode_bytes=peak_decode_bytes, reduced_decodes=reduced_decodes, job_rss=job_rss
+                            )
+                        ]
+                        + ([geo_cache.summary()] if geo_cache is not None else [])
+                    )
+                    if manage_job_state
+                    else None
+                ),
+                processed=processed,
+                upserted=upserted,
+                thumbs_done=thumbs_done,
+                mids_done=mids_done,
+                errors=errors,
+                finished=manage_job_state,
+            )
 
             logger.info(
                 "ingest job done job_id=%s ingest_mode=%s processed=%s upserted=%s thumbs_done=%s mids_done=%s errors=%s",
@@ -443,26 +470,30 @@ def run_ingest_job(
                 "mids_done": mids_done,
                 "errors": errors,
                 "inserted_guids": sorted(inserted_guids),
+                "peak_decode_bytes": peak_decode_bytes,
+                "reduced_decodes": reduced_decodes,
             }
 
         finally:
+            job_rss.stop()
             session.close()
 
     except Exception as e:
         logger.exception("ingest job crashed job_id=%s ingest_mode=%s", job_id, ingest_mode)
         if manage_job_state:
-            with SessionLocal() as session:
-                job = session.get(ScanJob, job_id)
-                if job is not None:
-                    job.state = "failed"
-                    job.message = f"{type(e).__name__}: {e}"
-                    job.finished_at = utc_now_iso()
-                    job.processed = processed
-                    job.upserted = upserted
-                    job.thumbs_done = thumbs_done
-                    job.mids_done = mids_done
-                    job.errors = errors
-                    commit_with_retry(session, label="ingest-failed", logger=logger)
+            set_job_progress(
+                SessionLocal,
+                job_id=job_id,
+                logger=logger,
+                state="failed",
+                message=f"{type(e).__name__}: {e}",
+                processed=processed,
+                upserted=upserted,
+                thumbs_done=thumbs_done,
+                mids_done=mids_done,
+                errors=errors,
+                finished=True,
+            )
         return {
             "processed": processed,
             "upserted": upserted,
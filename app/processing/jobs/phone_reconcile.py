@@ -6,13 +6,32 @@ import shutil
 from pathlib import Path
 
 from ...core.config import get_settings
-from ...core.db import sessionmaker_for
+from ...core.db import prune_pinned_mids, sessionmaker_for
+from ...core.writer import writer_for
+from ...services.derivatives import mid_path
 from ..job_helpers import mark_job_started, run_command, set_job_progress
 
 
 logger = logging.getLogger(__name__)
 
 
+def _stage_mids(deriv_root: Path, stage_mid_root: Path, guids: list[str]) -> int:
+    """Hard-link the given guids' mids into a tree laid out like deriv_root/mid."""
+    n = 0
+    for guid in guids:
+        src = mid_path(deriv_root, guid)
+        if not src.exists():
+            continue
+        dst = stage_mid_root / src.relative_to(deriv_root / "mid")
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            dst.hardlink_to(src)
+        except OSError:
+            shutil.copy2(src, dst)
+        n += 1
+    return n
+
+
 def run_phone_reconcile_job(
     job_id: str,
     *,
@@ -105,7 +124,20 @@ def run_phone_reconcile_job(
             logger=logger,
         )
 
-        processed = sum(1 for p in local_mid_root.rglob("*.webp") if p.is_file())
+        push_root = local_mid_root
+        stage_root: Path | None = None
+        if settings.mid_cache_budget_bytes() > 0:
+            # In mid cache mode the local tree also holds mids cached for web views.
+            # The phone only mirrors what phone sync pushed (its pins); pins of
+            # deleted photos, or from anything else, are dropped so they can be evicted.
+            synced = writer_for(settings.db_path).run(lambda session: prune_pinned_mids(session, reason="phone_sync"))
+            stage_root = settings.deriv_root / "_phone_reconcile" / job_id
+            shutil.rmtree(stage_root, ignore_errors=True)
+            push_root = stage_root / "mid"
+            push_root.mkdir(parents=True)
+            processed = _stage_mids(settings.deriv_root, push_root, synced)
+        else:
+            processed = sum(1 for p in local_mid_root.rglob("*.webp") if p.is_file())
         set_job_progress(
             SessionLocal,
             job_id=job_id,
@@ -115,19 +147,23 @@ def run_phone_reconcile_job(
             mids_done=processed,
         )
 
-        run_command(
-            [
-                "rsync",
-                "-a",
-                "--delete",
-                "-e",
-                ssh_cmd,
-                f"{local_mid_root.as_posix().rstrip('/')}/",
-                f"{target}:{remote_dest_path.rstrip('/')}/mid/",
-            ],
-            label="phone-reconcile push",
-            logger=logger,
-        )
+        try:
+            run_command(
+                [
+                    "rsync",
+                    "-a",
+                    "--delete",
+                    "-e",
+                    ssh_cmd,
+                    f"{push_root.as_posix().rstrip('/')}/",
+                    f"{target}:{remote_dest_path.rstrip('/')}/mid/",
+                ],
+                label="phone-reconcile push",
+                logger=logger,
+            )
+        finally:
+            if stage_root is not None:
+                shutil.rmtree(stage_root, ignore_errors=True)
 
         set_job_progress(
             SessionLocal,
@@ -6,7 +6,9 @@ import shutil
 from pathlib import Path
 
 from ...core.config import get_settings
-from ...core.db import sessionmaker_for
+from ...core.db import pin_mids, sessionmaker_for
+from ...core.writer import writer_for
+from ...services.mid_cache import enforce_mid_budget_for
 from ..job_helpers import mark_job_started, run_command, set_job_progress
 
 
@@ -193,6 +195,12 @@ def run_phone_sync_job(
                 logger=logger,
             )
 
+            # Mids on the phone must stay available locally for reconcile.
+            pushed_guids = [p.rsplit("/", 1)[-1][: -len(".webp")] for p in rel_mid_paths]
+            writer_for(settings.db_path).run(lambda session: pin_mids(session, pushed_guids, reason="phone_sync"))
+            if settings.mid_cache_budget_bytes() > 0:
+                enforce_mid_budget_for(settings)
+
         set_job_progress(
             SessionLocal,
             job_id=job_id,
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import logging
+
+from ...core.config import get_settings
+from ...core.counts import rebuild_photo_counts
+from ...core.db import sessionmaker_for
+from ...core.geo_tiles import rebuild_geo_tiles
+from ...core.writer import writer_for
+from ..job_helpers import mark_job_started, set_job_progress
+
+
+logger = logging.getLogger(__name__)
+
+
+def run_rebuild_counts_job(job_id: str) -> None:
+    settings = get_settings()
+    SessionLocal = sessionmaker_for(settings.db_path)
+
+    try:
+        started = mark_job_started(SessionLocal, job_id=job_id, message="phase=rebuild", logger=logger)
+        if not started:
+            return
+
+        writer = writer_for(settings.db_path)
+        rows = writer.run(rebuild_photo_counts)
+        tiles = writer.run(rebuild_geo_tiles)
+        message = f"count_rows={rows} geo_tiles={tiles}"
+        logger.info("photo counts rebuilt job_id=%s %s", job_id, message)
+
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="done",
+            message=message,
+            processed=int(rows),
+            finished=True,
+        )
+    except Exception as e:
+        logger.exception("rebuild counts job crashed job_id=%s", job_id)
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="failed",
+            message=f"{type(e).__name__}: {e}",
+            errors=1,
+            finished=True,
+        )
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import logging
+import time
+
+from ...core.config import get_settings
+from ...core.db import sessionmaker_for
+from ...core.migrations import run_backfill_batch
+from ...core.writer import writer_for
+from ..job_helpers import mark_job_started, set_job_progress
+
+
+logger = logging.getLogger(__name__)
+
+# Batches are sized so each holds the write lock for roughly this long.
+_TARGET_BATCH_S = 0.1
+_MIN_BATCH = 100
+_MAX_BATCH = 5000
+# Pause between batches so UI writes queued on the db writer aren't starved.
+_BATCH_PAUSE_S = 0.05
+
+
+def run_schema_backfill_job(job_id: str, *, version: int, name: str) -> None:
+    """Run one migration's backfill to completion in small batches (resumes from its saved cursor)."""
+    settings = get_settings()
+    SessionLocal = sessionmaker_for(settings.db_path)
+    writer = writer_for(settings.db_path)
+
+    try:
+        started = mark_job_started(SessionLocal, job_id=job_id, message=f"backfill={name}", logger=logger)
+        if not started:
+            return
+
+        batch = 1000
+        total = 0
+        batches = 0
+        while True:
+            t0 = time.monotonic()
+            _, total, done = writer.run(
+                lambda session, n=batch: run_backfill_batch(session, version=version, limit=n)
+            )
+            elapsed = time.monotonic() - t0
+            batches += 1
+            if done:
+                break
+            if elapsed > _TARGET_BATCH_S * 2:
+                batch = max(_MIN_BATCH, batch // 2)
+            elif elapsed < _TARGET_BATCH_S / 2:
+                batch = min(_MAX_BATCH, batch * 2)
+            set_job_progress(
+                SessionLocal,
+                job_id=job_id,
+                logger=logger,
+                message=f"backfill={name} rows={total} batch={batch}",
+                processed=total,
+                wait=False,
+            )
+            time.sleep(_BATCH_PAUSE_S)
+
+        message = f"backfill={name} rows={total} batches={batches}"
+        logger.info("schema backfill done job_id=%s %s", job_id, message)
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="done",
+            message=message,
+            processed=total,
+            finished=True,
+        )
+    except Exception as e:
+        logger.exception("schema backfill job crashed job_id=%s name=%s", job_id, name)
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="failed",
+            message=f"backfill={name} {type(e).__name__}: {e}",
+            errors=1,
+            finished=True,
+        )
@@ -1,26 +1,26 @@
 from __future__ import annotations
 
 import logging
-from datetime import datetime, timezone
+from concurrent.futures import Future
 
 from sqlalchemy import select
 
 from ...core.config import get_settings
 from ...core.db import sessionmaker_for
+from ...services.decode_budget import JobRss, decode_summary
 from ...services.derivatives import ensure_derivatives
-from ...services.geocode import enrich_photo_location
+from ...services.geocode import apply_geo_update, job_geocode_cache, resolve_photo_location
+from ...services.geocode_cache import GeoCacheLRU
+from ...services.mid_cache import enforce_mid_budget_for
 from ...core.models import ScanJob
 from ...core.util import resolve_relpath_under
-from ..job_helpers import commit_with_retry
+from ...core.writer import writer_for
+from ..job_helpers import mark_job_started, set_job_progress, settle_writes
 
 
 logger = logging.getLogger(__name__)
 
 
-def utc_now_iso() -> str:
-    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
-
-
 def run_validate_job(
     job_id: str,
     *,
@@ -34,13 +34,8 @@ def run_validate_job(
 
     SessionLocal = sessionmaker_for(settings.db_path)
 
-    with SessionLocal() as session:
-        job = session.get(ScanJob, job_id)
-        if job is None:
-            return
-        job.state = "running"
-        job.started_at = utc_now_iso()
-        commit_with_retry(session, label="validate-start", logger=logger)
+    if not mark_job_started(SessionLocal, job_id=job_id, message="validate", logger=logger):
+        return
 
     year: int | None = None
     with SessionLocal() as session:
@@ -50,21 +45,40 @@ def run_validate_job(
 
     prefix = f"{year}/%" if year is not None else None
 
+    # In mid cache mode mids are created on demand by /mid, not for every photo.
+    mid_cache_mode = settings.mid_cache_budget_bytes() > 0
+
     processed = 0
     upserted = 0
     thumbs_done = 0
     mids_done = 0
     errors = 0
+    peak_decode_bytes = 0
+    reduced_decodes = 0
+
+    # Geocode results are queued on the db writer and settled at progress ticks,
+    # so network lookups never hold a write transaction open. The job's cache LRU
+    # holds new cache rows as soon as they resolve and batches hit counts.
+    writer = writer_for(settings.db_path)
+    pending_writes: list[Future] = []
+    geo_cache: GeoCacheLRU | None = None
+
+    def _settle_geocode() -> int:
+        if geo_cache is not None:
+            fut = geo_cache.flush(writer)
+            if fut is not None:
+                pending_writes.append(fut)
+        return settle_writes(pending_writes, label="validate-photo-geocode", logger=logger)
 
     try:
         session = SessionLocal()
+        job_rss = JobRss().start()
         try:
-            job = session.get(ScanJob, job_id)
-            if job is None:
-                return
-
             from ...core.models import Photo
 
+            if do_geolookup:
+                geo_cache = job_geocode_cache(session, settings=settings)
+
             q = select(Photo)
             if prefix is not None:
                 q = q.where(Photo.rel_path.like(prefix))
@@ -96,38 +110,69 @@ def run_validate_job(
                             thumb_quality=settings.thumb_quality,
                             mid_quality=settings.mid_quality,
                             repair_mid_exif=repair_mid_exif,
+                            make_mid=not mid_cache_mode,
+                            sizes=settings.deriv_sizes_list(),
+                            size_quality=settings.deriv_size_quality,
+                            decode_budget_bytes=settings.decode_budget_bytes(),
+                            reduce_over_pixels=settings.decode_reduce_over_pixels(),
                         )
                         if deriv.thumb_created:
                             thumbs_done += 1
                         if deriv.mid_created:
                             mids_done += 1
+                        peak_decode_bytes = max(peak_decode_bytes, deriv.decode_bytes)
+                        if deriv.reduced_decode:
+                            reduced_decodes += 1
 
                     if do_geolookup:
-                        changed = enrich_photo_location(session, settings=settings, photo=photo)
-                        if changed:
-                            ok = commit_with_retry(session, label="validate-photo-geocode", logger=logger)
-                            if not ok:
-                                errors += 1
+                        update = resolve_photo_location(session, settings=settings, photo=photo, cache=geo_cache)
+                        if update is not None:
+                            fut = writer.submit(lambda ws, u=update: apply_geo_update(ws, u))
+                            pending_writes.append(fut)
                 except Exception:
                     errors += 1
                     logger.exception("validate error job_id=%s rel_path=%s", job_id, getattr(photo, "rel_path", ""))
 
                 if processed == 1 or processed % 200 == 0:
-                    job.processed = processed
-                    job.upserted = upserted
-                    job.thumbs_done = thumbs_done
-                    job.mids_done = mids_done
-                    job.errors = errors
-                    commit_with_retry(session, label="validate-progress", logger=logger)
-
-            job.processed = processed
-            job.upserted = upserted
-            job.thumbs_done = thumbs_done
-            job.mids_done = mids_done
-            job.errors = errors
-            job.state = "done"
-            job.finished_at = utc_now_iso()
-            commit_with_retry(session, label="validate-finish", logger=logger)
+                    errors += _settle_geocode()
+                    set_job_progress(
+                        SessionLocal,
+                        job_id=job_id,
+                        logger=logger,
+                        processed=processed,
+                        upserted=upserted,
+                        thumbs_done=thumbs_done,
+                        mids_done=mids_done,
+                        errors=errors,
+                        wait=False,
+                    )
+
+            errors += _settle_geocode()
+            summary = [
+                decode_summary(peak_decode_bytes=peak_decode_bytes, reduced_decodes=reduced_decodes, job_rss=job_rss)
+            ]
+            if geo_cache is not None:
+                summary.append(geo_cache.summary())
+            if mid_cache_mode:
+                try:
+                    eviction = enforce_mid_budget_for(settings)
+                    if eviction is not None and eviction.evicted:
+                        summary.append(f"mid cache evicted={eviction.evicted} freed_mb={eviction.freed_bytes / 1e6:.1f}")
+                except Exception:
+                    logger.exception("mid cache eviction failed job_id=%s", job_id)
+            set_job_progress(
+                SessionLocal,
+                job_id=job_id,
+                logger=logger,
+                state="done",
+                message=" ".join(summary),
+                processed=processed,
+                upserted=upserted,
+                thumbs_done=thumbs_done,
+                mids_done=mids_done,
+                errors=errors,
+                finished=True,
+            )
 
             logger.info(
                 "validate job done job_id=%s processed=%s thumbs_done=%s mids_done=%s errors=%s",
@@ -138,19 +183,21 @@ def run_validate_job(
                 errors,
             )
         finally:
+            job_rss.stop()
             session.close()
 
     except Exception as e:
         logger.exception("validate job crashed job_id=%s", job_id)
-        with SessionLocal() as session:
-            job = session.get(ScanJob, job_id)
-            if job is not None:
-                job.state = "failed"
-                job.message = f"{type(e).__name__}: {e}"
-                job.finished_at = utc_now_iso()
-                job.processed = processed
-                job.upserted = upserted
-                job.thumbs_done = thumbs_done
-                job.mids_done = mids_done
-                job.errors = errors
-                commit_with_retry(session, label="validate-failed", logger=logger)
+        set_job_progress(
+            SessionLocal,
+            job_id=job_id,
+            logger=logger,
+            state="failed",
+            message=f"{type(e).__name__}: {e}",
+            processed=processed,
+            upserted=upserted,
+            thumbs_done=thumbs_done,
+            mids_done=mids_done,
+            errors=errors,
+            finished=True,
+        )
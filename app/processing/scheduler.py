@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import func, or_, select
+
+from ..core.backup import backup_schedule
+from ..core.db import create_job, sessionmaker_for
+from ..core.models import ScanJob
+from ..core.writer import writer_for
+
+
+logger = logging.getLogger(__name__)
+
+_POLL_INTERVAL_S = 60.0
+
+_STARTED: set[str] = set()
+_STARTED_LOCK = threading.Lock()
+
+
+def _parse_iso(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _maintenance_due(SessionLocal, *, interval_s: float, idle_s: float) -> bool:
+    now = time.time()
+    with SessionLocal() as session:
+        active = session.execute(
+            select(func.count()).select_from(ScanJob).where(ScanJob.state.in_(("queued", "running")))
+        ).scalar_one()
+        if int(active) > 0:
+            return False
+
+        last_activity = session.execute(
+            select(func.max(func.coalesce(ScanJob.finished_at, ScanJob.started_at))).where(
+                or_(ScanJob.job_type.is_(None), ScanJob.job_type != "db_maintenance")
+            )
+        ).scalar_one()
+        last_maintenance = session.execute(
+            select(func.max(ScanJob.finished_at)).where(ScanJob.job_type == "db_maintenance")
+        ).scalar_one()
+
+    activity_ts = _parse_iso(last_activity)
+    if activity_ts is not None and now - activity_ts < idle_s:
+        return False
+    maintenance_ts = _parse_iso(last_maintenance)
+    return maintenance_ts is None or now - maintenance_ts >= interval_s
+
+
+def start_maintenance_scheduler(db_path: Path, *, interval_s: float, idle_s: float) -> None:
+    """Run the db maintenance job every `interval_s` once no job has been active for `idle_s`."""
+    if interval_s <= 0:
+        return
+    key = str(db_path.expanduser().resolve())
+    with _STARTED_LOCK:
+        if key in _STARTED:
+            return
+        _STARTED.add(key)
+
+    from ..jobs import new_job_id, run_db_maintenance_job
+
+    SessionLocal = sessionmaker_for(db_path)
+
+    def _loop() -> None:
+        while True:
+            time.sleep(_POLL_INTERVAL_S)
+            try:
+                if not _maintenance_due(SessionLocal, interval_s=interval_s, idle_s=idle_s):
+                    continue
+                job_id = new_job_id()
+                writer_for(db_path).run(
+                    lambda session: create_job(session, job_id=job_id, year=None, job_type="db_maintenance")
+                )
+                logger.info("scheduled db maintenance job_id=%s", job_id)
+                run_db_maintenance_job(job_id)
+            except Exception:
+                logger.exception("db maintenance scheduler tick failed")
+
+    threading.Thread(target=_loop, name="db-maintenance-scheduler", daemon=True).start()
+
+
+def _backup_due(SessionLocal, *, default_interval_hours: int, default_keep: int) -> bool:
+    with SessionLocal() as session:
+        interval_h, _keep = backup_schedule(
+            session, default_interval_hours=default_interval_hours, default_keep=default_keep
+        )
+        if interval_h <= 0:
+            return False
+        active = session.execute(
+            select(func.count())
+            .select_from(ScanJob)
+            .where(ScanJob.job_type == "db_backup")
+            .where(ScanJob.state.in_(("queued", "running")))
+        ).scalar_one()
+        if int(active) > 0:
+            return False
+        # Failed runs count too: retry on the next interval rather than every tick.
+        last_backup = session.execute(
+            select(func.max(ScanJob.started_at)).where(ScanJob.job_type == "db_backup")
+        ).scalar_one()
+
+    backup_ts = _parse_iso(last_backup)
+    return backup_ts is None or time.time() - backup_ts >= interval_h * 3600.0
+
+
+def start_backup_scheduler(db_path: Path, *, default_interval_hours: int, default_keep: int) -> None:
+    """Run the db backup job on the schedule saved from the dashboard (or the configured default).
+
+    Always started, since the schedule can be turned on at runtime; it is
+    re-read on every tick.
+    """
+    key = "backup:" + str(db_path.expanduser().resolve())
+    with _STARTED_LOCK:
+        if key in _STARTED:
+            return
+        _STARTED.add(key)
+
+    from ..jobs import new_job_id, run_db_backup_job
+
+    SessionLocal = sessionmaker_for(db_path)
+
+    def _loop() -> None:
+        while True:
+            time.sleep(_POLL_INTERVAL_S)
+            try:
+                if not _backup_due(
+                    SessionLocal, default_interval_hours=default_interval_hours, default_keep=default_keep
+                ):
+                    continue
+                job_id = new_job_id()
+                writer_for(db_path).run(
+                    lambda session: create_job(session, job_id=job_id, year=None, job_type="db_backup")
+                )
+                logger.info("scheduled db backup job_id=%s", job_id)
+                run_db_backup_job(job_id)
+            except Exception:
+                logger.exception("db backup scheduler tick failed")
+
+    threading.Thread(target=_loop, name="db-backup-scheduler", daemon=True).start()
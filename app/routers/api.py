@@ -4,10 +4,13 @@ import logging
 import threading
 from pathlib import Path
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import and_, delete, or_, select
 from pydantic import BaseModel, Field
-from starlette.responses import FileResponse
+from starlette.requests import Request
 
+from ..core.counts import DIMS as COUNT_DIMS, photo_counts
+from ..core.geo_tiles import LEVELS as GEO_TILE_LEVELS, cluster_level, geo_clusters, geo_points
 from ..core.db import (
     apply_tag_to_photos,
     create_job,
@@ -16,14 +19,31 @@ from ..core.db import (
     get_job,
     list_tags,
     remove_tag_from_photos,
-    sessionmaker_for,
+    read_pool_metrics,
     tags_for_photo,
+    unpin_mids,
 )
-from ..services.derivatives import mid_path, thumb_path
+from ..services.decode_budget import decode_scheduler
+from ..services.geonames_client import geonames_client_stats
+from ..services.derivatives import derivative_path, mid_path, remove_derivatives, thumb_path
+from ..services.mid_cache import regenerate_mid, touch_mid
+from ..services.sprites import build_sprite, sprite_path
 from ..jobs import new_job_id, run_phone_reconcile_job, run_phone_sync_job
-from ..core.models import Photo
-from ..core.router_helpers import ensure_deriv_root, ensure_dirs_and_db, settings_or_500
-from ..core.util import normalize_guid, resolve_relpath_under
+from ..core.models import Photo, PhotoTag
+from ..core.search import fts_match_query, photo_search_clause
+from ..core.writer import writer_for
+from ..core.config import restart_required
+from ..core.router_helpers import (
+    AppSettings,
+    LibrarySettings,
+    ReadSessions,
+    derivative_response,
+    ensure_deriv_root,
+    original_response,
+    reload_settings_or_500,
+    thumb_url,
+)
+from ..core.util import b64decode_cursor, b64encode_cursor, cursor_taken_at, normalize_guid, resolve_relpath_under
 
 
 class DeleteRequest(BaseModel):
@@ -73,33 +93,248 @@ def _start_job_thread(target, /, *args, **kwargs) -> None:
 
 
 @api_router.get("/thumb/{guid}")
-def get_thumb(guid: str):
-    settings = settings_or_500()
+def get_thumb(request: Request, settings: AppSettings, guid: str):
     guid = normalize_guid(guid)
     p = thumb_path(settings.deriv_root, guid)
     if not p.exists():
         raise HTTPException(status_code=404, detail="thumb not found")
-    return FileResponse(p, media_type="image/webp")
+    return derivative_response(request, settings, p)
 
 
 @api_router.get("/mid/{guid}")
-def get_mid(guid: str):
-    settings = settings_or_500()
+def get_mid(request: Request, settings: AppSettings, SessionLocal: ReadSessions, guid: str):
     guid = normalize_guid(guid)
     p = mid_path(settings.deriv_root, guid)
-    if not p.exists():
+    cache_mode = settings.mid_cache_budget_bytes() > 0
+    if p.exists():
+        if cache_mode:
+            touch_mid(p)
+        return derivative_response(request, settings, p)
+    if not cache_mode:
         raise HTTPException(status_code=404, detail="mid not found")
-    return FileResponse(p, media_type="image/webp")
 
+    # Mid cache mode: the mid may have been evicted; rebuild it from the original.
+    with SessionLocal() as session:
+        row = fetch_photo(session, guid)
+    if not row or not row.get("rel_path"):
+        raise HTTPException(status_code=404, detail="mid not found")
+    source_path = resolve_relpath_under(settings.photo_root, row["rel_path"])
+    if not source_path.exists():
+        raise HTTPException(status_code=404, detail="original not found")
+    try:
+        regenerated = regenerate_mid(settings, guid=guid, source_path=source_path)
+    except Exception as e:
+        logger.exception("mid regeneration failed guid=%s", guid)
+        raise HTTPException(status_code=500, detail=f"mid regeneration failed: {type(e).__name__}")
+    if regenerated is None:
+        raise HTTPException(status_code=404, detail="mid not found")
+    return derivative_response(request, settings, regenerated)
 
-@api_router.get("/original/{guid}")
-def get_original(guid: str):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
 
+@api_router.get("/img/{size}/{guid}")
+def get_sized(request: Request, settings: AppSettings, size: int, guid: str):
     guid = normalize_guid(guid)
+    ladder = settings.srcset_sizes()
+    if size not in ladder:
+        raise HTTPException(status_code=404, detail="size not configured")
+
+    # A rung may not exist yet (ladder changed since the last validate); fall back
+    # to the next larger derivative so srcset never renders a broken image.
+    for candidate in [s for s in ladder if s >= size] + [settings.thumb_max]:
+        p = derivative_path(
+            settings.deriv_root,
+            guid,
+            candidate,
+            thumb_max=settings.thumb_max,
+            mid_max=settings.mid_max,
+        )
+        if p.exists():
+            return derivative_response(request, settings, p)
+    raise HTTPException(status_code=404, detail="derivative not found")
+
+
+@api_router.get("/sprite")
+def get_sprite_map(settings: AppSettings, guids: str = Query(..., description="Comma-separated guids (max 200)")):
+    """Pack the thumbs for a set of guids into one atlas and return its tile map."""
+    requested = [normalize_guid(g) for g in guids.split(",") if g.strip()]
+    if not requested:
+        raise HTTPException(status_code=400, detail="guids must not be empty")
+    if len(requested) > 200:
+        raise HTTPException(status_code=400, detail="too many guids (max 200)")
+
+    sheet = build_sprite(
+        settings.deriv_root,
+        requested,
+        cell=int(settings.thumb_max),
+        quality=int(settings.thumb_quality),
+    )
+    if sheet is None:
+        raise HTTPException(status_code=404, detail="no thumbs found")
+
+    return {
+        "url": f"/phototank/sprite/{sheet.key}.webp",
+        "width": sheet.width,
+        "height": sheet.height,
+        "tiles": {g: list(t) for g, t in sheet.tiles.items()},
+    }
+
+
+@api_router.get("/sprite/{key}.webp")
+def get_sprite(request: Request, settings: AppSettings, key: str):
+    if not key or len(key) > 64 or any(c not in "0123456789abcdef" for c in key):
+        raise HTTPException(status_code=400, detail="invalid sprite key")
+    p = sprite_path(settings.deriv_root, key)
+    if not p.exists():
+        raise HTTPException(status_code=404, detail="sprite not found")
+    # The key is derived from the thumbs' content versions, so it never changes meaning.
+    return derivative_response(request, settings, p, immutable=True)
+
+
+@api_router.get("/metrics")
+def get_metrics(settings: AppSettings):
+    """Runtime counters: read pool checkouts/waits, db writer batching, decode budget, GeoNames client."""
+    return {
+        "read_pool": read_pool_metrics(settings.db_path),
+        "db_writer": writer_for(settings.db_path).stats(),
+        "decode": decode_scheduler(settings.decode_budget_bytes()).stats(),
+        "geonames": geonames_client_stats(),
+    }
+
+
+@api_router.post("/settings/reload")
+def post_settings_reload():
+    """Re-read the env files (like SIGHUP). Invalid config is rejected and the running settings kept."""
+    _, changed = reload_settings_or_500()
+    if changed:
+        logger.info("settings reloaded; changed: %s", ", ".join(changed))
+    return {"changed": changed, "restart_required": restart_required(changed)}
+
+
+@api_router.get("/counts")
+def get_counts(
+    settings: LibrarySettings,
+    SessionLocal: ReadSessions,
+    dim: list[str] | None = Query(None, description="Dimensions to return (default: all)"),
+):
+    """Precomputed photo counts per total/year/month/rating/tag/country (tag keys are tag ids)."""
+
+    dims = dim or list(COUNT_DIMS)
+    unknown = [d for d in dims if d not in COUNT_DIMS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown dim: {', '.join(unknown)}")
+
+    with SessionLocal() as session:
+        return {d: {key: n for key, n in photo_counts(session, d)} for d in dims}
+
+
+# Past the finest tile level the map shows single photos, up to this many per
+# viewport (more than that falls back to the finest clusters).
+_MAP_POINTS_MAX = 500
+
+
+@api_router.get("/map/clusters")
+def get_map_clusters(
+    settings: LibrarySettings,
+    SessionLocal: ReadSessions,
+    west: float = Query(..., ge=-180, le=180),
+    south: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    zoom: int = Query(..., ge=0, le=24, description="Map zoom level (slippy-map tiles)"),
+):
+    """Clustered photo markers for a map viewport (west > east crosses the antimeridian)."""
+    if south > north:
+        raise HTTPException(status_code=400, detail="south must not be greater than north")
+
+    bbox = {"west": west, "south": south, "east": east, "north": north}
+    level = cluster_level(zoom)
+    with SessionLocal() as session:
+        markers = None
+        if level is None:
+            markers = geo_points(session, **bbox, limit=_MAP_POINTS_MAX + 1)
+            if len(markers) > _MAP_POINTS_MAX:
+                markers = None
+                level = GEO_TILE_LEVELS[-1]
+        if markers is None:
+            markers = geo_clusters(session, **bbox, level=level)
+
+    for m in markers:
+        m["thumb_url"] = thumb_url(settings.deriv_root, m["guid"]) if m["guid"] else None
+    return {"zoom": zoom, "level": level, "total": sum(int(m["count"]) for m in markers), "markers": markers}
+
+
+@api_router.get("/search")
+def search_photos(
+    settings: LibrarySettings,
+    SessionLocal: ReadSessions,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find (prefix match, all must match)"),
+    limit: int = Query(60, ge=1, le=200),
+    cursor: str | None = Query(None, description="Keyset cursor from the previous page's next_cursor"),
+    rating: int | None = Query(None, ge=0, le=3),
+    tag: int | None = Query(None, description="Filter by tag id"),
+    country: str | None = Query(None),
+    city: str | None = Query(None),
+):
+    """Full-text search over caption, place, camera, path and tag names, newest first."""
+
+    fts_match = fts_match_query(q)
+    if fts_match is None:
+        raise HTTPException(status_code=400, detail="q must contain at least one word")
+
+    country_value = (country or "").strip() or None
+    city_value = (city or "").strip() or None
+    cursor_key: tuple[int, str] | None = None
+    if cursor:
+        cursor_dt, cursor_guid = b64decode_cursor(cursor)
+        cursor_key = (cursor_taken_at(cursor_dt), cursor_guid)
+
+    with SessionLocal() as session:
+        stmt = (
+            select(Photo.guid, Photo.taken_at, Photo.datetime_original, Photo.rating, Photo.geo_city, Photo.geo_country)
+            .where(Photo.taken_at.is_not(None))
+            .where(photo_search_clause(session, fts_match))
+        )
+        if rating is not None:
+            stmt = stmt.where(Photo.rating == rating)
+        if tag is not None:
+            stmt = stmt.join(PhotoTag, PhotoTag.photo_guid == Photo.guid).where(PhotoTag.tag_id == tag)
+        if country_value is not None:
+            stmt = stmt.where(Photo.geo_country == country_value)
+        if city_value is not None:
+            stmt = stmt.where(Photo.geo_city_norm == city_value.casefold())
+        if cursor_key is not None:
+            cursor_ts, cursor_guid = cursor_key
+            stmt = stmt.where(
+                or_(Photo.taken_at < cursor_ts, and_(Photo.taken_at == cursor_ts, Photo.guid < cursor_guid))
+            )
+        stmt = stmt.order_by(Photo.taken_at.desc(), Photo.guid.desc()).limit(limit + 1)
+        rows = session.execute(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = b64encode_cursor(str(rows[-1].taken_at), rows[-1].guid)
+
+    return {
+        "q": q,
+        "items": [
+            {
+                "guid": r.guid,
+                "date": r.datetime_original,
+                "rating": int(r.rating or 0),
+                "city": r.geo_city,
+                "country": r.geo_country,
+                "thumb_url": thumb_url(settings.deriv_root, r.guid),
+            }
+            for r in rows
+        ],
+        "next_cursor": next_cursor,
+    }
 
-    SessionLocal = sessionmaker_for(settings.db_path)
+
+@api_router.get("/original/{guid}")
+def get_original(settings: LibrarySettings, SessionLocal: ReadSessions, guid: str):
+    guid = normalize_guid(guid)
 
     with SessionLocal() as session:
         row = fetch_photo(session, guid)
@@ -115,18 +350,13 @@ def get_original(guid: str):
     if not source_path.exists():
         raise HTTPException(status_code=404, detail="original not found")
 
-    return FileResponse(source_path)
+    return original_response(settings, source_path)
 
 
 @api_router.get("/download/original/{guid}")
-def download_original(guid: str):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
+def download_original(settings: LibrarySettings, SessionLocal: ReadSessions, guid: str):
     guid = normalize_guid(guid)
 
-    SessionLocal = sessionmaker_for(settings.db_path)
-
     with SessionLocal() as session:
         row = fetch_photo(session, guid)
 
@@ -143,42 +373,37 @@ def download_original(guid: str):
 
     # Force a download. Use GUID filename so the edited file can be re-imported
     # as a "replace this GUID" operation without needing to rename it.
-    return FileResponse(source_path, filename=f"{guid}{source_path.suffix}")
+    return original_response(settings, source_path, filename=f"{guid}{source_path.suffix}")
 
 
 @api_router.post("/rate")
-def rate_photo(req: RateRequest):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
+def rate_photo(settings: LibrarySettings, req: RateRequest):
     guid = normalize_guid(req.guid)
 
-    SessionLocal = sessionmaker_for(settings.db_path)
-
-    with SessionLocal() as session:
+    def _rate(session) -> bool:
         row = session.get(Photo, guid)
         if row is None:
-            raise HTTPException(status_code=404, detail="photo not found")
+            return False
         row.rating = int(req.rating)
-        session.commit()
+        return True
+
+    if not writer_for(settings.db_path).run(_rate):
+        raise HTTPException(status_code=404, detail="photo not found")
 
     return {"guid": guid, "rating": int(req.rating)}
 
 
 @api_router.post("/delete")
-def delete_photos(req: DeleteRequest):
+def delete_photos(settings: LibrarySettings, SessionLocal: ReadSessions, req: DeleteRequest):
     """Delete photos everywhere: source file, derivatives, and DB record."""
 
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
     ensure_deriv_root(settings.deriv_root)
 
-    SessionLocal = sessionmaker_for(settings.db_path)
-
     logger.info("delete requested: count=%d", len(req.guids))
 
     requested = [normalize_guid(g) for g in req.guids]
 
+    writer = writer_for(settings.db_path)
     deleted: list[str] = []
     not_found: list[str] = []
     errors: list[dict[str, str]] = []
@@ -192,19 +417,10 @@ def delete_photos(req: DeleteRequest):
 
             # Resolve filesystem paths.
             source_path = resolve_relpath_under(settings.photo_root, photo.rel_path)
-            tpath = thumb_path(settings.deriv_root, guid)
-            mpath = mid_path(settings.deriv_root, guid)
 
             # Delete derivatives first.
             try:
-                try:
-                    tpath.unlink()
-                except FileNotFoundError:
-                    pass
-                try:
-                    mpath.unlink()
-                except FileNotFoundError:
-                    pass
+                remove_derivatives(settings.deriv_root, guid)
 
                 try:
                     source_path.unlink()
@@ -213,15 +429,16 @@ def delete_photos(req: DeleteRequest):
                     pass
             except Exception as e:
                 errors.append({"guid": guid, "error": f"{type(e).__name__}: {e}"})
-                session.rollback()
                 continue
 
+            def _delete_row(ws, guid=guid) -> None:
+                ws.execute(delete(Photo).where(Photo.guid == guid))
+                unpin_mids(ws, [guid])
+
             try:
-                session.delete(photo)
-                session.commit()
+                writer.run(_delete_row)
                 deleted.append(guid)
             except Exception as e:
-                session.rollback()
                 errors.append({"guid": guid, "error": f"DB delete failed: {type(e).__name__}: {e}"})
 
     logger.info(
@@ -242,11 +459,7 @@ def delete_photos(req: DeleteRequest):
 
 
 @api_router.get("/tags")
-def get_tags():
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
-    SessionLocal = sessionmaker_for(settings.db_path)
+def get_tags(settings: LibrarySettings, SessionLocal: ReadSessions):
     with SessionLocal() as session:
         tags = list_tags(session)
 
@@ -259,32 +472,25 @@ def get_tags():
 
 
 @api_router.post("/tags")
-def create_tag(req: TagCreateRequest):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
-    SessionLocal = sessionmaker_for(settings.db_path)
-    with SessionLocal() as session:
-        try:
-            tag = create_or_get_tag(
-                session,
-                name=req.name,
-                description=req.description,
-                color=req.color,
-            )
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-
-    return {"id": int(tag.id), "name": tag.name, "description": tag.description, "color": tag.color}
+def create_tag(settings: LibrarySettings, req: TagCreateRequest):
+    def _create(session) -> dict[str, object]:
+        tag = create_or_get_tag(
+            session,
+            name=req.name,
+            description=req.description,
+            color=req.color,
+        )
+        return {"id": int(tag.id), "name": tag.name, "description": tag.description, "color": tag.color}
+
+    try:
+        return writer_for(settings.db_path).run(_create)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @api_router.get("/photo/{guid}/tags")
-def get_photo_tags(guid: str):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
+def get_photo_tags(settings: LibrarySettings, SessionLocal: ReadSessions, guid: str):
     guid = normalize_guid(guid)
-    SessionLocal = sessionmaker_for(settings.db_path)
     with SessionLocal() as session:
         tags = tags_for_photo(session, guid)
 
@@ -292,41 +498,33 @@ def get_photo_tags(guid: str):
 
 
 @api_router.post("/tags/{tag_id}/apply")
-def apply_tag(tag_id: int, req: TagApplyRequest):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
+def apply_tag(settings: LibrarySettings, tag_id: int, req: TagApplyRequest):
     guids = [normalize_guid(g) for g in req.guids]
-    SessionLocal = sessionmaker_for(settings.db_path)
-    with SessionLocal() as session:
-        try:
-            applied = apply_tag_to_photos(session, tag_id=int(tag_id), guids=guids)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {e}")
+    try:
+        applied = writer_for(settings.db_path).run(
+            lambda session: apply_tag_to_photos(session, tag_id=int(tag_id), guids=guids)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {e}")
 
     return {"tag_id": int(tag_id), "requested": len(guids), "applied": int(applied)}
 
 
 @api_router.post("/tags/{tag_id}/remove")
-def remove_tag(tag_id: int, req: TagApplyRequest):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
+def remove_tag(settings: LibrarySettings, tag_id: int, req: TagApplyRequest):
     guids = [normalize_guid(g) for g in req.guids]
-    SessionLocal = sessionmaker_for(settings.db_path)
-    with SessionLocal() as session:
-        try:
-            removed = remove_tag_from_photos(session, tag_id=int(tag_id), guids=guids)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {e}")
+    try:
+        removed = writer_for(settings.db_path).run(
+            lambda session: remove_tag_from_photos(session, tag_id=int(tag_id), guids=guids)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {e}")
 
     return {"tag_id": int(tag_id), "requested": len(guids), "removed": int(removed)}
 
 
 @api_router.post("/jobs/phone-sync/start")
-def start_phone_sync(req: PhoneSyncStartRequest):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
+def start_phone_sync(settings: LibrarySettings, req: PhoneSyncStartRequest):
     ensure_deriv_root(settings.deriv_root)
 
     ip = (req.ip or settings.phone_sync_ip or "").strip()
@@ -347,12 +545,10 @@ def start_phone_sync(req: PhoneSyncStartRequest):
 
     ssh_key_path = Path(ssh_key_path_raw).expanduser()
 
-    SessionLocal = sessionmaker_for(settings.db_path)
     job_id = new_job_id()
-    with SessionLocal() as session:
-        with session.begin():
-            create_job(session, job_id=job_id, year=None, job_type="phone_sync")
-        session.commit()
+    writer_for(settings.db_path).run(
+        lambda session: create_job(session, job_id=job_id, year=None, job_type="phone_sync")
+    )
 
     _start_job_thread(
         run_phone_sync_job,
@@ -379,9 +575,7 @@ def start_phone_sync(req: PhoneSyncStartRequest):
 
 
 @api_router.post("/jobs/phone-reconcile/start")
-def start_phone_reconcile(req: PhoneReconcileStartRequest):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
+def start_phone_reconcile(settings: LibrarySettings, req: PhoneReconcileStartRequest):
     ensure_deriv_root(settings.deriv_root)
 
     ip = (req.ip or settings.phone_sync_ip or "").strip()
@@ -399,12 +593,10 @@ def start_phone_reconcile(req: PhoneReconcileStartRequest):
 
     ssh_key_path = Path(ssh_key_path_raw).expanduser()
 
-    SessionLocal = sessionmaker_for(settings.db_path)
     job_id = new_job_id()
-    with SessionLocal() as session:
-        with session.begin():
-            create_job(session, job_id=job_id, year=None, job_type="phone_reconcile")
-        session.commit()
+    writer_for(settings.db_path).run(
+        lambda session: create_job(session, job_id=job_id, year=None, job_type="phone_reconcile")
+    )
 
     _start_job_thread(
         run_phone_reconcile_job,
@@ -429,11 +621,7 @@ def start_phone_reconcile(req: PhoneReconcileStartRequest):
 
 
 @api_router.get("/jobs/{job_id}")
-def get_job_status(job_id: str):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
-    SessionLocal = sessionmaker_for(settings.db_path)
+def get_job_status(settings: LibrarySettings, SessionLocal: ReadSessions, job_id: str):
     with SessionLocal() as session:
         job = get_job(session, job_id)
 
@@ -8,13 +8,38 @@ from urllib.parse import parse_qs, urlencode, urlparse
 from fastapi import APIRouter, Form, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import and_, func, or_, select
-
-from ..core.db import create_job, fetch_photo, get_job, list_tags, sessionmaker_for, tags_for_photo
-from ..jobs import new_job_id, run_ingest_job, run_phone_reconcile_job, run_phone_sync_job, run_validate_job
-from ..core.models import Photo, PhotoTag, ScanJob
-from ..core.router_helpers import ensure_deriv_root, ensure_dirs_and_db, ensure_import_dirs, settings_or_500
-from ..core.util import b64decode_cursor, b64encode_cursor, normalize_guid
+from sqlalchemy import select
+
+from ..core.backup import backup_schedule, list_snapshots, save_backup_schedule
+from ..core.counts import photo_counts, total_photo_count
+from ..core.db import create_job, fetch_photo, get_job, list_tags, tags_for_photo
+from ..core.geo_index import GeoArea, parse_bbox, parse_near, photo_area_clause
+from ..jobs import (
+    new_job_id,
+    run_db_backup_job,
+    run_db_maintenance_job,
+    run_geocode_job,
+    run_ingest_job,
+    run_phone_reconcile_job,
+    run_phone_sync_job,
+    run_rebuild_counts_job,
+    run_validate_job,
+)
+from ..core.models import Photo, ScanJob
+from ..core.search import fts_match_query, photo_search_clause
+from ..core.timeline import TILE_COLUMNS, TimelineFilter
+from ..core.writer import writer_for
+from ..core.router_helpers import (
+    AppSettings,
+    LibrarySettings,
+    ReadSessions,
+    ensure_deriv_root,
+    ensure_import_dirs,
+    mid_url,
+    sized_url,
+    thumb_url,
+)
+from ..core.util import b64decode_cursor, b64encode_cursor, cursor_taken_at, normalize_guid, taken_at_from_iso
 
 web_router = APIRouter()
 
@@ -59,6 +84,16 @@ def _job_kind(job: ScanJob) -> str | None:
         return "phone_sync"
     if jt == "phone_reconcile":
         return "phone_reconcile"
+    if jt == "db_maintenance":
+        return "db_maintenance"
+    if jt == "db_backup":
+        return "db_backup"
+    if jt == "rebuild_counts":
+        return "rebuild_counts"
+    if jt == "geocode":
+        return "geocode"
+    if jt == "backfill":
+        return "backfill"
 
     # Backward compatibility for old rows written before job_type existed.
     msg = (job.message or "").strip().lower()
@@ -86,11 +121,50 @@ def _job_sort_key(job: ScanJob) -> tuple[str, str, str]:
     )
 
 
+def _form_year(year: str | None) -> int | None:
+    """Optional YYYY form field; 400 if it's set but not a plausible year."""
+    year_int: int | None = None
+    if year is not None:
+        y = year.strip()
+        if y != "":
+            try:
+                year_int = int(y)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="year must be a number (YYYY)")
+
+    if year_int is not None and (year_int < 1900 or year_int > 2100):
+        raise HTTPException(status_code=400, detail="year must be between 1900 and 2100")
+    return year_int
+
+
 def _start_job_thread(target, /, *args, **kwargs) -> None:
     t = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
     t.start()
 
 
+def _backup_context(session, settings, *, saved: bool = False) -> dict[str, object]:
+    interval_hours, keep = backup_schedule(
+        session,
+        default_interval_hours=settings.db_backup_interval_hours,
+        default_keep=settings.db_backup_keep,
+    )
+    return {
+        "backup_interval_hours": interval_hours,
+        "backup_keep": keep,
+        "backup_snapshots": list_snapshots(settings.db_path)[:keep],
+        "backup_saved": saved,
+    }
+
+
+def _srcset(settings, guid: str) -> str:
+    """Return a srcset for the derivative ladder, or '' when no ladder is configured.
+
+    Without extra rungs the only candidates are thumb and mid, and a HiDPI grid
+    would jump straight to the 2048px mid, so plain src URLs are kept instead.
+    """
+    if not settings.deriv_sizes_list():
+        return ""
+    return ", ".join(f"{sized_url(settings, guid, size)} {size}w" for size in settings.srcset_sizes())
 
 
 def _safe_back_url(raw: str | None) -> str:
@@ -154,8 +228,11 @@ def _extract_filter_context(
     tag: str | None,
     country: str | None,
     city: str | None,
-) -> tuple[str, int | None, int | None, str | None, str | None]:
-    """Return (jump_date_for_url, rating_int, tag_id, country, city).
+    q: str | None,
+    bbox: str | None,
+    near: str | None,
+) -> tuple[str, int | None, int | None, str | None, str | None, str | None, str | None, str | None]:
+    """Return (jump_date_for_url, rating_int, tag_id, country, city, q, bbox, near).
 
     Preference order:
     1) explicit query params on the detail URL (jump preferred over start)
@@ -167,6 +244,9 @@ def _extract_filter_context(
     tag_raw: str | None = tag
     country_raw: str | None = country
     city_raw: str | None = city
+    q_raw: str | None = q
+    bbox_raw: str | None = bbox
+    near_raw: str | None = near
 
     if (
         (jump_raw is None or jump_raw == "")
@@ -174,6 +254,9 @@ def _extract_filter_context(
         or (tag_raw is None)
         or (country_raw is None)
         or (city_raw is None)
+        or (q_raw is None)
+        or (bbox_raw is None)
+        or (near_raw is None)
     ):
         if from_:
             try:
@@ -192,6 +275,12 @@ def _extract_filter_context(
                     country_raw = qs["country"][0]
                 if city_raw is None and "city" in qs and qs["city"]:
                     city_raw = qs["city"][0]
+                if q_raw is None and "q" in qs and qs["q"]:
+                    q_raw = qs["q"][0]
+                if bbox_raw is None and "bbox" in qs and qs["bbox"]:
+                    bbox_raw = qs["bbox"][0]
+                if near_raw is None and "near" in qs and qs["near"]:
+                    near_raw = qs["near"][0]
             except Exception:
                 pass
 
@@ -213,12 +302,39 @@ def _extract_filter_context(
     if city_value == "":
         city_value = None
 
-    return jump_date_for_url, rating_int, tag_id, country_value, city_value
+    q_value = q_raw.strip() if q_raw else None
+    if q_value == "":
+        q_value = None
+
+    # Malformed area context is dropped rather than failing the detail page.
+    bbox_value = (bbox_raw or "").strip() or None
+    near_value = (near_raw or "").strip() or None
+    try:
+        parse_bbox(bbox_value)
+    except ValueError:
+        bbox_value = None
+    try:
+        parse_near(near_value)
+    except ValueError:
+        near_value = None
+
+    return jump_date_for_url, rating_int, tag_id, country_value, city_value, q_value, bbox_value, near_value
+
+
+def _geo_areas(bbox: str | None, near: str | None) -> list[GeoArea]:
+    """Area filters from the bbox/near query params (400 if malformed)."""
+    try:
+        areas = [parse_bbox(bbox), parse_near(near)]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [a for a in areas if a is not None]
 
 
 @web_router.get("/", response_class=HTMLResponse)
 def gallery(
     request: Request,
+    settings: AppSettings,
+    SessionLocal: ReadSessions,
     jump: str | None = Query(None, description="Jump date/datetime (ISO). e.g. 2010-01-01 or 2010-01-01T12:34:56"),
     start: str | None = Query(None, description="Compatibility alias for jump"),
     limit: int = Query(60, ge=1, le=200),
@@ -228,13 +344,13 @@ def gallery(
     tag: str | None = Query(None, description="Filter photos by tag id"),
     country: str | None = Query(None, description="Filter photos by geo country"),
     city: str | None = Query(None, description="Filter photos by geo city"),
+    q: str | None = Query(None, description="Full-text search over caption, place, camera, path and tags"),
+    bbox: str | None = Query(None, description="Filter photos to an area: west,south,east,north"),
+    near: str | None = Query(None, description="Filter photos near a point: lat,lon[,km] (default 1 km)"),
 ):
-    settings = settings_or_500()
-
-    SessionLocal = sessionmaker_for(settings.db_path)
-
     raw_jump = jump or start
     jump_end_iso, jump_date_value = _parse_jump_to_end_iso(raw_jump)
+    jump_end_ts = taken_at_from_iso(jump_end_iso)
 
     direction: str
     cursor_value: str | None
@@ -267,71 +383,48 @@ def gallery(
     country_value = (country or "").strip() or None
     city_value = (city or "").strip() or None
     city_norm = city_value.casefold() if city_value else None
+    q_value = (q or "").strip() or None
+    fts_match = fts_match_query(q_value)
+    bbox_value = (bbox or "").strip() or None
+    near_value = (near or "").strip() or None
+    areas = _geo_areas(bbox_value, near_value)
 
     with SessionLocal() as session:
         all_tags = list_tags(session)
 
-        geo_country_rows = list(
-            session.execute(
-                select(Photo.geo_country)
-                .where(Photo.geo_country.is_not(None))
-                .where(Photo.geo_country != "")
-                .distinct()
-                .order_by(Photo.geo_country.asc())
-            ).all()
+        # Precomputed (core/counts.py); city keys are "country|city".
+        geo_countries = [key for key, _ in photo_counts(session, "country")]
+        geo_cities = sorted(
+            {
+                key.partition("|")[2]
+                for key, _ in photo_counts(session, "city")
+                if country_value is None or key.partition("|")[0] == country_value
+            }
         )
-        geo_countries = [str(r[0]) for r in geo_country_rows if r and r[0]]
 
-        geo_cities_q = (
-            select(Photo.geo_city)
-            .where(Photo.geo_city.is_not(None))
-            .where(Photo.geo_city != "")
-        )
-        if country_value is not None:
-            geo_cities_q = geo_cities_q.where(Photo.geo_country == country_value)
-        geo_city_rows = list(
-            session.execute(
-                geo_cities_q.distinct().order_by(Photo.geo_city.asc())
-            ).all()
-        )
-        geo_cities = [str(r[0]) for r in geo_city_rows if r and r[0]]
+        timeline = TimelineFilter(rating=rating_int, tag_id=tag_id, country=country_value, city_norm=city_norm)
+        base = timeline.apply(select(*TILE_COLUMNS))
+        if fts_match is not None:
+            base = base.where(photo_search_clause(session, fts_match))
+        for area in areas:
+            area_clause, span = photo_area_clause(session, area)
+            base = base.where(area_clause)
+            timeline = timeline.within(span)
 
-        base = select(Photo).where(Photo.datetime_original.is_not(None))
-        if rating_int is not None:
-            base = base.where(Photo.rating == rating_int)
-        if tag_id is not None:
-            base = base.join(PhotoTag, PhotoTag.photo_guid == Photo.guid).where(PhotoTag.tag_id == tag_id)
-        if country_value is not None:
-            base = base.where(Photo.geo_country == country_value)
-        if city_norm is not None:
-            base = base.where(Photo.geo_city_norm == city_norm)
-
-        rows: list[Photo]
         if direction == "initial":
-            q = base.where(Photo.datetime_original <= jump_end_iso).order_by(
-                Photo.datetime_original.desc(), Photo.guid.desc()
-            )
-            rows = session.execute(q.limit(limit + 1)).scalars().all()
+            q = timeline.at_or_before(base, jump_end_ts)
+            rows = session.execute(q.limit(limit + 1)).all()
         else:
             if not cursor_value:
                 raise HTTPException(status_code=400, detail="missing cursor")
             cursor_dt, cursor_guid = b64decode_cursor(cursor_value)
+            cursor_ts = cursor_taken_at(cursor_dt)
             if direction == "older":
-                q = base.where(
-                    or_(
-                        Photo.datetime_original < cursor_dt,
-                        and_(Photo.datetime_original == cursor_dt, Photo.guid < cursor_guid),
-                    )
-                ).order_by(Photo.datetime_original.desc(), Photo.guid.desc())
-                rows = session.execute(q.limit(limit + 1)).scalars().all()
+                q = timeline.newest_first(timeline.older_than(base, cursor_ts, cursor_guid))
+                rows = session.execute(q.limit(limit + 1)).all()
             else:
-                q = base.where(
-                    or_(
-                        Photo.datetime_original > cursor_dt,
-                        and_(Photo.datetime_original == cursor_dt, Photo.guid > cursor_guid),
-                    )
-                ).order_by(Photo.datetime_original.asc(), Photo.guid.asc())
-                rows = session.execute(q.limit(limit + 1)).scalars().all()
+                q = timeline.oldest_first(timeline.newer_than(base, cursor_ts, cursor_guid))
+                rows = session.execute(q.limit(limit + 1)).all()
 
         has_more_in_direction = len(rows) > limit
         rows = rows[:limit]
@@ -350,61 +443,59 @@ def gallery(
             oldest = rows[-1]
 
             # Older = items strictly older than the oldest item on this page.
+            probe = base.with_only_columns(Photo.guid)
             older_exists = session.execute(
-                base.where(
-                    or_(
-                        Photo.datetime_original < oldest.datetime_original,
-                        and_(
-                            Photo.datetime_original == oldest.datetime_original,
-                            Photo.guid < oldest.guid,
-                        ),
-                    )
-                )
-                .limit(1)
+                timeline.older_than(probe, oldest.taken_at, oldest.guid).limit(1)
             ).first()
             has_older = bool(older_exists) or (direction in {"initial", "older"} and has_more_in_direction)
             if has_older:
-                older_cursor = b64encode_cursor(oldest.datetime_original, oldest.guid)
+                older_cursor = b64encode_cursor(str(oldest.taken_at), oldest.guid)
 
             # Newer = items strictly newer than the newest item on this page.
             newer_exists = session.execute(
-                base.where(
-                    or_(
-                        Photo.datetime_original > newest.datetime_original,
-                        and_(
-                            Photo.datetime_original == newest.datetime_original,
-                            Photo.guid > newest.guid,
-                        ),
-                    )
-                )
-                .limit(1)
+                timeline.newer_than(probe, newest.taken_at, newest.guid).limit(1)
             ).first()
             has_newer = bool(newer_exists) or (direction == "newer" and has_more_in_direction)
             if has_newer:
-                newer_cursor = b64encode_cursor(newest.datetime_original, newest.guid)
+                newer_cursor = b64encode_cursor(str(newest.taken_at), newest.guid)
 
     items = [
         {
             "guid": r.guid,
-            "thumb_url": f"/phototank/thumb/{r.guid}",
+            "thumb_url": thumb_url(settings.deriv_root, r.guid),
+            "srcset": _srcset(settings, r.guid),
             "date": r.datetime_original,
             "rating": r.rating,
         }
         for r in rows
     ]
 
+    # Leading tiles are loaded from one sprite atlas (see gallery.js) instead of
+    # one /thumb request each.
+    sprite_count = max(0, int(settings.gallery_sprite_count))
+    sprite_url = ""
+    if sprite_count and items:
+        sprite_url = "/phototank/sprite?" + urlencode(
+            {"guids": ",".join(it["guid"] for it in items[:sprite_count])}
+        )
+
     return templates.TemplateResponse(
         "gallery.html",
         {
             "request": request,
             "page_title": "Gallery",
             "items": items,
+            "sprite_url": sprite_url,
+            "sprite_count": sprite_count,
             "jump_date": jump_date_value,
             "limit": limit,
             "rating": rating_int,
             "tag_id": tag_id,
             "country": country_value,
             "city": city_value,
+            "q": q_value,
+            "bbox": bbox_value,
+            "near": near_value,
             "geo_countries": geo_countries,
             "geo_cities": geo_cities,
             "tags": all_tags,
@@ -417,26 +508,11 @@ def gallery(
 
 
 @web_router.get("/dashboard", response_class=HTMLResponse)
-def dashboard(request: Request):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
-    SessionLocal = sessionmaker_for(settings.db_path)
-
+def dashboard(request: Request, settings: LibrarySettings, SessionLocal: ReadSessions):
     with SessionLocal() as session:
-        total_photos = int(session.execute(select(func.count()).select_from(Photo)).scalar_one())
-
-        # Year counts based on rel_path prefix (YYYY/...). This matches the library layout.
-        year_expr = func.substr(Photo.rel_path, 1, 4)
-        year_rows = (
-            session.execute(
-                select(year_expr.label("year"), func.count().label("count"))
-                .where(Photo.rel_path.op("GLOB")("[0-9][0-9][0-9][0-9]/*"))
-                .group_by(year_expr)
-                .order_by(year_expr.desc())
-            )
-            .all()
-        )
+        # Precomputed by triggers (see core/counts.py); years follow the rel_path layout (YYYY/...).
+        total_photos = total_photo_count(session)
+        year_rows = list(reversed(photo_counts(session, "year")))
 
         jobs = list(
             session.execute(
@@ -445,6 +521,7 @@ def dashboard(request: Request):
                 .limit(200)
             ).scalars().all()
         )
+        backup = _backup_context(session, settings)
 
     running_jobs: list[tuple[str, ScanJob]] = []
     recent_jobs: list[tuple[str, ScanJob]] = []
@@ -462,7 +539,7 @@ def dashboard(request: Request):
     running_jobs.sort(key=lambda x: _job_sort_key(x[1]), reverse=True)
     recent_jobs.sort(key=lambda x: _job_sort_key(x[1]), reverse=True)
 
-    photos_per_year = [(str(y), int(c)) for (y, c) in year_rows if y is not None]
+    photos_per_year = year_rows
 
     return templates.TemplateResponse(
         "dashboard.html",
@@ -479,6 +556,9 @@ def dashboard(request: Request):
             "phone_sync_default_port": int(settings.phone_sync_port),
             "phone_sync_default_source": settings.phone_sync_source_path or "",
             "phone_sync_default_dest": settings.phone_sync_dest_path or "",
+            "sqlite_profile": settings.sqlite_profile,
+            "db_maintenance_interval_min": int(settings.db_maintenance_interval_min),
+            **backup,
         },
     )
 
@@ -486,24 +566,21 @@ def dashboard(request: Request):
 @web_router.post("/dashboard/import/start", response_class=HTMLResponse)
 def dashboard_import_start(
     request: Request,
+    settings: LibrarySettings,
+    SessionLocal: ReadSessions,
     ingest_mode: str | None = Form(None),
 ):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
     ensure_deriv_root(settings.deriv_root)
     ensure_import_dirs(settings.import_root, settings.failed_root)
 
-    SessionLocal = sessionmaker_for(settings.db_path)
-
     mode = (ingest_mode or "move").strip().lower()
     if mode not in {"move", "copy"}:
         raise HTTPException(status_code=400, detail="ingest_mode must be 'move' or 'copy'")
 
     job_id = new_job_id()
-    with SessionLocal() as session:
-        with session.begin():
-            create_job(session, job_id=job_id, year=None, job_type="ingest")
-        session.commit()
+    writer_for(settings.db_path).run(
+        lambda session: create_job(session, job_id=job_id, year=None, job_type="ingest")
+    )
 
     _start_job_thread(run_ingest_job, job_id, ingest_mode=mode)
 
@@ -521,12 +598,7 @@ def dashboard_import_start(
 
 
 @web_router.get("/dashboard/import/status/{job_id}", response_class=HTMLResponse)
-def dashboard_import_status(request: Request, job_id: str):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
-    SessionLocal = sessionmaker_for(settings.db_path)
-
+def dashboard_import_status(request: Request, settings: LibrarySettings, SessionLocal: ReadSessions, job_id: str):
     with SessionLocal() as session:
         job = _load_job_or_404(session=session, job_id=job_id)
 
@@ -543,33 +615,20 @@ def dashboard_import_status(request: Request, job_id: str):
 @web_router.post("/dashboard/validate/start", response_class=HTMLResponse)
 def dashboard_validate_start(
     request: Request,
+    settings: LibrarySettings,
+    SessionLocal: ReadSessions,
     year: str | None = Form(None),
     repair_mid_exif: bool = Form(False),
     do_geolookup: bool = Form(True),
 ):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
     ensure_deriv_root(settings.deriv_root)
 
-    year_int: int | None = None
-    if year is not None:
-        y = year.strip()
-        if y != "":
-            try:
-                year_int = int(y)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="year must be a number (YYYY)")
-
-    if year_int is not None and (year_int < 1900 or year_int > 2100):
-        raise HTTPException(status_code=400, detail="year must be between 1900 and 2100")
-
-    SessionLocal = sessionmaker_for(settings.db_path)
+    year_int = _form_year(year)
 
     job_id = new_job_id()
-    with SessionLocal() as session:
-        with session.begin():
-            create_job(session, job_id=job_id, year=year_int, job_type="validate")
-        session.commit()
+    writer_for(settings.db_path).run(
+        lambda session: create_job(session, job_id=job_id, year=year_int, job_type="validate")
+    )
 
     _start_job_thread(
         run_validate_job,
@@ -592,12 +651,7 @@ def dashboard_validate_start(
 
 
 @web_router.get("/dashboard/validate/status/{job_id}", response_class=HTMLResponse)
-def dashboard_validate_status(request: Request, job_id: str):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
-
-    SessionLocal = sessionmaker_for(settings.db_path)
-
+def dashboard_validate_status(request: Request, settings: LibrarySettings, SessionLocal: ReadSessions, job_id: str):
     with SessionLocal() as session:
         job = _load_job_or_404(session=session, job_id=job_id)
 
@@ -614,14 +668,14 @@ def dashboard_validate_status(request: Request, job_id: str):
 @web_router.post("/dashboard/phone-sync/start", response_class=HTMLResponse)
 def dashboard_phone_sync_start(
     request: Request,
+    settings: LibrarySettings,
+    SessionLocal: ReadSessions,
     ip: str | None = Form(None),
     remote_source_path: str | None = Form(None),
     remote_dest_path: str | None = Form(None),
     ssh_user: str | None = Form(None),
     ssh_port: int | None = Form(None),
 ):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
     ensure_deriv_root(settings.deriv_root)
 
     ip_value = (ip or settings.phone_sync_ip or "").strip()
@@ -640,13 +694,10 @@ def dashboard_phone_sync_start(
     if not user_value:
         raise HTTPException(status_code=400, detail="missing ssh_user")
 
-    SessionLocal = sessionmaker_for(settings.db_path)
-
     job_id = new_job_id()
-    with SessionLocal() as session:
-        with session.begin():
-            create_job(session, job_id=job_id, year=None, job_type="phone_sync")
-        session.commit()
+    writer_for(settings.db_path).run(
+        lambda session: create_job(session, job_id=job_id, year=None, job_type="phone_sync")
+    )
 
     _start_job_thread(
         run_phone_sync_job,
@@ -675,13 +726,13 @@ def dashboard_phone_sync_start(
 @web_router.post("/dashboard/phone-reconcile/start", response_class=HTMLResponse)
 def dashboard_phone_reconcile_start(
     request: Request,
+    settings: LibrarySettings,
+    SessionLocal: ReadSessions,
     ip: str | None = Form(None),
     remote_dest_path: str | None = Form(None),
     ssh_user: str | None = Form(None),
     ssh_port: int | None = Form(None),
 ):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
     ensure_deriv_root(settings.deriv_root)
 
     ip_value = (ip or settings.phone_sync_ip or "").strip()
@@ -697,13 +748,10 @@ def dashboard_phone_reconcile_start(
     if not user_value:
         raise HTTPException(status_code=400, detail="missing ssh_user")
 
-    SessionLocal = sessionmaker_for(settings.db_path)
-
     job_id = new_job_id()
-    with SessionLocal() as session:
-        with session.begin():
-            create_job(session, job_id=job_id, year=None, job_type="phone_reconcile")
-        session.commit()
+    writer_for(settings.db_path).run(
+        lambda session: create_job(session, job_id=job_id, year=None, job_type="phone_reconcile")
+    )
 
     _start_job_thread(
         run_phone_reconcile_job,
@@ -728,13 +776,146 @@ def dashboard_phone_reconcile_start(
     )
 
 
-@web_router.get("/dashboard/job/status/{job_id}", response_class=HTMLResponse)
-def dashboard_job_status(request: Request, job_id: str):
-    settings = settings_or_500()
-    ensure_dirs_and_db(settings.photo_root, settings.db_path)
+@web_router.post("/dashboard/db-maintenance/start", response_class=HTMLResponse)
+def dashboard_db_maintenance_start(request: Request, settings: LibrarySettings, SessionLocal: ReadSessions):
+    job_id = new_job_id()
+    writer_for(settings.db_path).run(
+        lambda session: create_job(session, job_id=job_id, year=None, job_type="db_maintenance")
+    )
 
-    SessionLocal = sessionmaker_for(settings.db_path)
+    _start_job_thread(run_db_maintenance_job, job_id)
 
+    with SessionLocal() as session:
+        job = _load_job_or_404(session=session, job_id=job_id)
+
+    return templates.TemplateResponse(
+        "partials/dashboard_job_status.html",
+        {
+            "request": request,
+            "kind": "db_maintenance",
+            "job": job,
+        },
+    )
+
+
+@web_router.post("/dashboard/counts/rebuild/start", response_class=HTMLResponse)
+def dashboard_rebuild_counts_start(request: Request, settings: LibrarySettings, SessionLocal: ReadSessions):
+    job_id = new_job_id()
+    writer_for(settings.db_path).run(
+        lambda session: create_job(session, job_id=job_id, year=None, job_type="rebuild_counts")
+    )
+
+    _start_job_thread(run_rebuild_counts_job, job_id)
+
+    with SessionLocal() as session:
+        job = _load_job_or_404(session=session, job_id=job_id)
+
+    return templates.TemplateResponse(
+        "partials/dashboard_job_status.html",
+        {
+            "request": request,
+            "kind": "rebuild_counts",
+            "job": job,
+        },
+    )
+
+
+@web_router.post("/dashboard/geocode/start", response_class=HTMLResponse)
+def dashboard_geocode_start(
+    request: Request,
+    settings: LibrarySettings,
+    SessionLocal: ReadSessions,
+    year: str | None = Form(None),
+):
+    year_int = _form_year(year)
+
+    with SessionLocal() as session:
+        running = session.execute(
+            select(ScanJob.job_id)
+            .where(ScanJob.job_type == "geocode")
+            .where(ScanJob.state.in_(("queued", "running")))
+            .limit(1)
+        ).first()
+    if running:
+        raise HTTPException(status_code=409, detail="a geocode job is already running")
+
+    job_id = new_job_id()
+    writer_for(settings.db_path).run(
+        lambda session: create_job(session, job_id=job_id, year=year_int, job_type="geocode")
+    )
+
+    _start_job_thread(run_geocode_job, job_id)
+
+    with SessionLocal() as session:
+        job = _load_job_or_404(session=session, job_id=job_id)
+
+    return templates.TemplateResponse(
+        "partials/dashboard_job_status.html",
+        {
+            "request": request,
+            "kind": "geocode",
+            "job": job,
+        },
+    )
+
+
+@web_router.post("/dashboard/backup/start", response_class=HTMLResponse)
+def dashboard_db_backup_start(request: Request, settings: LibrarySettings, SessionLocal: ReadSessions):
+    with SessionLocal() as session:
+        running = session.execute(
+            select(ScanJob.job_id)
+            .where(ScanJob.job_type == "db_backup")
+            .where(ScanJob.state.in_(("queued", "running")))
+            .limit(1)
+        ).first()
+    if running:
+        raise HTTPException(status_code=409, detail="a backup is already running")
+
+    job_id = new_job_id()
+    writer_for(settings.db_path).run(
+        lambda session: create_job(session, job_id=job_id, year=None, job_type="db_backup")
+    )
+
+    _start_job_thread(run_db_backup_job, job_id)
+
+    with SessionLocal() as session:
+        job = _load_job_or_404(session=session, job_id=job_id)
+
+    return templates.TemplateResponse(
+        "partials/dashboard_job_status.html",
+        {
+            "request": request,
+            "kind": "db_backup",
+            "job": job,
+        },
+    )
+
+
+@web_router.post("/dashboard/backup/schedule", response_class=HTMLResponse)
+def dashboard_db_backup_schedule(
+    request: Request,
+    settings: LibrarySettings,
+    SessionLocal: ReadSessions,
+    interval_hours: int = Form(0),
+    keep: int = Form(7),
+):
+    if not 0 <= interval_hours <= 8760:
+        raise HTTPException(status_code=400, detail="interval_hours must be between 0 and 8760")
+    if not 1 <= keep <= 1000:
+        raise HTTPException(status_code=400, detail="keep must be between 1 and 1000")
+
+    writer_for(settings.db_path).run(
+        lambda session: save_backup_schedule(session, interval_hours=interval_hours, keep=keep)
+    )
+
+    with SessionLocal() as session:
+        ctx = _backup_context(session, settings, saved=True)
+
+    return templates.TemplateResponse("partials/dashboard_backup.html", {"request": request, **ctx})
+
+
+@web_router.get("/dashboard/job/status/{job_id}", response_class=HTMLResponse)
+def dashboard_job_status(request: Request, settings: LibrarySettings, SessionLocal: ReadSessions, job_id: str):
     with SessionLocal() as session:
         job = _load_job_or_404(session=session, job_id=job_id)
 
@@ -751,6 +932,8 @@ def dashboard_job_status(request: Request, job_id: str):
 @web_router.get("/photo/{guid}", response_class=HTMLResponse)
 def photo_detail(
     request: Request,
+    settings: AppSettings,
+    SessionLocal: ReadSessions,
     guid: str,
     from_: str | None = Query(None, alias="from"),
     jump: str | None = Query(None, description="Filter context: ISO date/datetime"),
@@ -759,11 +942,13 @@ def photo_detail(
     tag: str | None = Query(None, description="Filter context: tag id"),
     country: str | None = Query(None, description="Filter context: geo country"),
     city: str | None = Query(None, description="Filter context: geo city"),
+    q: str | None = Query(None, description="Filter context: search text"),
+    bbox: str | None = Query(None, description="Filter context: west,south,east,north"),
+    near: str | None = Query(None, description="Filter context: lat,lon[,km]"),
 ):
-    settings = settings_or_500()
     guid = normalize_guid(guid)
 
-    jump_for_url, rating_int, tag_ctx, country_ctx, city_ctx = _extract_filter_context(
+    jump_for_url, rating_int, tag_ctx, country_ctx, city_ctx, q_value, bbox_value, near_value = _extract_filter_context(
         from_=from_,
         jump=jump,
         start=start,
@@ -771,7 +956,12 @@ def photo_detail(
         tag=tag,
         country=country,
         city=city,
+        q=q,
+        bbox=bbox,
+        near=near,
     )
+    fts_match = fts_match_query(q_value)
+    areas = _geo_areas(bbox_value, near_value)
 
     tag_id: int | None = None
     if tag is not None and tag != "":
@@ -786,8 +976,6 @@ def photo_detail(
     city_value = (city.strip() if city is not None else None) or city_ctx
     city_norm = city_value.casefold() if city_value else None
 
-    SessionLocal = sessionmaker_for(settings.db_path)
-
     with SessionLocal() as session:
         row = fetch_photo(session, guid)
         photo_tags = tags_for_photo(session, guid)
@@ -799,35 +987,20 @@ def photo_detail(
     # Prev/next within filter context (newest-first globally; no jump-based cutoff).
     prev_guid: str | None = None
     next_guid: str | None = None
-    cur_dt = row.get("datetime_original")
-    if cur_dt:
+    cur_ts = row.get("taken_at")
+    if cur_ts is not None:
         with SessionLocal() as session:
-            base = (
-                select(Photo.guid, Photo.datetime_original)
-                .where(Photo.datetime_original.is_not(None))
-            )
-            if rating_int is not None:
-                base = base.where(Photo.rating == rating_int)
-            if tag_id is not None:
-                base = base.join(PhotoTag, PhotoTag.photo_guid == Photo.guid).where(PhotoTag.tag_id == tag_id)
-            if country_value is not None:
-                base = base.where(Photo.geo_country == country_value)
-            if city_norm is not None:
-                base = base.where(Photo.geo_city_norm == city_norm)
-
-            next_q = base.where(
-                or_(
-                    Photo.datetime_original > cur_dt,
-                    and_(Photo.datetime_original == cur_dt, Photo.guid > guid),
-                )
-            ).order_by(Photo.datetime_original.asc(), Photo.guid.asc()).limit(1)
-
-            prev_q = base.where(
-                or_(
-                    Photo.datetime_original < cur_dt,
-                    and_(Photo.datetime_original == cur_dt, Photo.guid < guid),
-                )
-            ).order_by(Photo.datetime_original.desc(), Photo.guid.desc()).limit(1)
+            timeline = TimelineFilter(rating=rating_int, tag_id=tag_id, country=country_value, city_norm=city_norm)
+            base = timeline.apply(select(Photo.guid))
+            if fts_match is not None:
+                base = base.where(photo_search_clause(session, fts_match))
+            for area in areas:
+                area_clause, span = photo_area_clause(session, area)
+                base = base.where(area_clause)
+                timeline = timeline.within(span)
+
+            next_q = timeline.oldest_first(timeline.newer_than(base, cur_ts, guid)).limit(1)
+            prev_q = timeline.newest_first(timeline.older_than(base, cur_ts, guid)).limit(1)
 
             next_row = session.execute(next_q).first()
             prev_row = session.execute(prev_q).first()
@@ -846,6 +1019,12 @@ def photo_detail(
             q["country"] = country_value
         if city_value is not None:
             q["city"] = city_value
+        if q_value is not None:
+            q["q"] = q_value
+        if bbox_value is not None:
+            q["bbox"] = bbox_value
+        if near_value is not None:
+            q["near"] = near_value
         if back_url:
             q["from"] = back_url
         return f"/phototank/photo/{target_guid}?{urlencode(q)}"
@@ -857,8 +1036,9 @@ def photo_detail(
         "request": request,
         "page_title": "Detail",
         "photo": row,
-        "thumb_url": f"/phototank/thumb/{guid}",
-        "mid_url": f"/phototank/mid/{guid}",
+        "thumb_url": thumb_url(settings.deriv_root, guid),
+        "mid_url": mid_url(settings.deriv_root, guid),
+        "mid_srcset": _srcset(settings, guid),
         "original_url": f"/phototank/original/{guid}",
         "download_url": f"/phototank/download/original/{guid}",
         "photo_tags": photo_tags,
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from PIL import Image
+
+
+# Bytes per pixel of the decoded raster, by PIL mode.
+_MODE_BYTES = {
+    "1": 1,
+    "L": 1,
+    "P": 1,
+    "LA": 2,
+    "I;16": 2,
+    "I;16B": 2,
+    "I;16L": 2,
+    "RGB": 3,
+    "YCbCr": 3,
+    "LAB": 3,
+    "HSV": 3,
+    "RGBA": 4,
+    "RGBX": 4,
+    "CMYK": 4,
+    "I": 4,
+    "F": 4,
+}
+
+
+class DecodeScheduler:
+    """Admit image decodes against a global memory budget.
+
+    Work whose estimated cost doesn't fit waits until enough running decodes
+    finish. A decode larger than the whole budget is admitted once nothing else
+    is running, so it still makes progress without stacking on top of others.
+    """
+
+    def __init__(self, budget_bytes: int) -> None:
+        self.budget_bytes = max(1, int(budget_bytes))
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._running = 0
+        self._peak = 0
+        self._admitted = 0
+        self._waited = 0
+
+    @contextmanager
+    def admit(self, cost_bytes: int) -> Iterator[None]:
+        cost = max(1, int(cost_bytes))
+        with self._cond:
+            waited = False
+            while self._running > 0 and self._in_use + cost > self.budget_bytes:
+                waited = True
+                self._cond.wait()
+            self._in_use += cost
+            self._running += 1
+            self._admitted += 1
+            if waited:
+                self._waited += 1
+            self._peak = max(self._peak, self._in_use)
+        try:
+            yield
+            # The decoded raster is still alive here: the moment a job's RSS peaks.
+            _sample_job_rss()
+        finally:
+            with self._cond:
+                self._in_use -= cost
+                self._running -= 1
+                self._cond.notify_all()
+
+    def stats(self) -> dict[str, float | int]:
+        with self._cond:
+            return {
+                "budget_mb": round(self.budget_bytes / 1e6, 1),
+                "in_use_mb": round(self._in_use / 1e6, 1),
+                "peak_mb": round(self._peak / 1e6, 1),
+                "running": self._running,
+                "admitted": self._admitted,
+                "waited": self._waited,
+            }
+
+
+_SCHEDULER: DecodeScheduler | None = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def decode_scheduler(budget_bytes: int) -> DecodeScheduler:
+    """Process-wide scheduler; the budget follows the latest setting."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = DecodeScheduler(budget_bytes)
+        else:
+            _SCHEDULER.budget_bytes = max(1, int(budget_bytes))
+        return _SCHEDULER
+
+
+def estimate_decode_bytes(im: Image.Image) -> int:
+    """Estimate peak memory for decoding `im` and deriving from it, from header data only.
+
+    Counts the decoded raster, one exif_transpose copy and the first derivative
+    copy (later, smaller rungs are negligible).
+    """
+    w, h = im.size
+    return int(w) * int(h) * _MODE_BYTES.get(im.mode, 4) * 3
+
+
+def reduce_decode(im: Image.Image, target: int) -> bool:
+    """Ask the decoder for a smaller raster that still covers `target` px.
+
+    Works for JPEG (DCT scaling by 1/2, 1/4 or 1/8) before the image is loaded.
+    Returns True if the decode size was reduced.
+    """
+    if im.format != "JPEG":
+        return False
+    before = im.size
+    try:
+        im.draft(None, (int(target), int(target)))
+    except Exception:
+        return False
+    return im.size != before
+
+
+# How often JobRss samples between decodes.
+_RSS_SAMPLE_INTERVAL_S = 0.2
+
+_ACTIVE_RSS: set[JobRss] = set()
+_ACTIVE_RSS_LOCK = threading.Lock()
+
+
+def current_rss_bytes() -> int | None:
+    """Resident set size of this process right now, where supported (Linux)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size over this process's lifetime (MB), where supported."""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except Exception:
+        return None
+    # Linux reports KiB, macOS bytes.
+    if sys.platform == "darwin":
+        return round(peak / 1e6, 1)
+    return round(peak * 1024 / 1e6, 1)
+
+
+class JobRss:
+    """Peak RSS while one job runs, sampled on a timer and at the end of every decode.
+
+    RSS is per process, so decodes running concurrently (other jobs, /mid)
+    count too; it's still the peak this job ran into, unlike ru_maxrss.
+    """
+
+    def __init__(self) -> None:
+        self._peak = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> JobRss:
+        if current_rss_bytes() is None:
+            return self
+        self.sample()
+        with _ACTIVE_RSS_LOCK:
+            _ACTIVE_RSS.add(self)
+        self._thread = threading.Thread(target=self._loop, name="job-rss", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with _ACTIVE_RSS_LOCK:
+            _ACTIVE_RSS.discard(self)
+        self._stop.set()
+
+    def sample(self) -> None:
+        rss = current_rss_bytes()
+        if rss is not None:
+            with self._lock:
+                self._peak = max(self._peak, rss)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(_RSS_SAMPLE_INTERVAL_S):
+            self.sample()
+
+    def peak_mb(self) -> float | None:
+        self.sample()
+        with self._lock:
+            return round(self._peak / 1e6, 1) if self._peak else None
+
+
+def _sample_job_rss() -> None:
+    with _ACTIVE_RSS_LOCK:
+        active = list(_ACTIVE_RSS)
+    for job_rss in active:
+        job_rss.sample()
+
+
+def decode_summary(*, peak_decode_bytes: int, reduced_decodes: int, job_rss: JobRss | None = None) -> str:
+    """One-line per-job memory report for ScanJob.message.
+
+    peak_rss_mb is the job's own peak (from job_rss); where RSS can't be
+    sampled it falls back to process_peak_rss_mb, the peak since the process started.
+    """
+    parts = [f"peak_decode_mb={peak_decode_bytes / 1e6:.1f}", f"reduced_decodes={reduced_decodes}"]
+    rss = job_rss.peak_mb() if job_rss is not None else None
+    if rss is not None:
+        parts.append(f"peak_rss_mb={rss:.1f}")
+    else:
+        process_rss = peak_rss_mb()
+        if process_rss is not None:
+            parts.append(f"process_peak_rss_mb={process_rss:.1f}")
+    return " ".join(parts)
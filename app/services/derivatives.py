@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import hashlib
+import os
+import threading
+from contextlib import nullcontext
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
 
 from PIL import Image, ImageOps
 
+from .decode_budget import decode_scheduler, estimate_decode_bytes, reduce_decode
+
 try:
     from pillow_heif import register_heif_opener
 
@@ -18,6 +24,10 @@ except Exception:
 class DerivResult:
     thumb_created: bool
     mid_created: bool
+    sizes_created: int = 0
+    # Estimated decode memory admitted by the decode scheduler (0 if nothing was decoded).
+    decode_bytes: int = 0
+    reduced_decode: bool = False
 
 
 def _bucketed_path(deriv_root: Path, kind: str, guid: str, ext: str) -> Path:
@@ -34,6 +44,57 @@ def mid_path(deriv_root: Path, guid: str) -> Path:
     return _bucketed_path(deriv_root, "mid", guid, ".webp")
 
 
+def sized_path(deriv_root: Path, guid: str, size: int) -> Path:
+    return _bucketed_path(deriv_root, f"s{int(size)}", guid, ".webp")
+
+
+def derivative_path(deriv_root: Path, guid: str, size: int, *, thumb_max: int, mid_max: int) -> Path:
+    """Path of the derivative for a ladder size; thumb/mid sizes map to their own files."""
+    if int(size) == int(thumb_max):
+        return thumb_path(deriv_root, guid)
+    if int(size) == int(mid_max):
+        return mid_path(deriv_root, guid)
+    return sized_path(deriv_root, guid, size)
+
+
+def content_version(st: os.stat_result) -> str:
+    """Short token for a derivative's content (for ?v= URLs and ETags).
+
+    Derivatives are rewritten whole, never patched, so mtime and size change
+    whenever the bytes do; reading the mid cache's atime stamps leaves it alone.
+    """
+    return hashlib.blake2b(f"{st.st_mtime_ns}:{st.st_size}".encode("ascii"), digest_size=8).hexdigest()
+
+
+def versioned_url(url: str, path: Path) -> str:
+    """`url` with ?v=<content version> of the file at `path`, or `url` unchanged if it doesn't exist."""
+    try:
+        st = path.stat()
+    except OSError:
+        return url
+    return f"{url}?v={content_version(st)}"
+
+
+def derivative_paths(deriv_root: Path, guid: str) -> list[Path]:
+    """All derivative paths that may exist for a guid (thumb, mid and any ladder size on disk)."""
+    paths = [thumb_path(deriv_root, guid), mid_path(deriv_root, guid)]
+    try:
+        for d in deriv_root.iterdir():
+            if d.is_dir() and d.name.startswith("s") and d.name[1:].isdigit():
+                paths.append(sized_path(deriv_root, guid, int(d.name[1:])))
+    except FileNotFoundError:
+        pass
+    return paths
+
+
+def remove_derivatives(deriv_root: Path, guid: str) -> None:
+    for p in derivative_paths(deriv_root, guid):
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+
+
 def _should_regen(out_path: Path, source_mtime: Optional[int]) -> bool:
     if not out_path.exists():
         return True
@@ -59,7 +120,14 @@ def _save_webp(im: Image.Image, out_path: Path, *, quality: int, exif_bytes: byt
     if exif_bytes:
         save_kwargs["exif"] = exif_bytes
 
-    im.save(out_path, **save_kwargs)
+    # Write to a temp name first so /mid never streams a half-written file.
+    tmp_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        im.save(tmp_path, **save_kwargs)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
 
 
 def _extract_mid_exif_bytes(source_im: Image.Image) -> bytes | None:
@@ -104,36 +172,76 @@ def ensure_derivatives(
     thumb_quality: int,
     mid_quality: int,
     repair_mid_exif: bool = False,
+    make_mid: bool = True,
+    sizes: Sequence[int] = (),
+    size_quality: int = 80,
+    decode_budget_bytes: int = 0,
+    reduce_over_pixels: int = 0,
 ) -> DerivResult:
     tpath = thumb_path(deriv_root, guid)
     mpath = mid_path(deriv_root, guid)
 
     need_thumb = _should_regen(tpath, source_mtime)
-    need_mid = _should_regen(mpath, source_mtime)
+    # make_mid=False (mid cache mode) still refreshes stale mids but never creates missing ones.
+    need_mid = _should_regen(mpath, source_mtime) if (make_mid or mpath.exists()) else False
 
-    if repair_mid_exif and not need_mid and not _mid_has_exif(mpath):
+    # Repair only rewrites mids that exist; a missing one is not created for it.
+    if repair_mid_exif and not need_mid and mpath.exists() and not _mid_has_exif(mpath):
         need_mid = True
 
-    if not (need_thumb or need_mid):
+    # (max size, output path, quality, kind)
+    outputs: list[tuple[int, Path, int, str]] = []
+    if need_thumb:
+        outputs.append((int(thumb_max), tpath, int(thumb_quality), "thumb"))
+    if need_mid:
+        outputs.append((int(mid_max), mpath, int(mid_quality), "mid"))
+    for size in sizes:
+        size = int(size)
+        if size in (int(thumb_max), int(mid_max)):
+            continue
+        spath = sized_path(deriv_root, guid, size)
+        if _should_regen(spath, source_mtime):
+            outputs.append((size, spath, int(size_quality), "size"))
+
+    if not outputs:
         return DerivResult(thumb_created=False, mid_created=False)
 
     with Image.open(source_path) as im:
-        im = ImageOps.exif_transpose(im)
-        mid_exif_bytes = _extract_mid_exif_bytes(im)
-
-        thumb_created = False
-        mid_created = False
-
-        if need_thumb:
-            thumb = im.copy()
-            thumb.thumbnail((thumb_max, thumb_max), resample=Image.Resampling.LANCZOS)
-            _save_webp(thumb, tpath, quality=thumb_quality)
-            thumb_created = True
-
-        if need_mid:
-            mid = im.copy()
-            mid.thumbnail((mid_max, mid_max), resample=Image.Resampling.LANCZOS)
-            _save_webp(mid, mpath, quality=mid_quality, exif_bytes=mid_exif_bytes)
-            mid_created = True
-
-        return DerivResult(thumb_created=thumb_created, mid_created=mid_created)
+        # Image.open only parsed the header: size the decode before paying for it.
+        reduced = False
+        w, h = im.size
+        if reduce_over_pixels > 0 and int(w) * int(h) > int(reduce_over_pixels):
+            reduced = reduce_decode(im, max(o[0] for o in outputs))
+        cost = estimate_decode_bytes(im)
+
+        scheduler = decode_scheduler(decode_budget_bytes) if decode_budget_bytes > 0 else None
+        with (scheduler.admit(cost) if scheduler is not None else nullcontext()):
+            im = ImageOps.exif_transpose(im)
+            mid_exif_bytes = _extract_mid_exif_bytes(im) if need_mid else None
+
+            thumb_created = False
+            mid_created = False
+            sizes_created = 0
+
+            # Largest first: each smaller rung is resampled from the previous one, so
+            # the full-resolution decode is copied once no matter how long the ladder is.
+            src = im
+            for size, out_path, quality, kind in sorted(outputs, key=lambda o: o[0], reverse=True):
+                out = src.copy()
+                out.thumbnail((size, size), resample=Image.Resampling.LANCZOS)
+                _save_webp(out, out_path, quality=quality, exif_bytes=(mid_exif_bytes if kind == "mid" else None))
+                src = out
+                if kind == "thumb":
+                    thumb_created = True
+                elif kind == "mid":
+                    mid_created = True
+                else:
+                    sizes_created += 1
+
+        return DerivResult(
+            thumb_created=thumb_created,
+            mid_created=mid_created,
+            sizes_created=sizes_created,
+            decode_bytes=cost,
+            reduced_decode=reduced,
+        )
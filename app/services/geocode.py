@@ -3,59 +3,51 @@ from __future__ import annotations
 import json
 import logging
 import math
-import ssl
 import threading
 import time
-from datetime import datetime, timezone
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
 from typing import Any
 from urllib.error import HTTPError, URLError
-from urllib.parse import urlencode
-from urllib.request import urlopen
 
+from sqlalchemy import and_, case, func, or_, select, update as sa_update
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
 
 from ..core.config import Settings
 from ..core.models import Photo, ReverseGeocodeCache
-
-try:
-    import certifi  # type: ignore
-except Exception:
-    certifi = None
+from .geocode_cache import CacheEntry, GeoCacheLRU
+from .geonames_client import GeoNamesClient, geonames_client
+from .geonames_offline import _haversine_km, offline_geocoder
 
 
 logger = logging.getLogger(__name__)
 
 
-_GEONAMES_THROTTLE_LOCK = threading.Lock()
-_GEONAMES_NEXT_REQUEST_AT_S = 0.0
+_GEONAMES_HALT_LOCK = threading.Lock()
 _GEONAMES_HALT_UNTIL_S = 0.0
 
 
-def _apply_geonames_throttle(settings: Settings) -> None:
-    global _GEONAMES_NEXT_REQUEST_AT_S
-
-    min_interval_s = max(0.0, float(getattr(settings, "geocode_min_interval_s", 0.25)))
-    if min_interval_s <= 0:
-        return
-
-    with _GEONAMES_THROTTLE_LOCK:
-        now = time.monotonic()
-        wait_s = _GEONAMES_NEXT_REQUEST_AT_S - now
-        if wait_s > 0:
-            time.sleep(wait_s)
-            now = time.monotonic()
-        _GEONAMES_NEXT_REQUEST_AT_S = now + min_interval_s
+def _geonames_client_for(settings: Settings) -> GeoNamesClient:
+    min_interval_s = max(0.0, float(settings.geocode_min_interval_s))
+    return geonames_client(
+        settings.geocode_geonames_url,
+        timeout_s=float(settings.geocode_timeout_s),
+        max_connections=max(1, int(settings.geocode_concurrency)),
+        rate_per_s=1.0 / min_interval_s if min_interval_s > 0 else 0.0,
+        hourly_limit=max(0, int(settings.geocode_hourly_quota)),
+    )
 
 
 def _mark_geonames_hourly_limit_hit(settings: Settings) -> None:
     global _GEONAMES_HALT_UNTIL_S
     cooldown_s = max(60.0, float(getattr(settings, "geocode_hourly_limit_cooldown_s", 3600.0)))
-    with _GEONAMES_THROTTLE_LOCK:
+    with _GEONAMES_HALT_LOCK:
         _GEONAMES_HALT_UNTIL_S = max(_GEONAMES_HALT_UNTIL_S, time.monotonic() + cooldown_s)
 
 
 def _geonames_is_halted() -> bool:
-    with _GEONAMES_THROTTLE_LOCK:
+    with _GEONAMES_HALT_LOCK:
         return time.monotonic() < _GEONAMES_HALT_UNTIL_S
 
 
@@ -72,6 +64,25 @@ def utc_now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 
+def _iso_in(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).replace(microsecond=0).isoformat()
+
+
+def _not_yet(retry_after: str | None) -> bool:
+    if not retry_after:
+        return False
+    try:
+        return datetime.now(timezone.utc) < datetime.fromisoformat(retry_after)
+    except ValueError:
+        return False
+
+
+def _error_backoff_s(settings: Settings, error_count: int) -> float:
+    base = max(1.0, float(settings.geocode_error_backoff_s))
+    cap = max(base, float(settings.geocode_error_backoff_max_s))
+    return min(cap, base * 2 ** min(32, max(0, error_count - 1)))
+
+
 def _normalize_text(value: str | None) -> str | None:
     if value is None:
         return None
@@ -104,58 +115,31 @@ def _cache_key(provider: str, cell_m: int, lat_bucket: int, lon_bucket: int) ->
     return f"{provider}:{cell_m}:{lat_bucket}:{lon_bucket}"
 
 
+def _float_or_none(value: Any) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
 def _geonames_lookup(
+    client: GeoNamesClient,
     *,
     lat: float,
     lon: float,
     username: str,
     radius_km: float,
-    timeout_s: float,
 ) -> dict[str, Any] | None:
-    params = {
-        "lat": f"{lat:.7f}",
-        "lng": f"{lon:.7f}",
-        "radius": f"{radius_km:.3f}",
-        "maxRows": "1",
-        "username": username,
-    }
-    query = urlencode(params)
-    https_url = f"https://api.geonames.org/findNearbyPlaceNameJSON?{query}"
-    http_url = f"http://api.geonames.org/findNearbyPlaceNameJSON?{query}"
-
-    timeout = max(1.0, float(timeout_s))
-
-    def _is_cert_error(err: URLError) -> bool:
-        reason = getattr(err, "reason", None)
-        msg = str(reason or err).lower()
-        return isinstance(reason, ssl.SSLCertVerificationError) or (
-            "certificate verify failed" in msg
-            or "certificate_verify_failed" in msg
-            or "hostname mismatch" in msg
-        )
-
-    try:
-        with urlopen(https_url, timeout=timeout) as resp:
-            payload = json.loads(resp.read().decode("utf-8"))
-    except URLError as e:
-        if not _is_cert_error(e):
-            raise
-
-        if certifi is not None:
-            try:
-                ctx = ssl.create_default_context(cafile=certifi.where())
-                with urlopen(https_url, timeout=timeout, context=ctx) as resp:
-                    payload = json.loads(resp.read().decode("utf-8"))
-            except URLError as e2:
-                if not _is_cert_error(e2):
-                    raise
-                logger.warning("GeoNames HTTPS TLS verification failed; falling back to HTTP for lookup")
-                with urlopen(http_url, timeout=timeout) as resp:
-                    payload = json.loads(resp.read().decode("utf-8"))
-        else:
-            logger.warning("GeoNames HTTPS TLS verification failed; falling back to HTTP for lookup")
-            with urlopen(http_url, timeout=timeout) as resp:
-                payload = json.loads(resp.read().decode("utf-8"))
+    payload = client.get_json(
+        "/findNearbyPlaceNameJSON",
+        {
+            "lat": f"{lat:.7f}",
+            "lng": f"{lon:.7f}",
+            "radius": f"{radius_km:.3f}",
+            "maxRows": "1",
+            "username": username,
+        },
+    )
 
     status = payload.get("status")
     if isinstance(status, dict) and status.get("message"):
@@ -185,12 +169,42 @@ def _geonames_lookup(
         "region": region,
         "postcode": _normalize_text(first.get("postalcode")),
         "display_name": display_name,
+        "place_lat": _float_or_none(first.get("lat")),
+        "place_lon": _float_or_none(first.get("lng")),
         "raw_json": json.dumps(first, ensure_ascii=False),
     }
 
 
+def _offline_lookup(settings: Settings, *, lat: float, lon: float) -> dict[str, Any] | None:
+    geocoder = offline_geocoder(settings.geocode_offline_dir)
+    found = geocoder.nearest(lat, lon, max_km=max(0.1, float(settings.geocode_offline_radius_km)))
+    if found is None:
+        return None
+    place, distance_km = found
+    region, country = geocoder.describe(place)
+    city = _normalize_text(place.name)
+    parts = [p for p in [city, _normalize_text(region), _normalize_text(country)] if p]
+    return {
+        "country_code": _normalize_text(place.country_code),
+        "country": country,
+        "city": city,
+        "city_norm": _normalize_city(city),
+        "region": region,
+        "postcode": None,
+        "display_name": ", ".join(parts) if parts else None,
+        "place_lat": place.lat,
+        "place_lon": place.lon,
+        "raw_json": json.dumps(
+            {"geonameId": place.geonameid, "name": place.name, "distance_km": round(distance_km, 3)},
+            ensure_ascii=False,
+        ),
+    }
+
+
 def _lookup_provider_data(settings: Settings, *, lat: float, lon: float) -> dict[str, Any] | None:
     provider = (settings.geocode_provider or "").strip().lower()
+    if provider == "offline":
+        return _offline_lookup(settings, lat=lat, lon=lon)
     if provider != "geonames":
         raise RuntimeError(f"Unsupported geocode provider: {provider}")
 
@@ -200,46 +214,108 @@ def _lookup_provider_data(settings: Settings, *, lat: float, lon: float) -> dict
 
     primary = max(0.05, float(settings.geocode_radius_km_primary))
     fallback = max(primary, float(settings.geocode_radius_km_fallback))
-    timeout_s = max(1.0, float(settings.geocode_timeout_s))
+    client = _geonames_client_for(settings)
 
-    first = _geonames_lookup(lat=lat, lon=lon, username=username, radius_km=primary, timeout_s=timeout_s)
+    first = _geonames_lookup(client, lat=lat, lon=lon, username=username, radius_km=primary)
     if first is not None:
         return first
 
     if fallback > primary:
-        return _geonames_lookup(lat=lat, lon=lon, username=username, radius_km=fallback, timeout_s=timeout_s)
+        return _geonames_lookup(client, lat=lat, lon=lon, username=username, radius_km=fallback)
 
     return None
 
 
-def _apply_cached_to_photo(photo: Photo, cached: ReverseGeocodeCache, *, provider: str, cache_key: str, now: str) -> None:
-    photo.geo_country_code = cached.country_code
-    photo.geo_country = cached.country
-    photo.geo_city = cached.city
-    photo.geo_city_norm = cached.city_norm
-    photo.geo_region = cached.region
-    photo.geo_postcode = cached.postcode
-    photo.geo_display_name = cached.display_name
-    photo.geo_provider = provider
-    photo.geo_cache_key = cache_key
-    photo.geo_lookup_at = now
-    photo.geo_lookup_status = "ok"
-    photo.geo_lookup_error = None
-
-
-def _apply_result_to_photo(photo: Photo, data: dict[str, Any], *, provider: str, cache_key: str, now: str) -> None:
-    photo.geo_country_code = _normalize_text(data.get("country_code"))
-    photo.geo_country = _normalize_text(data.get("country"))
-    photo.geo_city = _normalize_text(data.get("city"))
-    photo.geo_city_norm = _normalize_city(data.get("city"))
-    photo.geo_region = _normalize_text(data.get("region"))
-    photo.geo_postcode = _normalize_text(data.get("postcode"))
-    photo.geo_display_name = _normalize_text(data.get("display_name"))
-    photo.geo_provider = provider
-    photo.geo_cache_key = cache_key
-    photo.geo_lookup_at = now
-    photo.geo_lookup_status = "ok"
-    photo.geo_lookup_error = None
+@dataclass
+class GeoUpdate:
+    """Outcome of a reverse-geocode resolution, ready to be written.
+
+    `values` holds Photo geo_* columns to set. `cache_hit` bumps the usage
+    counters of an existing cache row (unless a GeoCacheLRU counted the hit);
+    `cache_row` is a cache row to insert, or to replace an expired negative
+    (miss/error) entry with. `parent_row` is a fine-cell result's vote for its
+    parent cell. `looked_up` is set when the provider was asked, `parent_hit`
+    when the parent cell answered instead.
+    """
+
+    guid: str
+    values: dict[str, Any]
+    cache_key: str | None = None
+    cache_hit: bool = False
+    cache_row: dict[str, Any] | None = None
+    parent_row: dict[str, Any] | None = None
+    looked_up: bool = False
+    parent_hit: bool = False
+
+
+def _parent_cell(settings: Settings, *, provider: str, lat: float, lon: float) -> tuple[str, int, int, int] | None:
+    """(cache_key, cell_m, lat_bucket, lon_bucket) of the coarse parent cell, or None if off."""
+    parent_m = int(settings.geocode_parent_cell_m)
+    if parent_m <= max(10, int(settings.geocode_cache_cell_m)):
+        return None
+    _, _, lat_bucket, lon_bucket = _snap_to_grid(lat, lon, parent_m)
+    return _cache_key(provider, parent_m, lat_bucket, lon_bucket), parent_m, lat_bucket, lon_bucket
+
+
+def _parent_answers(entry: ReverseGeocodeCache | CacheEntry | None, *, settings: Settings, lat: float, lon: float) -> bool:
+    """Promotion rule: enough fine cells agreed on the place, and it is near this point."""
+    if entry is None or (entry.status or "ok") != "ok":
+        return False
+    if int(entry.place_votes or 0) < max(1, int(settings.geocode_parent_promote_after)):
+        return False
+    if entry.place_lat is None or entry.place_lon is None:
+        return False
+    return _haversine_km(lat, lon, entry.place_lat, entry.place_lon) <= float(settings.geocode_parent_radius_km)
+
+
+def _same_place(entry: ReverseGeocodeCache | CacheEntry, row: dict[str, Any]) -> bool:
+    return entry.country_code == row["country_code"] and entry.city_norm == row["city_norm"]
+
+
+def _cached_values(cached: ReverseGeocodeCache | CacheEntry, *, provider: str, cache_key: str, now: str) -> dict[str, Any]:
+    return {
+        "geo_country_code": cached.country_code,
+        "geo_country": cached.country,
+        "geo_city": cached.city,
+        "geo_city_norm": cached.city_norm,
+        "geo_region": cached.region,
+        "geo_postcode": cached.postcode,
+        "geo_display_name": cached.display_name,
+        "geo_provider": provider,
+        "geo_cache_key": cache_key,
+        "geo_lookup_at": now,
+        "geo_lookup_status": "ok",
+        "geo_lookup_error": None,
+    }
+
+
+def _result_values(data: dict[str, Any], *, provider: str, cache_key: str, now: str) -> dict[str, Any]:
+    return {
+        "geo_country_code": _normalize_text(data.get("country_code")),
+        "geo_country": _normalize_text(data.get("country")),
+        "geo_city": _normalize_text(data.get("city")),
+        "geo_city_norm": _normalize_city(data.get("city")),
+        "geo_region": _normalize_text(data.get("region")),
+        "geo_postcode": _normalize_text(data.get("postcode")),
+        "geo_display_name": _normalize_text(data.get("display_name")),
+        "geo_provider": provider,
+        "geo_cache_key": cache_key,
+        "geo_lookup_at": now,
+        "geo_lookup_status": "ok",
+        "geo_lookup_error": None,
+    }
+
+
+def _error_values(*, provider: str, cache_key: str | None, now: str, status: str, error: str | None) -> dict[str, Any]:
+    values: dict[str, Any] = {
+        "geo_provider": provider,
+        "geo_lookup_at": now,
+        "geo_lookup_status": status,
+        "geo_lookup_error": error,
+    }
+    if cache_key is not None:
+        values["geo_cache_key"] = cache_key
+    return values
 
 
 def _should_lookup(photo: Photo) -> bool:
@@ -250,43 +326,262 @@ def _should_lookup(photo: Photo) -> bool:
     return True
 
 
-def enrich_photo_location(session: Session, *, settings: Settings, photo: Photo) -> bool:
+def _active_provider(settings: Settings) -> str | None:
+    """The configured provider if geocoding is enabled and usable, else None."""
     if not settings.geocode_enabled:
-        return False
+        return None
+    provider = (settings.geocode_provider or "").strip().lower()
+    if provider not in {"geonames", "offline"}:
+        return None
+    if provider == "geonames" and not (settings.geocode_geonames_username or "").strip():
+        return None
+    return provider
 
-    if not _should_lookup(photo):
-        return False
 
-    provider = (settings.geocode_provider or "").strip().lower()
-    if provider != "geonames":
-        return False
+def geocode_halted(settings: Settings) -> bool:
+    """True while the GeoNames hourly limit halt is in force for the configured provider."""
+    return _active_provider(settings) == "geonames" and _geonames_is_halted()
 
-    if not (settings.geocode_geonames_username or "").strip():
-        return False
 
-    if _geonames_is_halted():
-        photo.geo_provider = provider
-        photo.geo_lookup_at = utc_now_iso()
-        photo.geo_lookup_status = "error"
-        photo.geo_lookup_error = "RuntimeError: GeoNames hourly limit previously exceeded; temporarily throttled"
-        return True
+@dataclass
+class GeoCell:
+    """Photos that share one reverse-geocode cache cell."""
+
+    cache_key: str
+    lat: float  # coordinates of the first photo, used for the lookup
+    lon: float
+    guids: list[str]
+
+
+def pending_geocode_cells(session: Session, *, settings: Settings, rel_path_prefix: str | None = None) -> list[GeoCell]:
+    """Photos that still need a location, grouped by cache cell, largest cell first.
+
+    Raises RuntimeError if geocoding is disabled or not configured.
+    """
+    provider = _active_provider(settings)
+    if provider is None:
+        raise RuntimeError("geocoding is disabled or not configured (GEOCODE_ENABLED / GEOCODE_PROVIDER)")
+    cell_m = int(settings.geocode_cache_cell_m)
+
+    # SQL form of _should_lookup.
+    q = (
+        select(Photo.guid, Photo.gps_latitude, Photo.gps_longitude)
+        .where(Photo.gps_latitude.is_not(None))
+        .where(Photo.gps_longitude.is_not(None))
+        .where(
+            or_(
+                Photo.geo_lookup_status.is_(None),
+                Photo.geo_lookup_status != "ok",
+                Photo.geo_country.is_(None),
+                Photo.geo_city.is_(None),
+            )
+        )
+    )
+    if rel_path_prefix is not None:
+        q = q.where(Photo.rel_path.like(rel_path_prefix))
+
+    cells: dict[str, GeoCell] = {}
+    for guid, lat, lon in session.execute(q).yield_per(5000):
+        lat = float(lat)
+        lon = float(lon)
+        _, _, lat_bucket, lon_bucket = _snap_to_grid(lat, lon, cell_m)
+        key = _cache_key(provider, cell_m, lat_bucket, lon_bucket)
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = GeoCell(cache_key=key, lat=lat, lon=lon, guids=[str(guid)])
+        else:
+            cell.guids.append(str(guid))
+    return sorted(cells.values(), key=lambda c: len(c.guids), reverse=True)
+
+
+def job_geocode_cache(session: Session, *, settings: Settings) -> GeoCacheLRU | None:
+    """A prewarmed GeoCacheLRU for one job, or None if geocoding is off or unconfigured."""
+    provider = _active_provider(settings)
+    if provider is None:
+        return None
+    cache = GeoCacheLRU(int(settings.geocode_lru_entries))
+    cache.prewarm(session, provider=provider)
+    return cache
+
+
+def resolve_photo_location(
+    session: Session,
+    *,
+    settings: Settings,
+    photo: Photo,
+    cache: GeoCacheLRU | None = None,
+) -> GeoUpdate | None:
+    """Work out the geo columns for `photo` without writing anything.
+
+    Reads the reverse-geocode cache through `cache` if given, else `session`, and
+    calls the provider on a miss (network, throttled). Returns None if there is
+    nothing to change.
+    """
+    if not _should_lookup(photo):
+        return None
+    return resolve_location(
+        session,
+        settings=settings,
+        guid=str(photo.guid),
+        lat=float(photo.gps_latitude),
+        lon=float(photo.gps_longitude),
+        cache=cache,
+    )
+
 
-    lat = float(photo.gps_latitude)
-    lon = float(photo.gps_longitude)
+def resolve_location(
+    session: Session,
+    *,
+    settings: Settings,
+    guid: str,
+    lat: float,
+    lon: float,
+    cache: GeoCacheLRU | None = None,
+) -> GeoUpdate | None:
+    """resolve_photo_location for a bare point; None if geocoding is off or unconfigured."""
+    provider = _active_provider(settings)
+    if provider is None:
+        return None
+    online = provider == "geonames"
+
+    if online and _geonames_is_halted():
+        return GeoUpdate(
+            guid=guid,
+            values=_error_values(
+                provider=provider,
+                cache_key=None,
+                now=utc_now_iso(),
+                status="error",
+                error="RuntimeError: GeoNames hourly limit previously exceeded; temporarily throttled",
+            ),
+        )
 
     _, _, lat_bucket, lon_bucket = _snap_to_grid(lat, lon, int(settings.geocode_cache_cell_m))
     cache_key = _cache_key(provider, int(settings.geocode_cache_cell_m), lat_bucket, lon_bucket)
     now = utc_now_iso()
 
-    cached = session.get(ReverseGeocodeCache, cache_key)
+    cached: ReverseGeocodeCache | CacheEntry | None
+    if cache is not None:
+        cached = cache.get(session, cache_key)
+    else:
+        cached = session.get(ReverseGeocodeCache, cache_key)
+    prev_errors = 0
     if cached is not None:
-        _apply_cached_to_photo(photo, cached, provider=provider, cache_key=cache_key, now=now)
-        cached.last_used_at = now
-        cached.hit_count = int(cached.hit_count or 0) + 1
-        return True
+        if cache is not None:
+            cache.record_hit(cache_key, now)
+        cached_status = cached.status or "ok"
+        if cached_status == "ok":
+            return GeoUpdate(
+                guid=guid,
+                values=_cached_values(cached, provider=provider, cache_key=cache_key, now=now),
+                cache_key=cache_key,
+                cache_hit=cache is None,
+            )
+        if _not_yet(cached.retry_after):
+            # Negative entry: the whole cell is known to miss (or to be failing
+            # right now), so don't ask the provider again for every photo in it.
+            return GeoUpdate(
+                guid=guid,
+                values=_error_values(
+                    provider=provider,
+                    cache_key=cache_key,
+                    now=now,
+                    status=cached_status,
+                    error=cached.last_error if cached_status == "error" else None,
+                ),
+                cache_key=cache_key,
+                cache_hit=cache is None,
+            )
+        if cached_status == "error":
+            prev_errors = int(cached.error_count or 0)
+
+    parent = _parent_cell(settings, provider=provider, lat=lat, lon=lon)
+    parent_entry: ReverseGeocodeCache | CacheEntry | None = None
+    if parent is not None:
+        if cache is not None:
+            parent_entry = cache.get(session, parent[0])
+        else:
+            parent_entry = session.get(ReverseGeocodeCache, parent[0])
+
+    def _cache_row(status: str, **fields: Any) -> dict[str, Any]:
+        row: dict[str, Any] = {
+            "cache_key": cache_key,
+            "provider": provider,
+            "cell_m": int(settings.geocode_cache_cell_m),
+            "lat_bucket": float(lat_bucket),
+            "lon_bucket": float(lon_bucket),
+            "country_code": None,
+            "country": None,
+            "city": None,
+            "city_norm": None,
+            "region": None,
+            "postcode": None,
+            "display_name": None,
+            "raw_json": None,
+            "fetched_at": now,
+            "last_used_at": now,
+            "hit_count": 1,
+            "status": status,
+            "retry_after": None,
+            "error_count": None,
+            "last_error": None,
+        }
+        row.update(fields)
+        if cache is not None:
+            cache.put(cache_key, CacheEntry.from_mapping(row))
+        return row
+
+    if cached is None and _parent_answers(parent_entry, settings=settings, lat=lat, lon=lon):
+        # Never looked up here, but the surrounding parent cell reliably resolves
+        # to one place near this point: take it, and give the fine cell its own
+        # row so the next photo in it is a plain hit. Not a vote for the parent.
+        if cache is not None:
+            cache.record_hit(parent[0], now)
+            cache.record_parent_save()
+        return GeoUpdate(
+            guid=guid,
+            values=_cached_values(parent_entry, provider=provider, cache_key=cache_key, now=now),
+            cache_key=cache_key,
+            cache_row=_cache_row(
+                "ok",
+                **{
+                    name: getattr(parent_entry, name)
+                    for name in (
+                        "country_code",
+                        "country",
+                        "city",
+                        "city_norm",
+                        "region",
+                        "postcode",
+                        "display_name",
+                        "place_lat",
+                        "place_lon",
+                    )
+                },
+            ),
+            parent_hit=True,
+        )
+
+    def _failed(detail: str, *, cache: bool = True) -> GeoUpdate:
+        cache_row = None
+        if cache:
+            n = prev_errors + 1
+            cache_row = _cache_row(
+                "error",
+                retry_after=_iso_in(_error_backoff_s(settings, n)),
+                error_count=n,
+                last_error=detail,
+            )
+        return GeoUpdate(
+            guid=guid,
+            values=_error_values(provider=provider, cache_key=cache_key, now=now, status="error", error=detail),
+            cache_key=cache_key,
+            cache_row=cache_row,
+            looked_up=True,
+        )
 
     try:
-        _apply_geonames_throttle(settings)
+        # GeoNames requests are rate limited inside the client (token bucket).
         result = _lookup_provider_data(settings, lat=lat, lon=lon)
     except HTTPError as e:
         detail = f"HTTPError: HTTP {getattr(e, 'code', '')}"
@@ -295,59 +590,136 @@ def enrich_photo_location(session: Session, *, settings: Settings, photo: Photo)
                 "HTTPError: GeoNames rejected the request (401/403). "
                 "Check GEOCODE_GEONAMES_USERNAME and confirm webservice is enabled on the GeoNames account."
             )
-        photo.geo_provider = provider
-        photo.geo_cache_key = cache_key
-        photo.geo_lookup_at = now
-        photo.geo_lookup_status = "error"
-        photo.geo_lookup_error = detail
-        logger.warning("reverse geocode failed guid=%s err=%s", getattr(photo, "guid", ""), detail)
-        return True
+        logger.warning("reverse geocode failed guid=%s err=%s", guid, detail)
+        return _failed(detail)
     except (URLError, TimeoutError, RuntimeError) as e:
-        if _is_geonames_hourly_limit_error(e):
+        hourly_limit = _is_geonames_hourly_limit_error(e)
+        if hourly_limit:
+            # Account-wide, not about this cell: the global halt covers it.
             _mark_geonames_hourly_limit_hit(settings)
-        photo.geo_provider = provider
-        photo.geo_cache_key = cache_key
-        photo.geo_lookup_at = now
-        photo.geo_lookup_status = "error"
-        photo.geo_lookup_error = f"{type(e).__name__}: {e}"
-        logger.warning("reverse geocode failed guid=%s err=%s", getattr(photo, "guid", ""), e)
-        return True
+        logger.warning("reverse geocode failed guid=%s err=%s", guid, e)
+        return _failed(f"{type(e).__name__}: {e}", cache=not hourly_limit)
     except Exception as e:
-        photo.geo_provider = provider
-        photo.geo_cache_key = cache_key
-        photo.geo_lookup_at = now
-        photo.geo_lookup_status = "error"
-        photo.geo_lookup_error = f"{type(e).__name__}: {e}"
-        logger.exception("reverse geocode crashed guid=%s", getattr(photo, "guid", ""))
-        return True
+        logger.exception("reverse geocode crashed guid=%s", guid)
+        return _failed(f"{type(e).__name__}: {e}")
 
     if result is None:
-        photo.geo_provider = provider
-        photo.geo_cache_key = cache_key
-        photo.geo_lookup_at = now
-        photo.geo_lookup_status = "miss"
-        photo.geo_lookup_error = None
-        return True
+        return GeoUpdate(
+            guid=guid,
+            values=_error_values(provider=provider, cache_key=cache_key, now=now, status="miss", error=None),
+            cache_key=cache_key,
+            cache_row=_cache_row(
+                "miss", retry_after=_iso_in(max(0.0, float(settings.geocode_miss_ttl_days)) * 86400.0)
+            ),
+            looked_up=True,
+        )
 
-    _apply_result_to_photo(photo, result, provider=provider, cache_key=cache_key, now=now)
+    values = _result_values(result, provider=provider, cache_key=cache_key, now=now)
+    cache_row = _cache_row(
+        "ok",
+        country_code=values["geo_country_code"],
+        country=values["geo_country"],
+        city=values["geo_city"],
+        city_norm=values["geo_city_norm"],
+        region=values["geo_region"],
+        postcode=values["geo_postcode"],
+        display_name=values["geo_display_name"],
+        place_lat=_float_or_none(result.get("place_lat")),
+        place_lon=_float_or_none(result.get("place_lon")),
+        raw_json=result.get("raw_json"),
+    )
 
-    cache_row = ReverseGeocodeCache(
+    parent_row = None
+    if parent is not None and cache_row["place_lat"] is not None and cache_row["place_lon"] is not None:
+        parent_key, parent_m, parent_lat_bucket, parent_lon_bucket = parent
+        parent_row = {
+            **cache_row,
+            "cache_key": parent_key,
+            "cell_m": parent_m,
+            "lat_bucket": float(parent_lat_bucket),
+            "lon_bucket": float(parent_lon_bucket),
+            "raw_json": None,
+            "hit_count": 0,
+            "place_votes": 1,
+        }
+        if cache is not None:
+            # Mirror of the vote upsert in _write_cache_update.
+            if parent_entry is None:
+                voted = CacheEntry.from_mapping(parent_row)
+            elif _same_place(parent_entry, parent_row):
+                voted = replace(parent_entry, place_votes=int(parent_entry.place_votes or 0) + 1)
+            else:
+                voted = replace(parent_entry, status="mixed")
+            cache.put(parent_key, voted)
+    return GeoUpdate(
+        guid=guid,
+        values=values,
         cache_key=cache_key,
-        provider=provider,
-        cell_m=int(settings.geocode_cache_cell_m),
-        lat_bucket=float(lat_bucket),
-        lon_bucket=float(lon_bucket),
-        country_code=photo.geo_country_code,
-        country=photo.geo_country,
-        city=photo.geo_city,
-        city_norm=photo.geo_city_norm,
-        region=photo.geo_region,
-        postcode=photo.geo_postcode,
-        display_name=photo.geo_display_name,
-        raw_json=result.get("raw_json"),
-        fetched_at=now,
-        last_used_at=now,
-        hit_count=1,
+        cache_row=cache_row,
+        parent_row=parent_row,
+        looked_up=True,
     )
-    session.add(cache_row)
-    return True
+
+
+def _write_cache_update(session: Session, update: GeoUpdate) -> None:
+    if update.cache_row is not None:
+        # Replaces an expired negative entry (or a concurrent identical result).
+        stmt = insert(ReverseGeocodeCache).values(**update.cache_row)
+        updates = {k: stmt.excluded[k] for k in update.cache_row if k not in ("cache_key", "hit_count")}
+        updates["hit_count"] = func.coalesce(ReverseGeocodeCache.hit_count, 0) + 1
+        session.execute(stmt.on_conflict_do_update(index_elements=[ReverseGeocodeCache.cache_key], set_=updates))
+    elif update.cache_hit and update.cache_key is not None:
+        session.execute(
+            sa_update(ReverseGeocodeCache)
+            .where(ReverseGeocodeCache.cache_key == update.cache_key)
+            .values(
+                last_used_at=update.values.get("geo_lookup_at"),
+                hit_count=func.coalesce(ReverseGeocodeCache.hit_count, 0) + 1,
+            )
+        )
+    if update.parent_row is not None:
+        _write_parent_vote(session, update.parent_row)
+
+
+def _write_parent_vote(session: Session, row: dict[str, Any]) -> None:
+    # First vote inserts the parent; later ones add a vote if they name the same
+    # place and otherwise mark the parent mixed (never used to answer).
+    stmt = insert(ReverseGeocodeCache).values(**row)
+    ex = stmt.excluded
+    same = and_(
+        ReverseGeocodeCache.country_code.is_not_distinct_from(ex.country_code),
+        ReverseGeocodeCache.city_norm.is_not_distinct_from(ex.city_norm),
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ReverseGeocodeCache.cache_key],
+            set_={
+                "place_votes": case(
+                    (same, func.coalesce(ReverseGeocodeCache.place_votes, 0) + 1),
+                    else_=ReverseGeocodeCache.place_votes,
+                ),
+                "status": case((same, ReverseGeocodeCache.status), else_="mixed"),
+                "last_used_at": ex.last_used_at,
+            },
+        )
+    )
+
+
+def apply_geo_update(session: Session, update: GeoUpdate) -> None:
+    """Write a resolved GeoUpdate (use as a DbWriter op)."""
+    session.execute(sa_update(Photo).where(Photo.guid == update.guid).values(**update.values))
+    _write_cache_update(session, update)
+
+
+# Guids per UPDATE ... WHERE guid IN (...), under SQLite's default bound-parameter
+# limit on older builds (999).
+_BULK_UPDATE_GUIDS = 900
+
+
+def apply_cell_update(session: Session, update: GeoUpdate, guids: list[str]) -> None:
+    """Write one cell's GeoUpdate to every photo in it (use as a DbWriter op)."""
+    for i in range(0, len(guids), _BULK_UPDATE_GUIDS):
+        chunk = guids[i : i + _BULK_UPDATE_GUIDS]
+        session.execute(sa_update(Photo).where(Photo.guid.in_(chunk)).values(**update.values))
+    _write_cache_update(session, update)
+
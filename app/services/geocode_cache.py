@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, fields
+from typing import Any, Mapping
+
+from sqlalchemy import bindparam, func, select, update as sa_update
+from sqlalchemy.orm import Session
+
+from ..core.models import ReverseGeocodeCache
+from ..core.writer import DbWriter
+
+
+@dataclass(frozen=True, slots=True)
+class CacheEntry:
+    """The columns of a ReverseGeocodeCache row that resolving a photo reads."""
+
+    country_code: str | None
+    country: str | None
+    city: str | None
+    city_norm: str | None
+    region: str | None
+    postcode: str | None
+    display_name: str | None
+    status: str | None
+    retry_after: str | None
+    error_count: int | None
+    last_error: str | None
+    place_lat: float | None
+    place_lon: float | None
+    place_votes: int | None
+
+    @classmethod
+    def from_mapping(cls, row: Mapping[str, Any]) -> CacheEntry:
+        return cls(**{name: row.get(name) for name in _ENTRY_FIELDS})
+
+
+_ENTRY_FIELDS = tuple(f.name for f in fields(CacheEntry))
+_ENTRY_COLUMNS = tuple(getattr(ReverseGeocodeCache, name) for name in _ENTRY_FIELDS)
+
+_table = ReverseGeocodeCache.__table__
+# executemany: one statement for every cell hit since the last flush.
+_BUMP_HITS = (
+    sa_update(_table)
+    .where(_table.c.cache_key == bindparam("b_key"))
+    .values(
+        hit_count=func.coalesce(_table.c.hit_count, 0) + bindparam("b_hits"),
+        last_used_at=bindparam("b_used_at"),
+    )
+)
+
+
+def apply_cache_hits(session: Session, hits: list[dict[str, Any]]) -> None:
+    """Add accumulated hit counts to their cache rows (use as a DbWriter op)."""
+    if hits:
+        session.execute(_BUMP_HITS, hits)
+
+
+class GeoCacheLRU:
+    """In-memory LRU of reverse-geocode cache entries for one job.
+
+    Entries are read from the table on a miss (or bulk-loaded by prewarm) and
+    kept by cache key. Hits are counted here and written back in one batch per
+    flush instead of dirtying the row on every photo. Each job owns its own
+    instance; it may be shared by that job's lookup threads.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._pending: dict[str, list] = {}  # cache_key -> [hits, last_used_at]
+        self._hits = 0
+        self._misses = 0
+        self._prewarmed = 0
+        self._parent_saves = 0
+        self._lock = threading.Lock()
+
+    def prewarm(self, session: Session, *, provider: str) -> int:
+        """Load the most recently used entries for `provider` in one query."""
+        rows = session.execute(
+            select(ReverseGeocodeCache.cache_key, *_ENTRY_COLUMNS)
+            .where(ReverseGeocodeCache.provider == provider)
+            .order_by(ReverseGeocodeCache.last_used_at.desc())
+            .limit(self.max_entries)
+        ).mappings().all()
+        # Oldest first, so the most recently used end up last (evicted last).
+        for row in reversed(rows):
+            self.put(row["cache_key"], CacheEntry.from_mapping(row))
+        self._prewarmed = len(rows)
+        return len(rows)
+
+    def get(self, session: Session, cache_key: str) -> CacheEntry | None:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                self._hits += 1
+                return entry
+            self._misses += 1
+        row = (
+            session.execute(select(*_ENTRY_COLUMNS).where(ReverseGeocodeCache.cache_key == cache_key))
+            .mappings()
+            .first()
+        )
+        if row is None:
+            return None
+        entry = CacheEntry.from_mapping(row)
+        self.put(cache_key, entry)
+        return entry
+
+    def put(self, cache_key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_hit(self, cache_key: str, used_at: str) -> None:
+        with self._lock:
+            pending = self._pending.get(cache_key)
+            if pending is None:
+                self._pending[cache_key] = [1, used_at]
+            else:
+                pending[0] += 1
+                pending[1] = used_at
+
+    def record_parent_save(self) -> None:
+        """Count a photo answered from its parent cell instead of the provider."""
+        with self._lock:
+            self._parent_saves += 1
+
+    def flush(self, writer: DbWriter) -> Future | None:
+        """Queue the accumulated hit counts on the db writer (None if there are none)."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return None
+        hits = [{"b_key": k, "b_hits": n, "b_used_at": at} for k, (n, at) in pending.items()]
+        return writer.submit(lambda session: apply_cache_hits(session, hits))
+
+    def stats(self) -> dict[str, float | int]:
+        with self._lock:
+            hits, misses, entries = self._hits, self._misses, len(self._entries)
+            parent_saves = self._parent_saves
+        lookups = hits + misses
+        return {
+            "entries": entries,
+            "prewarmed": self._prewarmed,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+            "parent_saves": parent_saves,
+        }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (
+            f"geo_cache hit_ratio={s['hit_ratio']} hits={s['hits']} misses={s['misses']} "
+            f"prewarmed={s['prewarmed']} parent_saves={s['parent_saves']}"
+        )
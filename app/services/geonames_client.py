@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import http.client
+import json
+import math
+import ssl
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
+
+try:
+    import certifi  # type: ignore
+except Exception:
+    certifi = None
+
+
+_HOUR_S = 3600.0
+
+
+class TokenBucket:
+    """Requests per second with bursts up to `burst`, plus a rolling hourly cap.
+
+    acquire() reserves a token and sleeps outside the lock until it is due, so
+    concurrent callers queue up fairly instead of contending on one lock. Past
+    the hourly cap it raises instead of waiting (the caller halts lookups).
+    """
+
+    def __init__(self, *, rate_per_s: float, burst: int, hourly_limit: int) -> None:
+        self.rate_per_s = max(0.0, float(rate_per_s))
+        self.burst = max(1, int(burst))
+        self.hourly_limit = max(0, int(hourly_limit))
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._window: deque[float] = deque()  # start times of requests in the last hour
+
+    def acquire(self) -> float:
+        """Take one token; returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            if self.hourly_limit:
+                while self._window and self._window[0] <= now - _HOUR_S:
+                    self._window.popleft()
+                if len(self._window) >= self.hourly_limit:
+                    raise RuntimeError(
+                        f"GeoNames hourly limit reached locally ({self.hourly_limit} requests in the last hour)"
+                    )
+            wait_s = 0.0
+            if self.rate_per_s > 0:
+                self._tokens = min(float(self.burst), self._tokens + (now - self._last) * self.rate_per_s)
+                self._last = now
+                self._tokens -= 1.0
+                if self._tokens < 0:
+                    wait_s = -self._tokens / self.rate_per_s
+            if self.hourly_limit:
+                self._window.append(now + wait_s)
+        if wait_s > 0:
+            time.sleep(wait_s)
+        return wait_s
+
+    def used_this_hour(self) -> int:
+        with self._lock:
+            cutoff = time.monotonic() - _HOUR_S
+            return sum(1 for t in self._window if t > cutoff)
+
+
+def _ssl_context() -> ssl.SSLContext:
+    if certifi is not None:
+        return ssl.create_default_context(cafile=certifi.where())
+    return ssl.create_default_context()
+
+
+class GeoNamesClient:
+    """GeoNames web service client over a small pool of keep-alive connections.
+
+    Each request takes a token from the bucket first. A request on a reused
+    connection that the server has meanwhile closed is retried once on a new
+    one. Failures surface like urlopen's: HTTPError for HTTP status >= 400,
+    URLError for network/TLS errors, TimeoutError for timeouts.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        timeout_s: float,
+        max_connections: int,
+        rate_per_s: float,
+        hourly_limit: int,
+    ) -> None:
+        parts = urlsplit(base_url.rstrip("/"))
+        if parts.scheme not in {"http", "https"} or not parts.hostname:
+            raise ValueError(f"unsupported GeoNames URL: {base_url}")
+        self.base_url = base_url.rstrip("/")
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._base_path = parts.path
+        self._timeout_s = max(1.0, float(timeout_s))
+        self._ssl = _ssl_context() if self._https else None
+        self.max_connections = max(1, int(max_connections))
+        self.bucket = TokenBucket(rate_per_s=rate_per_s, burst=self.max_connections, hourly_limit=hourly_limit)
+
+        self._lock = threading.Lock()
+        self._idle: list[http.client.HTTPConnection] = []
+        self._in_flight = 0
+        self._requests = 0
+        self._errors = 0
+        self._stale_retries = 0
+        self._connections_opened = 0
+        self._throttle_wait_s = 0.0
+        self._latency_ms: deque[float] = deque(maxlen=1024)
+
+    def _checkout(self) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            self._in_flight += 1
+            if self._idle:
+                return self._idle.pop(), True
+            self._connections_opened += 1
+        if self._https:
+            conn: http.client.HTTPConnection = http.client.HTTPSConnection(
+                self._host, self._port, timeout=self._timeout_s, context=self._ssl
+            )
+        else:
+            conn = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout_s)
+        return conn, False
+
+    def _checkin(self, conn: http.client.HTTPConnection, *, keep: bool) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if keep and len(self._idle) < self.max_connections:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def get_json(self, path: str, params: dict[str, str]) -> Any:
+        waited = self.bucket.acquire()
+        target = f"{self._base_path}{path}?{urlencode(params)}"
+        t0 = time.perf_counter()
+        for attempt in (0, 1):
+            conn, reused = self._checkout()
+            try:
+                conn.request("GET", target, headers={"Accept": "application/json"})
+                resp = conn.getresponse()
+                body = resp.read()
+            except (ConnectionResetError, BrokenPipeError, http.client.BadStatusLine) as e:
+                self._checkin(conn, keep=False)
+                if reused and attempt == 0:
+                    with self._lock:
+                        self._stale_retries += 1
+                    continue
+                self._record(t0, waited, ok=False)
+                raise URLError(e) from e
+            except TimeoutError:
+                self._checkin(conn, keep=False)
+                self._record(t0, waited, ok=False)
+                raise
+            except (OSError, http.client.HTTPException) as e:
+                self._checkin(conn, keep=False)
+                self._record(t0, waited, ok=False)
+                raise URLError(e) from e
+
+            self._checkin(conn, keep=not resp.will_close)
+            if resp.status >= 400:
+                self._record(t0, waited, ok=False)
+                raise HTTPError(f"{self.base_url}{path}", resp.status, resp.reason, resp.headers, None)
+            self._record(t0, waited, ok=True)
+            return json.loads(body.decode("utf-8"))
+        raise AssertionError("unreachable")
+
+    def _record(self, t0: float, waited_s: float, *, ok: bool) -> None:
+        with self._lock:
+            self._requests += 1
+            if not ok:
+                self._errors += 1
+            self._throttle_wait_s += waited_s
+            self._latency_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> dict[str, float | int]:
+        with self._lock:
+            samples = sorted(self._latency_ms)
+            out: dict[str, float | int] = {
+                "requests": self._requests,
+                "errors": self._errors,
+                "in_flight": self._in_flight,
+                "idle_connections": len(self._idle),
+                "connections_opened": self._connections_opened,
+                "stale_retries": self._stale_retries,
+                "throttle_wait_s": round(self._throttle_wait_s, 2),
+            }
+        out["quota_used_this_hour"] = self.bucket.used_this_hour()
+        if samples:
+            out["latency_ms_p50"] = round(statistics.median(samples), 1)
+            out["latency_ms_p95"] = round(samples[max(0, math.ceil(len(samples) * 0.95) - 1)], 1)
+            out["latency_ms_max"] = round(samples[-1], 1)
+        return out
+
+
+_CLIENT: GeoNamesClient | None = None
+_CLIENT_KEY: tuple | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def geonames_client(
+    base_url: str,
+    *,
+    timeout_s: float,
+    max_connections: int,
+    rate_per_s: float,
+    hourly_limit: int,
+) -> GeoNamesClient:
+    """Process-wide client (one connection pool and rate limit); rebuilt if the settings change."""
+    global _CLIENT, _CLIENT_KEY
+    key = (base_url, float(timeout_s), int(max_connections), float(rate_per_s), int(hourly_limit))
+    with _CLIENT_LOCK:
+        if _CLIENT is None or _CLIENT_KEY != key:
+            if _CLIENT is not None:
+                _CLIENT.close()
+            _CLIENT = GeoNamesClient(
+                base_url,
+                timeout_s=timeout_s,
+                max_connections=max_connections,
+                rate_per_s=rate_per_s,
+                hourly_limit=hourly_limit,
+            )
+            _CLIENT_KEY = key
+        return _CLIENT
+
+
+def geonames_client_stats() -> dict[str, float | int] | None:
+    """Stats of the process-wide client, or None before the first lookup."""
+    with _CLIENT_LOCK:
+        client = _CLIENT
+    return client.stats() if client is not None else None
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import io
+import logging
+import math
+import threading
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+
+logger = logging.getLogger(__name__)
+
+
+# Place dumps from https://download.geonames.org/export/dump/, densest first;
+# either the .txt or the .zip as downloaded.
+CITY_DUMPS = ("cities500", "cities1000", "cities5000", "cities15000")
+ADMIN1_DUMP = "admin1CodesASCII.txt"
+COUNTRY_DUMP = "countryInfo.txt"
+
+# Grid cell size in degrees. Small enough that a 20 km search touches a handful
+# of cells, big enough that the grid stays a few hundred thousand entries.
+_CELL_DEG = 0.25
+_EARTH_KM = 6371.0088
+
+
+@dataclass(frozen=True, slots=True)
+class Place:
+    geonameid: int
+    name: str
+    lat: float
+    lon: float
+    country_code: str
+    admin1_code: str
+    population: int
+
+
+def _open_text(path: Path) -> Iterator[str]:
+    if path.suffix == ".zip":
+        with zipfile.ZipFile(path) as zf:
+            member = next((n for n in zf.namelist() if n.endswith(".txt")), None)
+            if member is None:
+                raise RuntimeError(f"{path.name} has no .txt member")
+            with zf.open(member) as fh:
+                yield from io.TextIOWrapper(fh, encoding="utf-8")
+        return
+    with path.open(encoding="utf-8") as fh:
+        yield from fh
+
+
+def _find_cities_dump(data_dir: Path) -> Path | None:
+    for stem in CITY_DUMPS:
+        for suffix in (".txt", ".zip"):
+            p = data_dir / f"{stem}{suffix}"
+            if p.is_file():
+                return p
+    return None
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * _EARTH_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _cell(lat: float, lon: float) -> tuple[int, int]:
+    return int(math.floor(lat / _CELL_DEG)), int(math.floor(lon / _CELL_DEG))
+
+
+_LON_CELLS = int(round(360 / _CELL_DEG))
+
+
+class OfflineGeocoder:
+    """Nearest populated place from a local GeoNames dump, via a fixed lat/lon grid."""
+
+    def __init__(self, places: list[Place], *, admin1: dict[str, str], countries: dict[str, str]) -> None:
+        self.places = places
+        self.admin1 = admin1
+        self.countries = countries
+        self._grid: dict[tuple[int, int], list[Place]] = {}
+        for p in places:
+            self._grid.setdefault(_cell(p.lat, p.lon), []).append(p)
+
+    @classmethod
+    def load(cls, data_dir: Path) -> OfflineGeocoder:
+        cities = _find_cities_dump(data_dir)
+        if cities is None:
+            raise RuntimeError(
+                f"no GeoNames place dump in {data_dir} (expected one of "
+                + ", ".join(f"{s}.txt/.zip" for s in CITY_DUMPS)
+                + ")"
+            )
+        places: list[Place] = []
+        for line in _open_text(cities):
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15:
+                continue
+            try:
+                places.append(
+                    Place(
+                        geonameid=int(cols[0]),
+                        name=cols[1],
+                        lat=float(cols[4]),
+                        lon=float(cols[5]),
+                        country_code=cols[8],
+                        admin1_code=cols[10],
+                        population=int(cols[14] or 0),
+                    )
+                )
+            except ValueError:
+                continue
+
+        admin1: dict[str, str] = {}
+        admin1_path = data_dir / ADMIN1_DUMP
+        if admin1_path.is_file():
+            for line in _open_text(admin1_path):
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) >= 2:
+                    admin1[cols[0]] = cols[1]
+
+        countries: dict[str, str] = {}
+        country_path = data_dir / COUNTRY_DUMP
+        if country_path.is_file():
+            for line in _open_text(country_path):
+                if line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) >= 5:
+                    countries[cols[0]] = cols[4]
+
+        logger.info(
+            "offline geocoder loaded places=%s admin1=%s countries=%s from %s",
+            len(places),
+            len(admin1),
+            len(countries),
+            cities.name,
+        )
+        return cls(places, admin1=admin1, countries=countries)
+
+    def nearest(self, lat: float, lon: float, *, max_km: float) -> tuple[Place, float] | None:
+        """The closest place within `max_km` and its distance, or None."""
+        lat_span = max_km / 111.32
+        cos_lat = max(0.01, math.cos(math.radians(min(89.9, abs(lat)))))
+        lon_span = min(180.0, max_km / (111.32 * cos_lat))
+        i0, j0 = _cell(max(-90.0, lat - lat_span), lon - lon_span)
+        i1, j1 = _cell(min(90.0, lat + lat_span), lon + lon_span)
+
+        # Rank by squared equirectangular distance (in degrees of latitude), which
+        # orders places the same as great-circle distance at these ranges.
+        grid = self._grid
+        best: Place | None = None
+        best_d2 = (max_km / 111.32) ** 2
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                jj = (j + _LON_CELLS // 2) % _LON_CELLS - _LON_CELLS // 2
+                for p in grid.get((i, jj), ()):
+                    dy = p.lat - lat
+                    dx = ((p.lon - lon + 540.0) % 360.0 - 180.0) * cos_lat
+                    d2 = dx * dx + dy * dy
+                    if d2 <= best_d2:
+                        best, best_d2 = p, d2
+        if best is None:
+            return None
+        distance_km = _haversine_km(lat, lon, best.lat, best.lon)
+        return (best, distance_km) if distance_km <= max_km else None
+
+    def describe(self, place: Place) -> tuple[str | None, str | None]:
+        """(region, country) names for a place; missing files leave them None/code."""
+        region = self.admin1.get(f"{place.country_code}.{place.admin1_code}")
+        country = self.countries.get(place.country_code) or place.country_code or None
+        return region, country
+
+
+_LOADED: dict[str, OfflineGeocoder] = {}
+_LOAD_LOCK = threading.Lock()
+
+
+def offline_geocoder(data_dir: Path) -> OfflineGeocoder:
+    """Process-wide index for `data_dir`, loaded on first use (about a second for cities1000)."""
+    key = str(data_dir.expanduser().resolve())
+    geocoder = _LOADED.get(key)
+    if geocoder is not None:
+        return geocoder
+    with _LOAD_LOCK:
+        geocoder = _LOADED.get(key)
+        if geocoder is None:
+            geocoder = OfflineGeocoder.load(Path(key))
+            _LOADED[key] = geocoder
+    return geocoder
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from ..core.config import Settings
+from ..core.db import pinned_mid_guids, sessionmaker_for
+from .derivatives import ensure_derivatives, mid_path
+
+
+logger = logging.getLogger(__name__)
+
+
+# Access times are recorded by stamping the mid's atime (mtime is left alone, it
+# drives regeneration). Re-stamping on every hit would add a metadata write per
+# request; an hour of resolution is plenty for LRU ordering.
+_TOUCH_RESOLUTION_NS = 3600 * 1_000_000_000
+
+# Evict down to this fraction of the budget so we don't evict on every new mid.
+_LOW_WATER = 0.9
+
+# Minimum spacing between background evictions triggered from the web path.
+_BACKGROUND_EVICT_INTERVAL_S = 300.0
+
+# A regenerated mid is kept out of eviction this long, so the request that
+# rebuilt it can still serve it.
+_REGEN_PIN_S = 60.0
+
+_REGEN_LOCKS: dict[str, threading.Lock] = {}
+_REGEN_PINNED: dict[str, float] = {}
+_REGEN_LOCKS_GUARD = threading.Lock()
+_EVICT_LOCK = threading.Lock()
+_LAST_BACKGROUND_EVICT_AT_S = 0.0
+
+
+@dataclass(frozen=True)
+class EvictionResult:
+    scanned: int
+    total_bytes: int
+    evicted: int
+    freed_bytes: int
+
+
+def touch_mid(path: Path) -> None:
+    try:
+        st = path.stat()
+        now_ns = time.time_ns()
+        if now_ns - st.st_atime_ns < _TOUCH_RESOLUTION_NS:
+            return
+        os.utime(path, ns=(now_ns, st.st_mtime_ns))
+    except OSError:
+        pass
+
+
+def _iter_mids(deriv_root: Path):
+    for dirpath, _dirs, files in os.walk(deriv_root / "mid"):
+        for name in files:
+            if not name.endswith(".webp"):
+                continue
+            p = Path(dirpath) / name
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            yield p, name[: -len(".webp")], int(st.st_size), int(st.st_atime_ns)
+
+
+def enforce_mid_budget(deriv_root: Path, *, budget_bytes: int, pinned: set[str]) -> EvictionResult:
+    """Delete least-recently-used, unpinned mids until the mid tree fits the budget."""
+    pinned = pinned | _regen_pinned()
+    with _EVICT_LOCK:
+        entries = list(_iter_mids(deriv_root))
+        total = sum(e[2] for e in entries)
+        evicted = 0
+        freed = 0
+        if budget_bytes > 0 and total > budget_bytes:
+            target = int(budget_bytes * _LOW_WATER)
+            candidates = sorted((e for e in entries if e[1] not in pinned), key=lambda e: e[3])
+            for p, guid, size, _atime in candidates:
+                if total - freed <= target:
+                    break
+                if guid in _REGEN_PINNED:  # regenerated since the scan started
+                    continue
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    continue
+                evicted += 1
+                freed += size
+        return EvictionResult(scanned=len(entries), total_bytes=total, evicted=evicted, freed_bytes=freed)
+
+
+def enforce_mid_budget_for(settings: Settings) -> EvictionResult | None:
+    budget = settings.mid_cache_budget_bytes()
+    if budget <= 0:
+        return None
+    SessionLocal = sessionmaker_for(settings.db_path)
+    with SessionLocal() as session:
+        pinned = pinned_mid_guids(session)
+    res = enforce_mid_budget(settings.deriv_root, budget_bytes=budget, pinned=pinned)
+    if res.evicted:
+        logger.info(
+            "mid cache evicted=%d freed_mb=%.1f total_mb=%.1f budget_mb=%d pinned=%d",
+            res.evicted,
+            res.freed_bytes / 1e6,
+            (res.total_bytes - res.freed_bytes) / 1e6,
+            int(settings.mid_cache_budget_mb),
+            len(pinned),
+        )
+    return res
+
+
+def _evict_in_background(settings: Settings) -> None:
+    global _LAST_BACKGROUND_EVICT_AT_S
+    now = time.monotonic()
+    with _REGEN_LOCKS_GUARD:
+        if now - _LAST_BACKGROUND_EVICT_AT_S < _BACKGROUND_EVICT_INTERVAL_S:
+            return
+        _LAST_BACKGROUND_EVICT_AT_S = now
+
+    def _run() -> None:
+        try:
+            enforce_mid_budget_for(settings)
+        except Exception:
+            logger.exception("mid cache eviction failed")
+
+    threading.Thread(target=_run, daemon=True).start()
+
+
+def _regen_lock(guid: str) -> threading.Lock:
+    with _REGEN_LOCKS_GUARD:
+        lock = _REGEN_LOCKS.get(guid)
+        if lock is None:
+            lock = _REGEN_LOCKS[guid] = threading.Lock()
+        return lock
+
+
+def _regen_pinned() -> set[str]:
+    now = time.monotonic()
+    with _REGEN_LOCKS_GUARD:
+        for guid in [g for g, until in _REGEN_PINNED.items() if until <= now]:
+            del _REGEN_PINNED[guid]
+        return set(_REGEN_PINNED)
+
+
+def regenerate_mid(settings: Settings, *, guid: str, source_path: Path) -> Path | None:
+    """Recreate an evicted mid on request. Concurrent requests for one guid decode once."""
+    mpath = mid_path(settings.deriv_root, guid)
+    lock = _regen_lock(guid)
+    try:
+        with lock:
+            if not mpath.exists():
+                try:
+                    source_mtime: int | None = int(source_path.stat().st_mtime)
+                except Exception:
+                    source_mtime = None
+                ensure_derivatives(
+                    source_path=source_path,
+                    deriv_root=settings.deriv_root,
+                    guid=guid,
+                    source_mtime=source_mtime,
+                    thumb_max=settings.thumb_max,
+                    mid_max=settings.mid_max,
+                    thumb_quality=settings.thumb_quality,
+                    mid_quality=settings.mid_quality,
+                    sizes=settings.deriv_sizes_list(),
+                    size_quality=settings.deriv_size_quality,
+                    decode_budget_bytes=settings.decode_budget_bytes(),
+                    reduce_over_pixels=settings.decode_reduce_over_pixels(),
+                )
+            with _REGEN_LOCKS_GUARD:
+                _REGEN_PINNED[guid] = time.monotonic() + _REGEN_PIN_S
+    finally:
+        with _REGEN_LOCKS_GUARD:
+            # A waiter must not drop a lock a newer request has since created and taken.
+            if _REGEN_LOCKS.get(guid) is lock:
+                del _REGEN_LOCKS[guid]
+
+    _evict_in_background(settings)
+    return mpath if mpath.exists() else None
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image
+
+from .derivatives import thumb_path
+
+
+@dataclass(frozen=True)
+class SpriteSheet:
+    key: str
+    path: Path
+    width: int
+    height: int
+    # guid -> (x, y, w, h) inside the atlas
+    tiles: dict[str, tuple[int, int, int, int]]
+
+
+def sprite_dir(deriv_root: Path) -> Path:
+    return deriv_root / "sprite"
+
+
+def sprite_path(deriv_root: Path, key: str) -> Path:
+    return sprite_dir(deriv_root) / f"{key}.webp"
+
+
+def _map_path(deriv_root: Path, key: str) -> Path:
+    return sprite_dir(deriv_root) / f"{key}.json"
+
+
+def sprite_key(deriv_root: Path, guids: list[str], *, cell: int) -> str:
+    """Content-versioned key: changes when the guid list or any thumb file changes."""
+    h = hashlib.sha1(f"v1:{int(cell)}".encode("ascii"))
+    for guid in guids:
+        try:
+            st = thumb_path(deriv_root, guid).stat()
+            version = f"{st.st_mtime_ns}:{st.st_size}"
+        except FileNotFoundError:
+            version = "-"
+        h.update(f"|{guid}:{version}".encode("ascii"))
+    return h.hexdigest()[:24]
+
+
+def _load_cached(deriv_root: Path, key: str) -> SpriteSheet | None:
+    spath = sprite_path(deriv_root, key)
+    mpath = _map_path(deriv_root, key)
+    if not (spath.exists() and mpath.exists()):
+        return None
+    try:
+        payload = json.loads(mpath.read_text(encoding="utf-8"))
+        tiles = {str(g): (int(t[0]), int(t[1]), int(t[2]), int(t[3])) for g, t in payload["tiles"].items()}
+        return SpriteSheet(key=key, path=spath, width=int(payload["width"]), height=int(payload["height"]), tiles=tiles)
+    except Exception:
+        return None
+
+
+def _prune(deriv_root: Path, *, max_cached: int) -> None:
+    d = sprite_dir(deriv_root)
+    try:
+        sheets = sorted(d.glob("*.webp"), key=lambda p: p.stat().st_mtime)
+    except FileNotFoundError:
+        return
+    for p in sheets[: max(0, len(sheets) - int(max_cached))]:
+        for victim in (p, p.with_suffix(".json")):
+            try:
+                victim.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def build_sprite(
+    deriv_root: Path,
+    guids: list[str],
+    *,
+    cell: int,
+    quality: int,
+    max_cached: int = 500,
+) -> SpriteSheet | None:
+    """Pack the thumbs of `guids` into one WebP atlas (cached on disk by content key).
+
+    Thumbs that don't exist are left out of the tile map so callers can fall back
+    to /thumb for them. Returns None if none of the thumbs exist.
+    """
+    key = sprite_key(deriv_root, guids, cell=cell)
+    cached = _load_cached(deriv_root, key)
+    if cached is not None:
+        return cached
+
+    thumbs: list[tuple[str, Image.Image]] = []
+    for guid in guids:
+        p = thumb_path(deriv_root, guid)
+        try:
+            with Image.open(p) as im:
+                im.load()
+                thumbs.append((guid, im.copy()))
+        except FileNotFoundError:
+            continue
+        except Exception:
+            continue
+    if not thumbs:
+        return None
+
+    cols = max(1, math.ceil(math.sqrt(len(thumbs))))
+    rows = math.ceil(len(thumbs) / cols)
+    width = cols * int(cell)
+    height = rows * int(cell)
+
+    mode = "RGBA" if any(im.mode in ("RGBA", "LA", "P") for _, im in thumbs) else "RGB"
+    atlas = Image.new(mode, (width, height))
+    tiles: dict[str, tuple[int, int, int, int]] = {}
+    for i, (guid, im) in enumerate(thumbs):
+        if im.size[0] > cell or im.size[1] > cell:
+            im.thumbnail((cell, cell), resample=Image.Resampling.LANCZOS)
+        x = (i % cols) * int(cell)
+        y = (i // cols) * int(cell)
+        atlas.paste(im.convert(mode), (x, y))
+        tiles[guid] = (x, y, int(im.size[0]), int(im.size[1]))
+
+    spath = sprite_path(deriv_root, key)
+    mpath = _map_path(deriv_root, key)
+    spath.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write to temp names first so concurrent requests never see half-written files.
+    suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+    tmp_sprite = spath.with_name(f".{spath.name}.{suffix}")
+    tmp_map = mpath.with_name(f".{mpath.name}.{suffix}")
+    atlas.save(tmp_sprite, format="WEBP", quality=int(quality), method=4)
+    tmp_map.write_text(
+        json.dumps({"width": width, "height": height, "tiles": {g: list(t) for g, t in tiles.items()}}),
+        encoding="utf-8",
+    )
+    os.replace(tmp_map, mpath)
+    os.replace(tmp_sprite, spath)
+
+    _prune(deriv_root, max_cached=max_cached)
+    return SpriteSheet(key=key, path=spath, width=width, height=height, tiles=tiles)
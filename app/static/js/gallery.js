@@ -60,7 +60,8 @@
     // Initial layout once images are ready; also relayout on each image load.
     const imgs = Array.from(grid.querySelectorAll('img.thumb-img'));
     for (const img of imgs) {
-      if (img.complete) continue;
+      // Sprite tiles have no src yet (complete=true, naturalWidth=0); wait for them too.
+      if (img.complete && img.naturalWidth) continue;
       img.addEventListener('load', scheduleLayout, { once: true });
       img.addEventListener('error', scheduleLayout, { once: true });
     }
@@ -71,6 +72,54 @@
     window.requestAnimationFrame(() => scheduleLayout());
   }
 
+  async function initSprites() {
+    // Leading tiles are rendered without src; cut them out of one atlas so the
+    // first screen costs two requests instead of one per thumb.
+    const grid = document.querySelector('.phototank-gallery-grid');
+    if (!grid || !grid.dataset.spriteUrl) return;
+
+    const imgs = Array.from(grid.querySelectorAll('img[data-sprite-guid]'));
+    if (imgs.length === 0) return;
+
+    function fallback(img) {
+      if (!img.getAttribute('src') && img.dataset.src) img.src = img.dataset.src;
+    }
+
+    try {
+      const resp = await fetch(grid.dataset.spriteUrl, { headers: { Accept: 'application/json' } });
+      if (!resp.ok) throw new Error(`sprite map ${resp.status}`);
+      const sheet = await resp.json();
+
+      const atlas = new Image();
+      atlas.src = sheet.url;
+      await atlas.decode();
+
+      for (const img of imgs) {
+        const tile = sheet.tiles ? sheet.tiles[img.dataset.spriteGuid] : null;
+        if (!tile) {
+          fallback(img);
+          continue;
+        }
+        const [x, y, w, h] = tile;
+        const canvas = document.createElement('canvas');
+        canvas.width = w;
+        canvas.height = h;
+        canvas.getContext('2d').drawImage(atlas, x, y, w, h, 0, 0, w, h);
+        canvas.toBlob((blob) => {
+          if (!blob) {
+            fallback(img);
+            return;
+          }
+          const url = URL.createObjectURL(blob);
+          img.addEventListener('load', () => URL.revokeObjectURL(url), { once: true });
+          img.src = url;
+        }, 'image/webp');
+      }
+    } catch {
+      for (const img of imgs) fallback(img);
+    }
+  }
+
   function formatDetail(detail) {
     if (!detail) return null;
     if (typeof detail === 'string') return detail;
@@ -155,7 +204,9 @@
         link.className = 'd-block';
 
         const img = document.createElement('img');
-        img.src = `/phototank/thumb/${guid}`;
+        // Reuse the tile's versioned URL (already in the browser cache) when it's on this page.
+        const tile = document.querySelector(`img.thumb-img[alt="${guid}"]`);
+        img.src = (tile && (tile.dataset.src || tile.getAttribute('src'))) || `/phototank/thumb/${guid}`;
         img.loading = 'lazy';
         img.className = 'mini-thumb rounded border';
         img.alt = guid;
@@ -244,6 +295,7 @@
       });
     }
 
+    initSprites();
     initMobileMasonry();
   }
 
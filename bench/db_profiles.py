@@ -0,0 +1,118 @@
+"""Compare SQLite storage profiles on ingest-style writes and gallery paging.
+
+Usage (from the project root):
+
+    python -m bench.db_profiles --photos 20000 --pages 200
+
+Each profile gets its own throwaway database. "ingest" times upsert_photo in
+100-row commits (what the ingest job does); "gallery" walks keyset pages of
+120 newest-first, the same query shape as the gallery view.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import and_, or_, select
+
+from app.core.db import STORAGE_PROFILES, configure_storage, engine_for, init_db, sessionmaker_for, upsert_photo
+from app.core.models import Photo
+from app.services.scanner import PhotoRecord
+
+
+def _records(n: int, seed: int) -> list[PhotoRecord]:
+    rnd = random.Random(seed)
+    start = datetime(2005, 1, 1)
+    out = []
+    for i in range(n):
+        dt = start + timedelta(seconds=rnd.randrange(20 * 365 * 86400))
+        out.append(
+            PhotoRecord(
+                guid=uuid.UUID(int=rnd.getrandbits(128)).hex,
+                rel_path=f"{dt.year}/{dt.month:02d}/IMG_{i:07d}.jpg",
+                datetime_original=dt.isoformat(),
+                gps_altitude=None,
+                gps_latitude=rnd.uniform(-60, 70),
+                gps_longitude=rnd.uniform(-180, 180),
+                camera_make="bench",
+                file_size=rnd.randrange(1_000_000, 8_000_000),
+                source_mtime=int(dt.timestamp()),
+                width=4000,
+                height=3000,
+                user_comment=None,
+                indexed_at=dt.isoformat(),
+                exif_error=None,
+            )
+        )
+    return out
+
+
+def _bench_profile(name: str, db_path: Path, records: list[PhotoRecord], pages: int) -> dict[str, float]:
+    configure_storage(STORAGE_PROFILES[name])
+    init_db(engine_for(db_path))
+    SessionLocal = sessionmaker_for(db_path)
+
+    t0 = time.perf_counter()
+    with SessionLocal() as session:
+        for i, rec in enumerate(records, start=1):
+            upsert_photo(session, rec)
+            if i % 100 == 0:
+                session.commit()
+        session.commit()
+    ingest_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    served = 0
+    with SessionLocal() as session:
+        cursor: tuple[str, str] | None = None
+        for _ in range(pages):
+            q = select(Photo).where(Photo.datetime_original.is_not(None))
+            if cursor is not None:
+                q = q.where(
+                    or_(
+                        Photo.datetime_original < cursor[0],
+                        and_(Photo.datetime_original == cursor[0], Photo.guid < cursor[1]),
+                    )
+                )
+            rows = session.execute(
+                q.order_by(Photo.datetime_original.desc(), Photo.guid.desc()).limit(121)
+            ).scalars().all()[:120]
+            if not rows:
+                cursor = None
+                continue
+            served += len(rows)
+            cursor = (rows[-1].datetime_original, rows[-1].guid)
+            session.expunge_all()
+    gallery_s = time.perf_counter() - t0
+
+    return {
+        "ingest_rows_s": len(records) / ingest_s if ingest_s else 0.0,
+        "gallery_pages_s": pages / gallery_s if gallery_s else 0.0,
+        "gallery_rows": float(served),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--photos", type=int, default=20000)
+    ap.add_argument("--pages", type=int, default=200)
+    ap.add_argument("--profiles", default=",".join(STORAGE_PROFILES))
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    records = _records(args.photos, args.seed)
+    print(f"{'profile':<12} {'ingest rows/s':>14} {'gallery pages/s':>16}")
+    with tempfile.TemporaryDirectory(prefix="phototank-bench-") as tmp:
+        for name in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+            res = _bench_profile(name, Path(tmp) / f"{name}.sqlite", records, args.pages)
+            print(f"{name:<12} {res['ingest_rows_s']:>14.0f} {res['gallery_pages_s']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Compare serving originals and thumbs from Python vs offloading them to the web server.
+
+Usage (from the project root):
+
+    python -m bench.file_serving --original-mb 100 --requests 20
+
+Builds a throwaway library with one large original and one thumb, then drives
+the app in-process with a TestClient, first with FILE_OFFLOAD=off (Python
+streams the bytes) and then with FILE_OFFLOAD=nginx (the app answers with an
+X-Accel-Redirect header only). It reports wall and CPU milliseconds per
+request and the bytes that went through the app. With offloading those bytes
+are nginx's sendfile() instead, which this does not time; the point is what
+the Python worker no longer does. A 1 MB Range request on the original is
+timed in direct mode too.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from app.core.config import reload_settings
+from app.core.db import engine_for, init_db
+from app.core.models import Photo
+from app.services.derivatives import thumb_path
+
+
+def _build(root: Path, original_mb: int) -> str:
+    guid = uuid.uuid4().hex
+    rel_path = "2020/01/01/IMG_0001.tif"
+    original = root / "photos" / rel_path
+    original.parent.mkdir(parents=True)
+    with original.open("wb") as f:
+        block = os.urandom(1 << 20)
+        for _ in range(original_mb):
+            f.write(block)
+    thumb = thumb_path(root / "deriv", guid)
+    thumb.parent.mkdir(parents=True)
+    thumb.write_bytes(b"RIFF\x00\x00\x00\x00WEBP" + os.urandom(30_000))
+
+    engine = engine_for(root / "bench.sqlite")
+    init_db(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            Photo.__table__.insert(),
+            [
+                {
+                    "guid": guid,
+                    "rel_path": rel_path,
+                    "file_size": original.stat().st_size,
+                    "indexed_at": "2020-01-01T00:00:00",
+                }
+            ],
+        )
+    return guid
+
+
+def _time(fn, n: int) -> tuple[float, float, int]:
+    wall, cpu, nbytes = [], [], 0
+    for _ in range(n):
+        w0, c0 = time.perf_counter(), time.process_time()
+        nbytes += fn()
+        wall.append((time.perf_counter() - w0) * 1000.0)
+        cpu.append((time.process_time() - c0) * 1000.0)
+    return statistics.median(wall), statistics.median(cpu), nbytes // n
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--original-mb", type=int, default=100)
+    ap.add_argument("--requests", type=int, default=20)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="phototank-bench-") as tmp:
+        root = Path(tmp)
+        os.environ.update(
+            PHOTO_ROOT=str(root / "photos"),
+            DB_PATH=str(root / "bench.sqlite"),
+            DERIV_ROOT=str(root / "deriv"),
+            IMPORT_ROOT=str(root / "import"),
+            FAILED_ROOT=str(root / "failed"),
+            GEOCODE_ENABLED="false",
+            DB_MAINTENANCE_INTERVAL_MIN="0",
+            FILE_OFFLOAD="off",
+        )
+        guid = _build(root, args.original_mb)
+        reload_settings()
+
+        from fastapi.testclient import TestClient
+
+        from app.main import create_app
+
+        original = f"/phototank/original/{guid}"
+        cases = (
+            ("GET /original (full)", original, {}, args.requests),
+            ("GET /original (1 MB Range)", original, {"Range": "bytes=0-1048575"}, args.requests * 5),
+            ("GET /thumb", f"/phototank/thumb/{guid}", {}, args.requests * 25),
+        )
+        print(f"{'mode':<8} {'request':<28} {'wall ms':>9} {'cpu ms':>8} {'bytes via app':>14}")
+        with TestClient(create_app()) as client:
+            for mode in ("off", "nginx"):
+                os.environ["FILE_OFFLOAD"] = mode
+                reload_settings()
+                for name, url, headers, n in cases:
+                    if mode != "off" and "Range" in headers:
+                        continue  # nginx answers Range itself
+
+                    def _get(url=url, headers=headers) -> int:
+                        resp = client.get(url, headers=headers)
+                        assert resp.status_code in (200, 206), resp.status_code
+                        return len(resp.content)
+
+                    _get()
+                    wall, cpu, nbytes = _time(_get, n)
+                    print(f"{mode:<8} {name:<28} {wall:>9.2f} {cpu:>8.2f} {nbytes:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Compare GeoNames request throughput: urlopen per request vs the keep-alive client.
+
+Usage (from the project root):
+
+    python -m bench.geocode_client --requests 200 --latency-ms 60 --handshake-ms 120
+
+Starts the stub server (bench/geonames_stub.py) in-process and sends the same
+reverse-geocode requests three ways: a fresh urlopen per request (the old
+lookup path), the pooled keep-alive client one at a time, and the client
+with N concurrent workers. The rate limiter is off here so the numbers show
+connection reuse and concurrency; the last line runs the client at
+--rate requests/s to show the token bucket holding the rate.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from app.services.geonames_client import GeoNamesClient
+
+from .geonames_stub import serve
+
+
+def _points(n: int, seed: int) -> list[tuple[float, float]]:
+    rnd = random.Random(seed)
+    return [(38.0 + rnd.random() * 4, -9.5 + rnd.random() * 3) for _ in range(n)]
+
+
+def _params(lat: float, lon: float) -> dict[str, str]:
+    return {"lat": f"{lat:.7f}", "lng": f"{lon:.7f}", "radius": "0.200", "maxRows": "1", "username": "bench"}
+
+
+def _report(name: str, n: int, elapsed: float, connections: int, stats: dict | None = None) -> None:
+    line = f"{name:<34} {n / elapsed:>8.1f} req/s {connections:>6} conns"
+    if stats:
+        line += f"   p50 {stats.get('latency_ms_p50', 0):>6.1f} ms  p95 {stats.get('latency_ms_p95', 0):>6.1f} ms"
+    print(line)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--latency-ms", type=float, default=60.0)
+    ap.add_argument("--handshake-ms", type=float, default=120.0)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--rate", type=float, default=4.0, help="requests/s for the rate-limited run")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    server = serve(latency_ms=args.latency_ms, handshake_ms=args.handshake_ms)
+    points = _points(args.requests, args.seed)
+
+    def _new_client(max_connections: int, rate_per_s: float = 0.0) -> GeoNamesClient:
+        return GeoNamesClient(
+            server.url,
+            timeout_s=10.0,
+            max_connections=max_connections,
+            rate_per_s=rate_per_s,
+            hourly_limit=0,
+        )
+
+    print(f"{'mode':<34} {'throughput':>12} {'new':>6}")
+
+    c0 = server.connections
+    t0 = time.perf_counter()
+    for lat, lon in points:
+        with urlopen(f"{server.url}/findNearbyPlaceNameJSON?{urlencode(_params(lat, lon))}", timeout=10) as resp:
+            json.loads(resp.read().decode("utf-8"))
+    _report("urlopen per request", len(points), time.perf_counter() - t0, server.connections - c0)
+
+    client = _new_client(1)
+    c0 = server.connections
+    t0 = time.perf_counter()
+    for lat, lon in points:
+        client.get_json("/findNearbyPlaceNameJSON", _params(lat, lon))
+    _report("keep-alive client, 1 at a time", len(points), time.perf_counter() - t0, server.connections - c0, client.stats())
+    client.close()
+
+    client = _new_client(args.concurrency)
+    c0 = server.connections
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda p: client.get_json("/findNearbyPlaceNameJSON", _params(*p)), points))
+    name = f"keep-alive client, {args.concurrency} workers"
+    _report(name, len(points), time.perf_counter() - t0, server.connections - c0, client.stats())
+    client.close()
+
+    limited = points[: max(1, min(len(points), int(args.rate * 5)))]
+    client = _new_client(args.concurrency, rate_per_s=args.rate)
+    c0 = server.connections
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda p: client.get_json("/findNearbyPlaceNameJSON", _params(*p)), limited))
+    name = f"  limited to {args.rate:g} req/s"
+    _report(name, len(limited), time.perf_counter() - t0, server.connections - c0, client.stats())
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
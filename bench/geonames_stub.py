@@ -0,0 +1,179 @@
+"""Local stand-in for the GeoNames findNearbyPlaceNameJSON endpoint.
+
+Usage (from the project root):
+
+    python -m bench.geonames_stub --port 8765 --latency-ms 60 --handshake-ms 120
+
+then point the app at it with GEOCODE_GEONAMES_URL=http://127.0.0.1:8765 and
+any GEOCODE_GEONAMES_USERNAME. It answers with a synthetic place per 0.1°
+cell after the configured latency, speaks HTTP/1.1 keep-alive, and can
+delay each new connection (--handshake-ms, standing in for the TCP and TLS
+handshakes of the real HTTPS endpoint), simulate the account's hourly limit
+(--hourly-limit) and fail at random (--error-rate). bench/geocode_client.py
+starts one in-process.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int,
+        *,
+        latency_ms: float,
+        handshake_ms: float,
+        hourly_limit: int,
+        error_rate: float,
+        seed: int,
+    ) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency_s = max(0.0, latency_ms) / 1000.0
+        self.handshake_s = max(0.0, handshake_ms) / 1000.0
+        self.hourly_limit = max(0, int(hourly_limit))
+        self.error_rate = max(0.0, float(error_rate))
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self) -> tuple[int, bool]:
+        with self._lock:
+            self.requests += 1
+            return self.requests, self._rnd.random() < self.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this, Nagle's algorithm
+    # holds the body back for the client's delayed ACK on a kept-alive connection.
+    disable_nagle_algorithm = True
+    server: StubServer
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+        if self.server.handshake_s:
+            time.sleep(self.server.handshake_s)
+
+    def log_message(self, format: str, *args) -> None:  # quiet
+        pass
+
+    def _send(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if not url.path.endswith("/findNearbyPlaceNameJSON"):
+            self._send(404, {"status": {"message": "not found", "value": 404}})
+            return
+        n, fail = self.server.count()
+        if self.server.latency_s:
+            time.sleep(self.server.latency_s)
+        if self.server.hourly_limit and n > self.server.hourly_limit:
+            msg = "the hourly limit of 1000 credits for demo has been exceeded. Please throttle your requests"
+            self._send(200, {"status": {"message": msg, "value": 19}})
+            return
+        if fail:
+            self._send(503, {"status": {"message": "stub failure", "value": 13}})
+            return
+
+        q = parse_qs(url.query)
+        try:
+            lat = float(q["lat"][0])
+            lon = float(q["lng"][0])
+        except (KeyError, ValueError):
+            self._send(200, {"status": {"message": "missing lat/lng", "value": 14}})
+            return
+        if abs(lat) > 80:  # nothing nearby, like the open ocean
+            self._send(200, {"geonames": []})
+            return
+        cell = (math.floor(lat * 10), math.floor(lon * 10))
+        self._send(
+            200,
+            {
+                "geonames": [
+                    {
+                        "geonameId": abs(hash(cell)) % 10_000_000,
+                        "name": f"Town {cell[0]}/{cell[1]}",
+                        "adminName1": f"Region {cell[0] // 10}",
+                        "countryName": "Stubland",
+                        "countryCode": "SL",
+                        "lat": f"{(cell[0] + 0.5) / 10:.4f}",
+                        "lng": f"{(cell[1] + 0.5) / 10:.4f}",
+                        "distance": "0.5",
+                    }
+                ]
+            },
+        )
+
+
+def serve(
+    port: int = 0,
+    *,
+    latency_ms: float = 0.0,
+    handshake_ms: float = 0.0,
+    hourly_limit: int = 0,
+    error_rate: float = 0.0,
+    seed: int = 1,
+) -> StubServer:
+    """Start a stub server on a background thread (port 0 picks a free one)."""
+    server = StubServer(
+        port,
+        latency_ms=latency_ms,
+        handshake_ms=handshake_ms,
+        hourly_limit=hourly_limit,
+        error_rate=error_rate,
+        seed=seed,
+    )
+    threading.Thread(target=server.serve_forever, name="geonames-stub", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=60.0)
+    ap.add_argument("--handshake-ms", type=float, default=120.0, help="delay before serving a new connection")
+    ap.add_argument("--hourly-limit", type=int, default=0, help="answer with the GeoNames limit error after N requests")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 503")
+    args = ap.parse_args()
+
+    server = StubServer(
+        args.port,
+        latency_ms=args.latency_ms,
+        handshake_ms=args.handshake_ms,
+        hourly_limit=args.hourly_limit,
+        error_rate=args.error_rate,
+        seed=1,
+    )
+    print(f"GeoNames stub on {server.url} (latency {args.latency_ms:.0f} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Check the query plans of the gallery, photo detail and dashboard reads.
+
+Usage (from the project root):
+
+    python -m bench.query_plans --photos 200000
+
+Builds a throwaway database with the real schema, triggers and planner stats,
+then runs EXPLAIN QUERY PLAN on every read those pages issue, for every
+filter combination (rating, tag, country, city). Exits non-zero if any plan
+sorts (USE TEMP B-TREE) or scans a table without an index; walking an index in
+order is fine, since every such query stops at its LIMIT. Full-text search is
+left out: its plan depends on the hit count (see core/search.py and
+bench/search.py).
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import Session
+
+from app.core.counts import DIMS
+from app.core.db import engine_for, init_db, sessionmaker_for
+from app.core.models import Photo, PhotoCount, PhotoTag, ScanJob, Tag
+from app.core.timeline import TILE_COLUMNS, TimelineFilter
+
+_COUNTRIES = [f"Country{i}" for i in range(40)]
+_TAGS = 60
+_PAGE = 60
+
+# Bounded by the number of tags a user creates by hand, so a scan is cheap.
+_SMALL_TABLES = {"tags"}
+# Sorts the handful of tags on one photo.
+_SORT_OK = {"detail tags"}
+
+
+def _build(db_path: Path, n: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    engine = engine_for(db_path)
+    init_db(engine)
+    photos = Photo.__table__
+    with engine.begin() as conn:
+        conn.execute(
+            Tag.__table__.insert(),
+            [{"name": f"tag {i}", "name_norm": f"tag {i}", "color": "primary"} for i in range(_TAGS)],
+        )
+        guids: list[str] = []
+        batch = []
+        for i in range(n):
+            guid = uuid.UUID(int=rnd.getrandbits(128)).hex
+            guids.append(guid)
+            country = rnd.choice(_COUNTRIES) if rnd.random() < 0.8 else None
+            city = f"{country} town {rnd.randrange(50)}" if country else None
+            batch.append(
+                {
+                    "guid": guid,
+                    "rel_path": f"{2005 + i % 20}/{i % 12 + 1:02d}/IMG_{i:07d}.jpg",
+                    "taken_at": 1104537600 + rnd.randrange(20 * 365 * 86400) if rnd.random() < 0.98 else None,
+                    "geo_country": country,
+                    "geo_city": city,
+                    "geo_city_norm": city.lower() if city else None,
+                    "rating": rnd.choice((0, 0, 0, 1, 2, 3)),
+                    "file_size": 1,
+                    "indexed_at": "2020-01-01T00:00:00",
+                }
+            )
+            if len(batch) >= 5000:
+                conn.execute(photos.insert(), batch)
+                batch.clear()
+        if batch:
+            conn.execute(photos.insert(), batch)
+        links = [
+            {"photo_guid": guid, "tag_id": tag_id}
+            for guid in guids
+            if rnd.random() < 0.3
+            for tag_id in rnd.sample(range(1, _TAGS + 1), rnd.randint(1, 3))
+        ]
+        conn.execute(PhotoTag.__table__.insert(), links)
+        conn.execute(
+            ScanJob.__table__.insert(),
+            [
+                {
+                    "job_id": uuid.uuid4().hex,
+                    "job_type": "scan",
+                    "state": "done",
+                    "started_at": f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}+00:00",
+                }
+                for i in range(3000)
+            ],
+        )
+        # Production databases carry planner stats from the maintenance job.
+        conn.exec_driver_sql("ANALYZE")
+
+
+def _sample(session: Session) -> tuple[int, str, int, str, str]:
+    row = session.execute(
+        select(Photo.taken_at, Photo.guid, Photo.rating, Photo.geo_country, Photo.geo_city_norm)
+        .where(Photo.taken_at.is_not(None))
+        .where(Photo.geo_city_norm.is_not(None))
+        .limit(1)
+    ).one()
+    return row[0], row[1], row[2], row[3], row[4]
+
+
+def _queries(session: Session) -> list[tuple[str, object]]:
+    ts, guid, rating, country, city_norm = _sample(session)
+    tag_id = 1
+    out: list[tuple[str, object]] = []
+    for use_rating, use_tag, use_country, use_city in itertools.product((False, True), repeat=4):
+        timeline = TimelineFilter(
+            rating=rating if use_rating else None,
+            tag_id=tag_id if use_tag else None,
+            country=country if use_country else None,
+            city_norm=city_norm if use_city else None,
+        )
+        label = "+".join(
+            name for name, on in (("rating", use_rating), ("tag", use_tag), ("country", use_country), ("city", use_city)) if on
+        ) or "all"
+        # Gallery (routers/web.py gallery_page).
+        base = timeline.apply(select(*TILE_COLUMNS))
+        out.append((f"gallery initial [{label}]", timeline.at_or_before(base, ts).limit(_PAGE + 1)))
+        out.append((f"gallery older [{label}]", timeline.newest_first(timeline.older_than(base, ts, guid)).limit(_PAGE + 1)))
+        out.append((f"gallery newer [{label}]", timeline.oldest_first(timeline.newer_than(base, ts, guid)).limit(_PAGE + 1)))
+        probe = base.with_only_columns(Photo.guid)
+        out.append((f"gallery has older [{label}]", timeline.older_than(probe, ts, guid).limit(1)))
+        out.append((f"gallery has newer [{label}]", timeline.newer_than(probe, ts, guid).limit(1)))
+        # Photo detail prev/next (routers/web.py photo_detail).
+        base = timeline.apply(select(Photo.guid))
+        out.append((f"detail next [{label}]", timeline.oldest_first(timeline.newer_than(base, ts, guid)).limit(1)))
+        out.append((f"detail prev [{label}]", timeline.newest_first(timeline.older_than(base, ts, guid)).limit(1)))
+    # Photo detail and gallery filter lists.
+    out.append(("detail photo", select(Photo.guid, Photo.rel_path, Photo.geo_display_name).where(Photo.guid == guid)))
+    out.append((
+        "detail tags",
+        select(Tag).join(PhotoTag, PhotoTag.tag_id == Tag.id).where(PhotoTag.photo_guid == guid).order_by(Tag.name_norm.asc()),
+    ))
+    out.append(("tag list", select(Tag).order_by(Tag.name_norm.asc())))
+    # Dashboard and /counts.
+    for dim in DIMS:
+        out.append((
+            f"counts [{dim}]",
+            select(PhotoCount.key, PhotoCount.n).where(PhotoCount.dim == dim).where(PhotoCount.n > 0).order_by(PhotoCount.key.asc()),
+        ))
+    out.append(("dashboard total", select(PhotoCount.n).where(PhotoCount.dim == "total").where(PhotoCount.key == "")))
+    out.append((
+        "dashboard jobs",
+        select(ScanJob).order_by(ScanJob.started_at.desc(), ScanJob.job_id.desc()).limit(200),
+    ))
+    return out
+
+
+def _plan(session: Session, stmt) -> list[str]:
+    sql = str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+    return [str(row[3]) for row in session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+
+def _problems(name: str, plan: list[str]) -> list[str]:
+    bad = []
+    for line in plan:
+        if "USE TEMP B-TREE" in line:
+            if name not in _SORT_OK:
+                bad.append(line)
+        elif line.startswith("SCAN ") and " INDEX " not in line:
+            table = line.split()[1]
+            if table not in _SMALL_TABLES:
+                bad.append(line)
+    return bad
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--photos", type=int, default=200_000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("-v", "--verbose", action="store_true", help="print every plan, not just failing ones")
+    args = ap.parse_args()
+
+    failed = 0
+    with tempfile.TemporaryDirectory(prefix="phototank-bench-") as tmp:
+        db_path = Path(tmp) / "plans.sqlite"
+        t0 = time.perf_counter()
+        _build(db_path, args.photos, args.seed)
+        print(f"built {args.photos} photos in {time.perf_counter() - t0:.1f}s")
+        with sessionmaker_for(db_path)() as session:
+            queries = _queries(session)
+            for name, stmt in queries:
+                plan = _plan(session, stmt)
+                bad = _problems(name, plan)
+                if bad:
+                    failed += 1
+                if bad or args.verbose:
+                    print(f"{'FAIL' if bad else 'ok':<4} {name}")
+                    for line in plan:
+                        print(f"       {line}")
+    print(f"{len(queries) - failed}/{len(queries)} plans ok")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Measure per-request CPU time of the gallery (/), photo detail (/photo/{guid}) and thumbnail (/thumb/{guid}) endpoints.
+
+Usage (from the project root):
+
+    python -m bench.request_cpu --photos 50000 --requests 300
+
+Builds a throwaway library database (no image files are needed for these
+pages), then drives the app in-process with a TestClient and reports CPU
+milliseconds per request (process time, so the handler thread is included).
+The thumbnail case serves a small file, so it is almost all per-request
+overhead (settings, dependencies, routing); --settings-cost times one
+uncached settings load for comparison.
+It also times the page queries alone, as full ORM rows and as the column
+projections the views use, to show what the projections save.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import select
+
+from app.core.config import load_settings
+from app.core.db import engine_for, fetch_photo, init_db, sessionmaker_for
+from app.core.models import Photo
+from app.core.timeline import TILE_COLUMNS, TimelineFilter
+from app.services.derivatives import thumb_path
+
+_PAGE = 60
+
+
+def _build(db_path: Path, n: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    engine = engine_for(db_path)
+    init_db(engine)
+    table = Photo.__table__
+    guids: list[str] = []
+    batch = []
+    with engine.begin() as conn:
+        for i in range(n):
+            guid = uuid.UUID(int=rnd.getrandbits(128)).hex
+            guids.append(guid)
+            ts = 1104537600 + rnd.randrange(20 * 365 * 86400)
+            batch.append(
+                {
+                    "guid": guid,
+                    "rel_path": f"{2005 + i % 20}/{i % 12 + 1:02d}/IMG_{i:07d}.jpg",
+                    "taken_at": ts,
+                    "datetime_original": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts)),
+                    "camera_make": "Canon",
+                    "user_comment": "birthday dinner at the harbour" if i % 7 == 0 else None,
+                    "gps_latitude": 38.7 + rnd.random(),
+                    "gps_longitude": -9.1 + rnd.random(),
+                    "geo_display_name": "Rua Augusta, Baixa, Lisboa, Portugal",
+                    "geo_country": "Portugal",
+                    "geo_city": "Lisbon",
+                    "geo_city_norm": "lisbon",
+                    "geo_lookup_status": "ok",
+                    "rating": rnd.choice((0, 0, 0, 1, 2, 3)),
+                    "width": 4032,
+                    "height": 3024,
+                    "file_size": 3_500_000,
+                    "indexed_at": "2020-01-01T00:00:00",
+                }
+            )
+            if len(batch) >= 5000:
+                conn.execute(table.insert(), batch)
+                batch.clear()
+        if batch:
+            conn.execute(table.insert(), batch)
+        conn.exec_driver_sql("ANALYZE")
+    return guids
+
+
+def _cpu_ms(fn, n: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(n):
+        t0 = time.process_time()
+        fn()
+        samples.append((time.process_time() - t0) * 1000.0)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def _fetch_photo_orm(session, guid: str) -> dict[str, object]:
+    # The previous fetch_photo: load the ORM row, then copy it into a dict.
+    row = session.execute(select(Photo).where(Photo.guid == guid)).scalar_one()
+    return {c.key: getattr(row, c.key) for c in Photo.__table__.columns}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--photos", type=int, default=50_000)
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--settings-cost", action="store_true", help="also time one uncached settings load")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="phototank-bench-") as tmp:
+        root = Path(tmp)
+        os.environ.update(
+            PHOTO_ROOT=str(root / "photos"),
+            DB_PATH=str(root / "bench.sqlite"),
+            DERIV_ROOT=str(root / "deriv"),
+            IMPORT_ROOT=str(root / "import"),
+            FAILED_ROOT=str(root / "failed"),
+            GEOCODE_ENABLED="false",
+            DB_MAINTENANCE_INTERVAL_MIN="0",
+        )
+        (root / "photos").mkdir()
+        db_path = root / "bench.sqlite"
+        guids = _build(db_path, args.photos, args.seed)
+        rnd = random.Random(args.seed)
+        thumb = thumb_path(root / "deriv", guids[0])
+        thumb.parent.mkdir(parents=True, exist_ok=True)
+        thumb.write_bytes(b"RIFF\x00\x00\x00\x00WEBP" + bytes(2000))
+
+        from fastapi.testclient import TestClient
+
+        from app.main import create_app
+
+        print(f"{'request/query':<34} {'cpu ms p50':>10} {'p95':>8}")
+        with TestClient(create_app()) as client:
+            for path in ("/phototank/", "/phototank/?rating=3"):
+                client.get(path)
+                p50, p95 = _cpu_ms(lambda: client.get(path), args.requests)
+                print(f"GET {path:<30} {p50:>10.2f} {p95:>8.2f}")
+
+            def _detail() -> None:
+                client.get(f"/phototank/photo/{rnd.choice(guids)}")
+
+            _detail()
+            p50, p95 = _cpu_ms(_detail, args.requests)
+            print(f"GET {'/phototank/photo/{guid}':<30} {p50:>10.2f} {p95:>8.2f}")
+
+            thumb_url = f"/phototank/thumb/{guids[0]}"
+            client.get(thumb_url)
+            p50, p95 = _cpu_ms(lambda: client.get(thumb_url), args.requests * 3)
+            print(f"GET {'/phototank/thumb/{guid}':<30} {p50:>10.2f} {p95:>8.2f}")
+
+        if args.settings_cost:
+            p50, p95 = _cpu_ms(load_settings, args.requests)
+            print(f"{'settings load (.env + parse)':<34} {p50:>10.3f} {p95:>8.3f}")
+
+        SessionLocal = sessionmaker_for(db_path)
+        timeline = TimelineFilter()
+        page_orm = timeline.newest_first(timeline.apply(select(Photo))).limit(_PAGE + 1)
+        page_cols = timeline.newest_first(timeline.apply(select(*TILE_COLUMNS))).limit(_PAGE + 1)
+        with SessionLocal() as session:
+            cases = (
+                ("gallery page, ORM rows", lambda: session.execute(page_orm).scalars().all()),
+                ("gallery page, projection", lambda: session.execute(page_cols).all()),
+                ("fetch_photo, ORM row", lambda: _fetch_photo_orm(session, rnd.choice(guids))),
+                ("fetch_photo, projection", lambda: fetch_photo(session, rnd.choice(guids))),
+            )
+            for name, fn in cases:
+                fn()
+                # Like a request, each run starts with an empty identity map.
+                p50, p95 = _cpu_ms(lambda: (fn(), session.expunge_all()), args.requests * 5)
+                print(f"{name:<34} {p50:>10.3f} {p95:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Time full-text search (photos_fts) on a synthetic library.
+
+Usage (from the project root):
+
+    python -m bench.search --photos 500000
+
+Builds a throwaway database with the real schema and triggers, then times the
+/search query (newest first, keyset paged) for rare, common and prefix terms,
+alone and combined with a rating filter.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import and_, or_, select
+
+from app.core.db import engine_for, init_db, sessionmaker_for
+from app.core.models import Photo
+from app.core.search import fts_match_query, photo_search_clause
+
+_CITIES = ["Lisbon", "Porto", "Copenhagen", "Aarhus", "Berlin", "Paris", "Madrid", "Rome", "Oslo", "Vienna"]
+_CITIES += [f"Town{i}" for i in range(2000)]
+_CAMERAS = ["Apple", "Samsung", "Canon", "Nikon", "Sony", "Google"]
+_WORDS = ["beach", "birthday", "sunset", "mountain", "dinner", "garden", "snow", "harbour", "museum", "bridge"]
+
+
+def _build(db_path: Path, n: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    engine = engine_for(db_path)
+    init_db(engine)
+    table = Photo.__table__
+    batch = []
+    with engine.begin() as conn:
+        for i in range(n):
+            city = rnd.choice(_CITIES) if rnd.random() < 0.7 else None
+            comment = " ".join(rnd.sample(_WORDS, 2)) if rnd.random() < 0.1 else None
+            batch.append(
+                {
+                    "guid": uuid.UUID(int=rnd.getrandbits(128)).hex,
+                    "rel_path": f"{2005 + i % 20}/{i % 12 + 1:02d}/IMG_{i:07d}.jpg",
+                    "taken_at": 1104537600 + rnd.randrange(20 * 365 * 86400),
+                    "camera_make": rnd.choice(_CAMERAS),
+                    "user_comment": comment,
+                    "geo_city": city,
+                    "geo_display_name": f"{city}, Somewhere" if city else None,
+                    "rating": rnd.choice((0, 0, 0, 1, 2, 3)),
+                    "file_size": 1,
+                    "indexed_at": "2020-01-01T00:00:00",
+                }
+            )
+            if len(batch) >= 5000:
+                conn.execute(table.insert(), batch)
+                batch.clear()
+        if batch:
+            conn.execute(table.insert(), batch)
+        # Production databases carry planner stats from the maintenance job.
+        conn.exec_driver_sql("ANALYZE")
+
+
+def _time_query(SessionLocal, q: str, *, rating: int | None, pages: int, limit: int) -> tuple[float, int]:
+    match = fts_match_query(q)
+    assert match is not None
+    times = []
+    found = 0
+    cursor = None
+    with SessionLocal() as session:
+        for _ in range(pages):
+            t0 = time.perf_counter()
+            stmt = select(Photo.guid, Photo.taken_at).where(Photo.taken_at.is_not(None)).where(photo_search_clause(session, match))
+            if rating is not None:
+                stmt = stmt.where(Photo.rating == rating)
+            if cursor is not None:
+                ts, guid = cursor
+                stmt = stmt.where(or_(Photo.taken_at < ts, and_(Photo.taken_at == ts, Photo.guid < guid)))
+            stmt = stmt.order_by(Photo.taken_at.desc(), Photo.guid.desc()).limit(limit + 1)
+            rows = session.execute(stmt).all()
+            times.append((time.perf_counter() - t0) * 1000.0)
+            found += min(len(rows), limit)
+            if len(rows) <= limit:
+                break
+            cursor = (rows[limit - 1].taken_at, rows[limit - 1].guid)
+    return statistics.median(times), found
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--photos", type=int, default=500_000)
+    ap.add_argument("--pages", type=int, default=5)
+    ap.add_argument("--limit", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="phototank-bench-") as tmp:
+        db_path = Path(tmp) / "search.sqlite"
+        t0 = time.perf_counter()
+        _build(db_path, args.photos, args.seed)
+        print(f"built {args.photos} photos in {time.perf_counter() - t0:.1f}s")
+        SessionLocal = sessionmaker_for(db_path)
+        print(f"{'query':<28} {'rating':>6} {'ms/page':>9} {'rows':>6}")
+        for q in ("town1234", "lisbon", "canon", "sun", "lisbon sunset", "img_00123"):
+            for rating in (None, 3):
+                ms, found = _time_query(SessionLocal, q, rating=rating, pages=args.pages, limit=args.limit)
+                print(f"{q:<28} {str(rating) if rating is not None else '-':>6} {ms:>9.2f} {found:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Compare timeline keyset paging on TEXT datetime_original vs INTEGER taken_at.
+
+Usage (from the project root):
+
+    python -m bench.taken_at --photos 200000 --pages 500
+
+Builds one throwaway database holding both the old (datetime_original, guid)
+index and the new (taken_at, guid) index, reports their on-disk size (dbstat)
+and times the gallery's "older" keyset query forced onto each index.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.core.util import taken_at_from_iso
+
+
+def _build(db_path: Path, n: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    start = datetime(2005, 1, 1)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE photos (guid TEXT PRIMARY KEY, rel_path TEXT, datetime_original TEXT, taken_at INTEGER)"
+    )
+    rows = []
+    for i in range(n):
+        dt = (start + timedelta(seconds=rnd.randrange(20 * 365 * 86400))).isoformat()
+        rows.append((uuid.UUID(int=rnd.getrandbits(128)).hex, f"p/{i}.jpg", dt, taken_at_from_iso(dt)))
+    conn.executemany("INSERT INTO photos VALUES (?, ?, ?, ?)", rows)
+    conn.execute(
+        "CREATE INDEX idx_text ON photos (datetime_original, guid) WHERE datetime_original IS NOT NULL"
+    )
+    conn.execute("CREATE INDEX idx_int ON photos (taken_at, guid) WHERE taken_at IS NOT NULL")
+    conn.commit()
+    conn.close()
+
+
+def _index_bytes(conn: sqlite3.Connection, name: str) -> int:
+    return int(conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (name,)).fetchone()[0] or 0)
+
+
+def _walk(conn: sqlite3.Connection, *, column: str, index: str, pages: int, limit: int) -> float:
+    sql_first = (
+        f"SELECT guid, {column} FROM photos INDEXED BY {index} WHERE {column} IS NOT NULL "
+        f"ORDER BY {column} DESC, guid DESC LIMIT ?"
+    )
+    sql_next = (
+        f"SELECT guid, {column} FROM photos INDEXED BY {index} WHERE {column} IS NOT NULL "
+        f"AND ({column} < ? OR ({column} = ? AND guid < ?)) ORDER BY {column} DESC, guid DESC LIMIT ?"
+    )
+    t0 = time.perf_counter()
+    rows = conn.execute(sql_first, (limit,)).fetchall()
+    for _ in range(pages - 1):
+        if not rows:
+            rows = conn.execute(sql_first, (limit,)).fetchall()
+            continue
+        guid, key = rows[-1]
+        rows = conn.execute(sql_next, (key, key, guid, limit)).fetchall()
+    return (time.perf_counter() - t0) / pages * 1000.0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--photos", type=int, default=200_000)
+    ap.add_argument("--pages", type=int, default=500)
+    ap.add_argument("--limit", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="phototank-bench-") as tmp:
+        db_path = Path(tmp) / "timeline.sqlite"
+        _build(db_path, args.photos, args.seed)
+        conn = sqlite3.connect(db_path)
+        print(f"{'index':<36} {'size MB':>9} {'ms/page':>9}")
+        for label, column, index in (
+            ("(datetime_original TEXT, guid)", "datetime_original", "idx_text"),
+            ("(taken_at INTEGER, guid)", "taken_at", "idx_int"),
+        ):
+            size_mb = _index_bytes(conn, index) / 1e6
+            ms = _walk(conn, column=column, index=index, pages=args.pages, limit=args.limit)
+            print(f"{label:<36} {size_mb:>9.2f} {ms:>9.3f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()